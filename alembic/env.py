@@ -27,6 +27,10 @@ from app.friend.models import *
 from app.measurement.models import *
 from app.medicine.models import *
 from app.a1c.models import *
+from app.core.lease import *
+from app.feed.models import *
+from app.core.data_version import *
+from app._else.models import *
 
 target_metadata = Base.metadata
 
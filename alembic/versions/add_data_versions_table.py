@@ -0,0 +1,32 @@
+"""Add data_versions table
+
+Revision ID: add_data_versions
+Revises: add_share_recipient_index
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_data_versions'
+down_revision = 'add_share_recipient_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 每位用戶每個範圍的資料版本號（ETag、快取失效）
+    op.create_table(
+        'data_versions',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('scope', sa.String(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'scope'),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('data_versions')
@@ -0,0 +1,37 @@
+"""Add feed_entries table for friend activity feed
+
+Revision ID: add_feed_entries
+Revises: add_friend_results_index
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_feed_entries'
+down_revision = 'add_friend_results_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 好友動態收件匣：分享時為每位符合條件的好友各寫入一筆
+    op.create_table('feed_entries',
+    sa.Column('id', sa.Integer(), autoincrement=True, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('actor_id', sa.Integer(), nullable=False),
+    sa.Column('share_id', sa.Integer(), nullable=False),
+    sa.Column('data_type', sa.Integer(), nullable=False),
+    sa.Column('record_id', sa.String(length=50), nullable=False),
+    sa.Column('relation_type', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_feed_entries_user_id_id', 'feed_entries', ['user_id', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_feed_entries_user_id_id', table_name='feed_entries')
+    op.drop_table('feed_entries')
@@ -0,0 +1,29 @@
+"""Add indexes for friend relationship lookups
+
+Revision ID: add_friend_indexes
+Revises: add_job_leases
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_friend_indexes'
+down_revision = 'add_job_leases'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 好友列表：依 user_id 找出好友，再以 (user_id, relation_id) 對應邀請的關係類型
+    op.create_index('ix_friendship_user_friend', 'Friendship', ['user_id', 'friend_id'])
+    op.create_index('ix_friend_requests_user_relation', 'friend_requests', ['user_id', 'relation_id'])
+    # 收到的邀請：WHERE relation_id = ? AND status = 0
+    op.create_index('ix_friend_requests_relation_status', 'friend_requests', ['relation_id', 'status'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_friend_requests_relation_status', table_name='friend_requests')
+    op.drop_index('ix_friend_requests_user_relation', table_name='friend_requests')
+    op.drop_index('ix_friendship_user_friend', table_name='Friendship')
@@ -0,0 +1,24 @@
+"""Add index for unread friend results
+
+Revision ID: add_friend_results_index
+Revises: add_invite_code_unique
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_friend_results_index'
+down_revision = 'add_invite_code_unique'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 未讀結果：WHERE user_id = ? AND read = 0 AND status != 0
+    op.create_index('ix_friend_requests_user_read_status', 'friend_requests', ['user_id', 'read', 'status'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_friend_requests_user_read_status', table_name='friend_requests')
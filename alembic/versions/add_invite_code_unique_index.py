@@ -0,0 +1,33 @@
+"""Add unique index on UserProfile.invite_code
+
+Revision ID: add_invite_code_unique
+Revises: add_friend_indexes
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_invite_code_unique'
+down_revision = 'add_friend_indexes'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 舊的邀請碼沒有唯一性保證：重複的只保留最早的一筆，其餘清空後下次查詢時重新產生
+    op.execute("""
+        UPDATE UserProfile SET invite_code = NULL
+        WHERE invite_code IS NOT NULL
+          AND id NOT IN (
+              SELECT MIN(id) FROM UserProfile
+              WHERE invite_code IS NOT NULL
+              GROUP BY invite_code
+          )
+    """)
+    op.create_index(op.f('ix_UserProfile_invite_code'), 'UserProfile', ['invite_code'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f('ix_UserProfile_invite_code'), table_name='UserProfile')
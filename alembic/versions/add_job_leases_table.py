@@ -0,0 +1,31 @@
+"""Add job_leases table for single-runner background tasks
+
+Revision ID: add_job_leases
+Revises: rename_tables_spec
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_job_leases'
+down_revision = 'rename_tables_spec'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 背景任務租約表：每個任務一列，記錄目前持有者與到期時間
+    op.create_table('job_leases',
+    sa.Column('name', sa.String(), nullable=False),
+    sa.Column('owner', sa.String(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('job_leases')
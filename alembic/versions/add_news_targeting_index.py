@@ -0,0 +1,26 @@
+"""Normalize News targeting columns and add index
+
+Revision ID: add_news_targeting_index
+Revises: add_data_versions
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_news_targeting_index'
+down_revision = 'add_data_versions'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # NULL 與 0 都代表發給所有人，統一為 0 才能以 IN (0, ?) 走索引
+    op.execute('UPDATE "News" SET member_id = 0 WHERE member_id IS NULL')
+    op.execute('UPDATE "News" SET "group" = 0 WHERE "group" IS NULL')
+    op.create_index('ix_news_member_group_created', 'News', ['member_id', 'group', 'created_at', 'id'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_news_member_group_created', table_name='News')
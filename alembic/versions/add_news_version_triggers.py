@@ -0,0 +1,38 @@
+"""Bump the news data version from triggers on News
+
+Revision ID: add_news_version_triggers
+Revises: add_user_badges
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_news_version_triggers'
+down_revision = 'add_user_badges'
+branch_labels = None
+depends_on = None
+
+# 任何方式新增、修改、刪除 News 都會讓 (0, 'news') 的版本號加一（與 bump_data_version 相同）
+BUMP_NEWS_VERSION = """
+    INSERT INTO data_versions (user_id, scope, version, updated_at)
+    VALUES (0, 'news', 1, strftime('%Y-%m-%d %H:%M:%S.000000', 'now', '+8 hours'))
+    ON CONFLICT (user_id, scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+"""
+
+TRIGGERS = {
+    'news_version_insert': 'AFTER INSERT',
+    'news_version_update': 'AFTER UPDATE',
+    'news_version_delete': 'AFTER DELETE',
+}
+
+
+def upgrade() -> None:
+    for name, timing in TRIGGERS.items():
+        op.execute(f'CREATE TRIGGER IF NOT EXISTS {name} {timing} ON "News" BEGIN {BUMP_NEWS_VERSION} END')
+
+
+def downgrade() -> None:
+    for name in TRIGGERS:
+        op.execute(f'DROP TRIGGER IF EXISTS {name}')
@@ -0,0 +1,24 @@
+"""Add index for shared records by recipient
+
+Revision ID: add_share_recipient_index
+Revises: add_feed_entries
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_share_recipient_index'
+down_revision = 'add_feed_entries'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 查看分享：WHERE shared_with_user_id = ? AND data_type = ? ORDER BY created_at DESC
+    op.create_index('ix_share_recipient_type_created', 'Share', ['shared_with_user_id', 'data_type', 'created_at'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_share_recipient_type_created', table_name='Share')
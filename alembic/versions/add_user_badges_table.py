@@ -0,0 +1,41 @@
+"""Add user_badges table for incremental badge state
+
+Revision ID: add_user_badges
+Revises: add_news_targeting_index
+Create Date: 2026-10-19 00:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'add_user_badges'
+down_revision = 'add_news_targeting_index'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 既有用戶沒有狀態，由 recompute_badges 任務掃描歷史資料補建
+    op.create_table(
+        'user_badges',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('badge', sa.Integer(), nullable=False),
+        sa.Column('last_record_date', sa.Date(), nullable=True),
+        sa.Column('record_streak', sa.Integer(), nullable=False),
+        sa.Column('longest_record_streak', sa.Integer(), nullable=False),
+        sa.Column('last_sugar_date', sa.Date(), nullable=True),
+        sa.Column('in_range_streak', sa.Integer(), nullable=False),
+        sa.Column('longest_in_range_streak', sa.Integer(), nullable=False),
+        sa.Column('share_count', sa.Integer(), nullable=False),
+        sa.Column('needs_recompute', sa.Boolean(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('user_id'),
+    )
+    op.create_index('ix_user_badges_needs_recompute', 'user_badges', ['needs_recompute'])
+
+
+def downgrade() -> None:
+    op.drop_index('ix_user_badges_needs_recompute', table_name='user_badges')
+    op.drop_table('user_badges')
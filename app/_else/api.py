@@ -1,19 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
+from typing import Optional
 from app.core.database import get_db
+from app.core.query_budget import query_budget
 from app._else.models import (
     BaseResponse, 
+    BadgeResponse, 
     NewsResponse, 
     ShareRequest, 
     ShareRecordsResponse
 )
-from app._else.module import NewsModule, ShareModule, BadgeModule
+from app._else.module import (
+    NewsModule, ShareModule, BadgeModule,
+    NEWS_DEFAULT_LIMIT, NEWS_MAX_LIMIT, SHARE_DEFAULT_LIMIT, SHARE_MAX_LIMIT
+)
+from app.feed.module import FeedModule
 
 router = APIRouter()
+security = HTTPBearer(auto_error=False)
 
 # ==================== 最新消息 API ====================
 @router.get("/news", response_model=NewsResponse, summary="最新消息", tags=["其他"])
-def get_news(db: Session = Depends(get_db)):
+def get_news(
+    limit: int = Query(NEWS_DEFAULT_LIMIT, ge=1, le=NEWS_MAX_LIMIT, description="每頁筆數"),
+    before_id: Optional[int] = Query(None, description="上一頁回應的 next_before_id"),
+    group: Optional[int] = Query(None, description="分組，只列出該分組與全體的消息"),
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+):
     """
     ## 最新消息
     
@@ -23,11 +38,15 @@ def get_news(db: Session = Depends(get_db)):
     ### URL: /api/news
     
     ### Request Parameters
-    - 無需參數
+    - **Bearer Token**（選填）：帶入時另外列出發給自己的消息
+    - **limit**: 每頁筆數（預設 20）
+    - **before_id**: 上一頁回應的 next_before_id
+    - **group**: 分組（選填）
     
     ### Response
     - **status**: "0" = 成功, "1" = 失敗
     - **message**: 訊息
+    - **next_before_id**: 下一頁的 before_id，沒有下一頁時為 null
     - **news**: 最新消息列表
       - id: 消息ID
       - member_id: 會員ID
@@ -37,34 +56,30 @@ def get_news(db: Session = Depends(get_db)):
       - pushed_at: 推送時間
       - created_at: 建立時間
       - updated_at: 更新時間
+    
+    回應帶有 ETag，可用 If-None-Match 取得 304。
     """
-    try:
-        news_list = NewsModule.get_news_list(db)
-        
-        if not news_list:
-            # 沒有消息時返回空列表
-            return {
-                "status": "0",
-                "message": "目前沒有最新消息",
-                "news": []
-            }
-        
-        return {
-            "status": "0",
-            "message": "ok",
-            "news": [news.dict() for news in news_list]
-        }
-    except Exception as e:
+    authorization = f"Bearer {credentials.credentials}" if credentials else None
+    member_id = FeedModule.parse_user_id_from_token(authorization) if authorization else None
+    
+    body = NewsModule.get_news_page(db, limit, before_id, member_id, group)
+    if body is None:
         return {
             "status": "1",
-            "message": f"查詢失敗: {str(e)}",
+            "message": "查詢失敗",
             "news": []
         }
+    # 已是序列化好的 JSON，直接回傳
+    return Response(content=body, media_type="application/json")
 
 
 # ==================== 分享 API ====================
 @router.post("/share", response_model=BaseResponse, summary="分享", tags=["其他"])
-def share_content(request: ShareRequest, db: Session = Depends(get_db)):
+def share_content(
+    request: ShareRequest,
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+):
     """
     ## 分享
     
@@ -99,10 +114,15 @@ def share_content(request: ShareRequest, db: Session = Depends(get_db)):
     ```
     """
     try:
-        # TODO: 從 JWT token 獲取當前用戶ID
-        current_user_id = 1  # 暫時硬編碼
+        authorization = f"Bearer {credentials.credentials}" if credentials else None
+        current_user_id = FeedModule.parse_user_id_from_token(authorization)
+        if not current_user_id:
+            return {
+                "status": "1",
+                "message": "身份驗證失敗"
+            }
         
-        # 創建分享記錄
+        # 創建分享記錄（同時寫入好友的動態）
         success = ShareModule.create_share(
             db=db,
             record_id=request.id,
@@ -131,7 +151,14 @@ def share_content(request: ShareRequest, db: Session = Depends(get_db)):
 
 # ==================== 查看分享 API ====================
 @router.get("/share/{type}", response_model=ShareRecordsResponse, summary="查看分享", tags=["其他"])
-def view_share_by_type(type: int, db: Session = Depends(get_db)):
+@query_budget(statements=6, repeats=1)
+def view_share_by_type(
+    type: int,
+    limit: int = Query(SHARE_DEFAULT_LIMIT, ge=1, le=SHARE_MAX_LIMIT, description="每頁筆數"),
+    before_id: Optional[int] = Query(None, description="上一頁回應的 next_before_id"),
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+):
     """
     ## 查看分享
     
@@ -148,9 +175,14 @@ def view_share_by_type(type: int, db: Session = Depends(get_db)):
       - 3: 飲食
       - 4: 其他
     
+    ### Query Parameters
+    - **limit**: 每頁筆數（預設 20）
+    - **before_id**: 上一頁回應的 next_before_id
+    
     ### Response
     - **status**: "0" = 成功, "1" = 失敗
     - **message**: 訊息
+    - **next_before_id**: 下一頁的 before_id，沒有下一頁時為 null
     - **records**: 分享記錄列表，包含：
       - 健康數據（血壓值、體重、血糖等）
       - 記錄時間
@@ -166,20 +198,29 @@ def view_share_by_type(type: int, db: Session = Depends(get_db)):
                 "records": []
             }
         
-        # TODO: 從 JWT token 獲取當前用戶ID
-        current_user_id = 1  # 暫時硬編碼
+        authorization = f"Bearer {credentials.credentials}" if credentials else None
+        current_user_id = FeedModule.parse_user_id_from_token(authorization)
+        if not current_user_id:
+            return {
+                "status": "1",
+                "message": "身份驗證失敗",
+                "records": []
+            }
         
         # 查詢分享記錄
-        records = ShareModule.get_shared_records(
+        records, next_before_id = ShareModule.get_shared_records(
             db=db,
             data_type=type,
-            user_id=current_user_id
+            user_id=current_user_id,
+            limit=limit,
+            before_id=before_id
         )
         
         return {
             "status": "0",
             "message": "ok",
-            "records": [record.dict() for record in records]
+            "records": [record.dict() for record in records],
+            "next_before_id": next_before_id
         }
         
     except Exception as e:
@@ -191,8 +232,11 @@ def view_share_by_type(type: int, db: Session = Depends(get_db)):
 
 
 # ==================== 更新 Badge API ====================
-@router.put("/user/badge", response_model=BaseResponse, summary="更新Badge", tags=["其他"])
-def update_badge(db: Session = Depends(get_db)):
+@router.put("/user/badge", response_model=BadgeResponse, summary="更新Badge", tags=["其他"])
+def update_badge(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+):
     """
     ## 更新Badge
     
@@ -207,25 +251,35 @@ def update_badge(db: Session = Depends(get_db)):
     ### Response
     - **status**: "0" = 成功, "1" = 失敗
     - **message**: 訊息
+    - **badge**: 已取得的徽章（位元旗標）
+    - **record_streak**: 目前連續記錄天數
+    - **in_range_streak**: 目前血糖在範圍內的連續天數
+    - **share_count**: 分享次數
     
     ### 徽章類型
-    - 🏆 連續記錄 7 天
-    - 🏆 連續記錄 30 天
-    - 🏆 血糖控制良好
-    - 🏆 樂於分享
-    - 🏆 健康生活達人
+    - 🏆 連續記錄 7 天（1）
+    - 🏆 連續記錄 30 天（2）
+    - 🏆 血糖控制良好（4）
+    - 🏆 樂於分享（8）
+    - 🏆 健康生活達人（16）
     """
     try:
-        # TODO: 從 JWT token 獲取當前用戶ID
-        current_user_id = 1  # 暫時硬編碼
+        authorization = f"Bearer {credentials.credentials}" if credentials else None
+        current_user_id = FeedModule.parse_user_id_from_token(authorization)
+        if not current_user_id:
+            return {
+                "status": "1",
+                "message": "身份驗證失敗"
+            }
         
-        # 更新徽章
-        success = BadgeModule.update_user_badge(db, current_user_id)
+        # 讀取上傳記錄時已更新的徽章狀態
+        state = BadgeModule.update_user_badge(db, current_user_id)
         
-        if success:
+        if state is not None:
             return {
                 "status": "0",
-                "message": "成功"
+                "message": "成功",
+                **state
             }
         else:
             return {
@@ -237,4 +291,4 @@ def update_badge(db: Session = Depends(get_db)):
         return {
             "status": "1",
             "message": f"失敗: {str(e)}"
-        }
\ No newline at end of file
+        }
@@ -0,0 +1,305 @@
+# -*- coding: utf-8 -*-
+"""
+徽章與連續記錄計算
+
+每次上傳記錄或分享時，只根據 user_badges 中保存的狀態（最後日期、目前連續天數）
+做 O(1) 的遞增更新，不重新掃描歷史資料。
+補登較早日期或刪除記錄時無法遞增計算，只標記 needs_recompute，
+由背景任務 recompute_user 重新掃描該用戶的歷史資料。
+"""
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+from sqlalchemy import select, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app._else.models import UserBadge
+from app._user.models import UserProfile, UserDefaults
+from app.core.data_version import bump_data_version, SCOPE_PROFILE
+from app.core.database import engine
+from common.utils import get_logger, get_taiwan_time
+
+logger = get_logger(__name__)
+
+# 徽章（位元旗標，存於 UserProfile.badge）
+BADGE_STREAK_7 = 1        # 連續記錄 7 天
+BADGE_STREAK_30 = 2       # 連續記錄 30 天
+BADGE_GOOD_CONTROL = 4    # 血糖控制良好
+BADGE_SHARER = 8          # 樂於分享
+BADGE_HEALTHY_LIFE = 16   # 健康生活達人
+
+# 取得徽章的門檻
+GOOD_CONTROL_DAYS = 14
+SHARER_COUNT = 10
+HEALTHY_LIFE_DAYS = 30
+
+# 用戶沒有設定預設值時使用的血糖範圍 (mg/dL)
+DEFAULT_SUGAR_RANGE = (70.0, 180.0)
+
+# 血糖測量時段對應的預設值欄位 (0:早上, 1:中午, 2:晚上)
+SUGAR_RANGE_FIELDS = {
+    0: ("sugar_morning_min", "sugar_morning_max"),
+    1: ("sugar_before_min", "sugar_before_max"),
+    2: ("sugar_evening_min", "sugar_evening_max"),
+}
+
+# 狀態更新函式：接收連線與目前狀態，直接修改狀態
+StateUpdate = Callable[[Any, Dict[str, Any]], None]
+
+
+def to_day(value: Union[str, date, datetime, None]) -> Optional[date]:
+    """
+    將記錄時間轉為日期（字串只取前 10 碼，與資料庫中的 substr 一致）
+
+    App 可能送出無法解析的時間（例如飲食記錄的 recorded_at 為 "string"），回傳 None
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+def upload_day(recorded_at: Union[str, date, datetime]) -> date:
+    """上傳記錄的日期，無法解析時以上傳當天計算（與日記列表改用 created_at 相同）"""
+    return to_day(recorded_at) or get_taiwan_time().date()
+
+
+def advance_streak(
+    last_day: Optional[date], streak: int, day: date, ok: bool = True
+) -> Tuple[Optional[date], int, bool]:
+    """
+    以一筆新記錄推進連續天數
+
+    同一天的記錄只在 ok=False 時把當天歸零；隔天的記錄延續；
+    中間有空白的日期重新計算；比最後日期更早的記錄無法遞增處理。
+
+    Args:
+        last_day: 目前最後一筆記錄的日期
+        streak: 到 last_day 為止的連續天數
+        day: 新記錄的日期
+        ok: 這筆記錄是否符合條件（例如血糖在範圍內）
+
+    Returns:
+        (新的最後日期, 新的連續天數, 是否為補登的舊日期)
+    """
+    if last_day is None or day > last_day + timedelta(days=1):
+        return day, 1 if ok else 0, False
+    if day == last_day + timedelta(days=1):
+        return day, streak + 1 if ok else 0, False
+    if day == last_day:
+        return day, streak if ok else 0, False
+    return last_day, streak, True
+
+
+def compute_badges(state: Dict[str, Any]) -> int:
+    """
+    依目前狀態計算應取得的徽章
+
+    Args:
+        state: user_badges 的欄位
+
+    Returns:
+        徽章位元旗標
+    """
+    badge = 0
+    if state["longest_record_streak"] >= 7:
+        badge |= BADGE_STREAK_7
+    if state["longest_record_streak"] >= 30:
+        badge |= BADGE_STREAK_30
+    if state["longest_in_range_streak"] >= GOOD_CONTROL_DAYS:
+        badge |= BADGE_GOOD_CONTROL
+    if state["share_count"] >= SHARER_COUNT:
+        badge |= BADGE_SHARER
+    if min(state["longest_record_streak"], state["longest_in_range_streak"]) >= HEALTHY_LIFE_DAYS:
+        badge |= BADGE_HEALTHY_LIFE
+    return badge
+
+
+def sugar_range(defaults: Optional[Dict[str, Any]], meal_time: int) -> Tuple[float, float]:
+    """
+    取得用戶在該時段的血糖範圍
+
+    Args:
+        defaults: UserDefaults 的欄位（沒有設定時為 None）
+        meal_time: 測量時段
+
+    Returns:
+        (最小值, 最大值)
+    """
+    min_field, max_field = SUGAR_RANGE_FIELDS.get(meal_time, SUGAR_RANGE_FIELDS[1])
+    low = defaults.get(min_field) if defaults else None
+    high = defaults.get(max_field) if defaults else None
+    return low or DEFAULT_SUGAR_RANGE[0], high or DEFAULT_SUGAR_RANGE[1]
+
+
+def _apply_record(state: Dict[str, Any], day: date) -> None:
+    """記錄天數推進一筆"""
+    last_day, streak, stale = advance_streak(state["last_record_date"], state["record_streak"], day)
+    if stale:
+        state["needs_recompute"] = True
+        return
+    state["last_record_date"], state["record_streak"] = last_day, streak
+    state["longest_record_streak"] = max(state["longest_record_streak"], streak)
+
+
+def _apply_sugar(state: Dict[str, Any], day: date, in_range: bool) -> None:
+    """血糖在範圍內的天數推進一筆"""
+    last_day, streak, stale = advance_streak(state["last_sugar_date"], state["in_range_streak"], day, in_range)
+    if stale:
+        state["needs_recompute"] = True
+        return
+    state["last_sugar_date"], state["in_range_streak"] = last_day, streak
+    state["longest_in_range_streak"] = max(state["longest_in_range_streak"], streak)
+
+
+def _load_defaults(conn, user_id: int) -> Optional[Dict[str, Any]]:
+    """讀取用戶的血糖預設範圍"""
+    row = conn.execute(
+        select(UserDefaults.__table__).where(UserDefaults.user_id == user_id)
+    ).mappings().first()
+    return dict(row) if row else None
+
+
+def _update_state(user_id: int, apply: StateUpdate) -> bool:
+    """
+    在同一個寫入交易中讀取、更新狀態，並同步 UserProfile.badge
+
+    先寫入（INSERT ... DO NOTHING）取得寫入鎖，其他 worker 的更新會等待，
+    避免同時上傳時互相覆蓋連續天數。失敗時只記錄錯誤，不影響已完成的上傳。
+
+    新建立的狀態標記 needs_recompute：用戶可能在背景任務補建之前就已有歷史記錄，
+    遞增更新只算到這一筆，需由背景任務重新掃描一次。
+
+    Returns:
+        True = 更新成功（或沒有變更）, False = 失敗
+    """
+    now = get_taiwan_time()
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                sqlite_insert(UserBadge)
+                .values(user_id=user_id, needs_recompute=True, updated_at=now)
+                .on_conflict_do_nothing(index_elements=[UserBadge.user_id])
+            )
+            row = conn.execute(
+                select(UserBadge.__table__).where(UserBadge.user_id == user_id)
+            ).mappings().one()
+
+            state = dict(row)
+            apply(conn, state)
+            # 徽章取得後不會因為刪除記錄而失去
+            state["badge"] = row["badge"] | compute_badges(state)
+
+            changes = {key: value for key, value in state.items() if row[key] != value}
+            if not changes:
+                return True
+            conn.execute(
+                update(UserBadge).where(UserBadge.user_id == user_id).values(**changes, updated_at=now)
+            )
+            if "badge" in changes:
+                conn.execute(
+                    update(UserProfile).where(UserProfile.user_id == user_id).values(badge=state["badge"])
+                )
+                bump_data_version(conn, user_id, SCOPE_PROFILE)
+    except Exception as e:
+        logger.error(f"更新徽章狀態失敗 user_id={user_id}: {str(e)}", exc_info=True)
+        return False
+    return True
+
+
+def record_activity(user_id: int, recorded_at: Union[str, date, datetime]) -> None:
+    """
+    上傳一筆記錄（血壓、體重、飲食）後更新連續記錄天數
+
+    Args:
+        user_id: 使用者 ID
+        recorded_at: 記錄時間
+    """
+    _update_state(user_id, lambda conn, state: _apply_record(state, upload_day(recorded_at)))
+
+
+def record_sugar(user_id: int, recorded_at: Union[str, date, datetime], glucose: float, meal_time: int) -> None:
+    """
+    上傳一筆血糖後更新連續記錄天數與血糖在範圍內的天數
+
+    Args:
+        user_id: 使用者 ID
+        recorded_at: 記錄時間
+        glucose: 血糖值
+        meal_time: 測量時段
+    """
+    def apply(conn, state):
+        day = upload_day(recorded_at)
+        low, high = sugar_range(_load_defaults(conn, user_id), meal_time)
+        _apply_record(state, day)
+        _apply_sugar(state, day, low <= glucose <= high)
+
+    _update_state(user_id, apply)
+
+
+def record_share(user_id: int) -> None:
+    """分享一筆記錄後更新分享次數"""
+    def apply(conn, state):
+        state["share_count"] += 1
+
+    _update_state(user_id, apply)
+
+
+def mark_recompute(user_id: int) -> None:
+    """刪除記錄後標記需要重新計算（連續天數無法遞減）"""
+    def apply(conn, state):
+        state["needs_recompute"] = True
+
+    _update_state(user_id, apply)
+
+
+def recompute_user(user_id: int) -> bool:
+    """
+    重新掃描歷史資料計算狀態（補登、刪除記錄或初次建立時使用）
+
+    飲食記錄的 recorded_at 為 "string" 時改用 created_at（與日記列表相同），
+    其他無法解析的日期略過。
+
+    Args:
+        user_id: 使用者 ID
+
+    Returns:
+        True = 成功, False = 失敗
+    """
+    def apply(conn, state):
+        params = {"user_id": user_id}
+        days = conn.execute(text("""
+            SELECT substr(measured_at, 1, 10) AS day FROM blood_pressure_records WHERE user_id = :user_id
+            UNION SELECT substr(measured_at, 1, 10) FROM weight_records WHERE user_id = :user_id
+            UNION SELECT substr(measured_at, 1, 10) FROM blood_sugar_records WHERE user_id = :user_id
+            UNION SELECT substr(CASE WHEN recorded_at = 'string' THEN created_at ELSE recorded_at END, 1, 10)
+                  FROM DiaryDiet WHERE user_id = :user_id
+            ORDER BY day
+        """), params).scalars().all()
+        sugars = conn.execute(text("""
+            SELECT substr(measured_at, 1, 10), glucose, meal_time FROM blood_sugar_records
+            WHERE user_id = :user_id ORDER BY measured_at
+        """), params).all()
+        share_count = conn.execute(text("""
+            SELECT COUNT(DISTINCT fid || ':' || data_type || ':' || relation_type || ':' || created_at)
+            FROM Share WHERE user_id = :user_id
+        """), params).scalar()
+
+        state.update(
+            last_record_date=None, record_streak=0, longest_record_streak=0,
+            last_sugar_date=None, in_range_streak=0, longest_in_range_streak=0,
+            share_count=share_count or 0, needs_recompute=False
+        )
+        for day in filter(None, map(to_day, days)):
+            _apply_record(state, day)
+        defaults = _load_defaults(conn, user_id)
+        for day, glucose, meal_time in sugars:
+            day = to_day(day)
+            if day is None:
+                continue
+            low, high = sugar_range(defaults, meal_time)
+            _apply_sugar(state, day, low <= glucose <= high)
+
+    return _update_state(user_id, apply)
@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Float, Text
+from sqlalchemy import Column, Integer, String, Boolean, Date, DateTime, ForeignKey, Float, Text, Index, DDL, event
 from datetime import datetime
 from pydantic import BaseModel, Field
 from typing import List, Optional, Dict
 from app.core.database import Base
+from common.utils import get_taiwan_time
 
 # ==================== SQLAlchemy 資料庫模型 ====================
 
@@ -11,86 +12,143 @@ class News(Base):
     __tablename__ = "News"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-    member_id = Column(Integer, nullable=True)
-    group = Column(Integer, nullable=True)
+    member_id = Column(Integer, nullable=True, default=0)  # 0 = 所有人
+    group = Column(Integer, nullable=True, default=0)  # 0 = 所有人
     title = Column(String, nullable=False)
     message = Column(Text, nullable=False)
     pushed_at = Column(DateTime, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
-    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    # 與其他資料表相同使用台灣時間（created_at 決定消息的排序）
+    created_at = Column(DateTime, default=get_taiwan_time)
+    updated_at = Column(DateTime, default=get_taiwan_time, onupdate=get_taiwan_time)
+
+    __table_args__ = (
+        Index("ix_news_member_group_created", "member_id", "group", "created_at", "id"),
+    )
+
+
+# 直接寫入資料表（後台、SQL）也會更新 /api/news 的版本號，ETag 與頁面快取才會失效；
+# 與 add_news_version_triggers migration 相同，供 create_all 建立資料表時使用（DDL 會做 % 替換，故寫成 %%）
+_BUMP_NEWS_VERSION = """
+    INSERT INTO data_versions (user_id, scope, version, updated_at)
+    VALUES (0, 'news', 1, strftime('%%Y-%%m-%%d %%H:%%M:%%S.000000', 'now', '+8 hours'))
+    ON CONFLICT (user_id, scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at;
+"""
+for _name, _timing in (
+    ("news_version_insert", "AFTER INSERT"),
+    ("news_version_update", "AFTER UPDATE"),
+    ("news_version_delete", "AFTER DELETE"),
+):
+    event.listen(News.__table__, "after_create", DDL(
+        f'CREATE TRIGGER IF NOT EXISTS {_name} {_timing} ON "News" BEGIN {_BUMP_NEWS_VERSION} END'
+    ))
+
 
 class ShareDB(Base):
     """分享記錄資料表"""
     __tablename__ = "Share"
     
     id = Column(Integer, primary_key=True, autoincrement=True)
-        fid = Column(String(50), nullable=False)  # 外部 ID (紀錄 ID)
-        data_type = Column(Integer, nullable=False)  # 種類 (0:血壓; 1:體重; 2:血糖; 3:飲食; 4:其他)
-        relation_type = Column(Integer, nullable=False)  # 關係類型 (1:親友; 2:糖友)
-        user_id = Column(Integer, ForeignKey('UserAuth.id'))  # 分享者的使用者 ID
-        shared_with_user_id = Column(Integer, nullable=True)  # 被分享對象的使用者 ID
-        created_at = Column(DateTime, default=datetime.utcnow)
-        updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
-
-    # ==================== Pydantic API 模型 ====================
-
-    class BaseResponse(BaseModel):
-        """基本回應格式"""
-        status: str
-        message: str
-
-    class NewsItem(BaseModel):
-        """最新消息項目"""
-        id: int
-        member_id: int
-        group: int
-        title: str
-        message: str
-        pushed_at: str
-        created_at: str
-        updated_at: str
-
-    class NewsResponse(BaseResponse):
-        """最新消息回應"""
-        news: List[NewsItem] = []
-
-    class ShareRequest(BaseModel):
-        """分享請求"""
-        type: int = Field(..., ge=0, le=4, description="種類, 0：血壓；1：體重；2：血糖；3：飲食；4：其他")
-        id: int = Field(..., ge=0, description="紀錄ID")
-        relation_type: int = Field(..., ge=1, le=2, description="1：親友；2：糖友")
-        
-        class Config:
-            json_schema_extra = {
-                "example": {
-                    "type": 1,
-                    "id": 1,
-                    "relation_type": 1
-                }
-            }   
-
-    class LocationData(BaseModel):
-        """位置資料"""
-        lat: str
-        lng: str
-
-    class UserInfo(BaseModel):
-        """用戶資訊"""
-        id: int
-        name: str
-        account: str
-
-    class ShareRecord(BaseModel):
-        """分享記錄"""
-        id: int
-        user_id: int
-        sugar: Optional[float] = None
-        timeperiod: Optional[int] = None
-        weight: Optional[float] = None
-        body_fat: Optional[float] = None
-        bmi: Optional[float] = None
-        systolic: Optional[int] = None
-        diastolic: Optional[int] = None
+    fid = Column(String(50), nullable=False)  # 外部 ID (紀錄 ID)
+    data_type = Column(Integer, nullable=False)  # 種類 (0:血壓; 1:體重; 2:血糖; 3:飲食; 4:其他)
+    relation_type = Column(Integer, nullable=False)  # 關係類型 (1:親友; 2:糖友)
+    user_id = Column(Integer, ForeignKey('UserAuth.id'))  # 分享者的使用者 ID
+    shared_with_user_id = Column(Integer, nullable=True)  # 被分享對象的使用者 ID
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # 查看分享：WHERE shared_with_user_id = ? AND data_type = ? ORDER BY created_at DESC
+    __table_args__ = (
+        Index("ix_share_recipient_type_created", "shared_with_user_id", "data_type", "created_at"),
+    )
+
+class UserBadge(Base):
+    """徽章與連續記錄狀態（每位用戶一列，上傳記錄時遞增更新）"""
+    __tablename__ = "user_badges"
+
+    user_id = Column(Integer, primary_key=True)
+    badge = Column(Integer, nullable=False, default=0)  # 已取得的徽章（位元旗標）
+    last_record_date = Column(Date, nullable=True)  # 最後一次記錄的日期
+    record_streak = Column(Integer, nullable=False, default=0)  # 到 last_record_date 為止的連續記錄天數
+    longest_record_streak = Column(Integer, nullable=False, default=0)
+    last_sugar_date = Column(Date, nullable=True)  # 最後一次血糖記錄的日期
+    in_range_streak = Column(Integer, nullable=False, default=0)  # 到 last_sugar_date 為止血糖都在範圍內的連續天數
+    longest_in_range_streak = Column(Integer, nullable=False, default=0)
+    share_count = Column(Integer, nullable=False, default=0)  # 分享次數
+    needs_recompute = Column(Boolean, nullable=False, default=False)  # 新建立、補登或刪除記錄後需要重新計算
+    updated_at = Column(DateTime, nullable=True)
+
+    # 重新計算任務：WHERE needs_recompute = 1
+    __table_args__ = (
+        Index("ix_user_badges_needs_recompute", "needs_recompute"),
+    )
+
+# ==================== Pydantic API 模型 ====================
+
+class BaseResponse(BaseModel):
+    """基本回應格式"""
+    status: str
+    message: str
+
+class NewsItem(BaseModel):
+    """最新消息項目"""
+    id: int
+    member_id: int
+    group: int
+    title: str
+    message: str
+    pushed_at: str
+    created_at: str
+    updated_at: str
+
+class BadgeResponse(BaseResponse):
+    """徽章回應"""
+    badge: int = 0
+    record_streak: int = 0
+    in_range_streak: int = 0
+    share_count: int = 0
+
+class NewsResponse(BaseResponse):
+    """最新消息回應"""
+    news: List[NewsItem] = []
+    next_before_id: Optional[int] = None
+
+class ShareRequest(BaseModel):
+    """分享請求"""
+    type: int = Field(..., ge=0, le=4, description="種類, 0：血壓；1：體重；2：血糖；3：飲食；4：其他")
+    id: int = Field(..., ge=0, description="紀錄ID")
+    relation_type: int = Field(..., ge=1, le=2, description="1：親友；2：糖友")
+    
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "type": 1,
+                "id": 1,
+                "relation_type": 1
+            }
+        }   
+
+class LocationData(BaseModel):
+    """位置資料"""
+    lat: str
+    lng: str
+
+class UserInfo(BaseModel):
+    """用戶資訊"""
+    id: int
+    name: str
+    account: str
+
+class ShareRecord(BaseModel):
+    """分享記錄"""
+    id: int
+    user_id: int
+    sugar: Optional[float] = None
+    timeperiod: Optional[int] = None
+    weight: Optional[float] = None
+    body_fat: Optional[float] = None
+    bmi: Optional[float] = None
+    systolic: Optional[int] = None
+    diastolic: Optional[int] = None
     pulse: Optional[int] = None
     meal: Optional[int] = None
     tag: List[str] = []
@@ -107,4 +165,5 @@ class ShareDB(Base):
 
 class ShareRecordsResponse(BaseResponse):
     """查看分享回應"""
-    records: List[ShareRecord] = []
\ No newline at end of file
+    records: List[ShareRecord] = []
+    next_before_id: Optional[int] = None
\ No newline at end of file
@@ -1,32 +1,81 @@
 # -*- coding: utf-8 -*-
+import json
 from sqlalchemy.orm import Session
-from sqlalchemy import desc
-from app._else.models import News, ShareDB, NewsItem, ShareRecord, UserInfo, LocationData
-from datetime import datetime
-from typing import List, Optional
-from common.utils import get_logger
+from sqlalchemy import select, text, update, bindparam, tuple_
+from app._else import badges
+from app._else.models import News, ShareDB, UserBadge, NewsItem, ShareRecord, UserInfo, LocationData
+from app._else.news_cache import news_cache
+from app.account.models import User
+from app.core.data_version import get_data_version, GLOBAL_USER_ID, SCOPE_NEWS
+from app.core.responses import dump_json
+from app._user.models import UserProfile
+from app.measurement.models import BloodPressureRecord, WeightRecord, BloodSugarRecord
+from app.feed.module import FeedModule
+from app.friend.module import FriendModule
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Set, Tuple
+from common.utils import get_logger, get_taiwan_time
 
 logger = get_logger(__name__)
 
+# 最新消息每頁筆數
+NEWS_DEFAULT_LIMIT = 20
+NEWS_MAX_LIMIT = 100
+
+# 徽章重新計算任務每次處理的用戶數
+BADGE_RECOMPUTE_BATCH = 200
+
+# 查看分享每頁筆數
+SHARE_DEFAULT_LIMIT = 20
+SHARE_MAX_LIMIT = 100
+
+# 分享記錄中不屬於該資料類型的欄位
+SHARE_RECORD_DEFAULTS = {
+    "sugar": 0.0, "timeperiod": 0, "weight": 0.0, "body_fat": 0.0, "bmi": 0.0,
+    "systolic": 0, "diastolic": 0, "pulse": 0, "meal": 0,
+    "tag": [], "image": [], "location": LocationData(lat="0", lng="0"),
+}
+
 class NewsModule:
     """最新消息業務邏輯"""
     
     @staticmethod
-    def get_news_list(db: Session, limit: int = 20) -> List[NewsItem]:
+    def get_news_list(
+        db: Session, limit: int = NEWS_DEFAULT_LIMIT, before_id: Optional[int] = None,
+        member_id: Optional[int] = None, group: Optional[int] = None
+    ) -> Tuple[List[NewsItem], Optional[int]]:
         """
         獲取最新消息列表
         
+        member_id / group 為 0 的消息發給所有人；指定 member_id 時另外包含
+        發給該用戶的消息，指定 group 時只包含該分組與全體的消息。
+        查詢走 (member_id, group, created_at, id) 索引。
+        
         Args:
             db: 資料庫 session
-            limit: 返回數量限制
+            limit: 每頁筆數
+            before_id: 上一頁最後一筆消息的 ID
+            member_id: 目前用戶 ID（未登入為 None）
+            group: 分組
             
         Returns:
-            最新消息列表
+            (最新消息列表, 下一頁的 before_id)
         """ 
         try:
-            news_list = db.query(News).order_by(desc(News.created_at)).limit(limit).all()
+            limit = min(limit, NEWS_MAX_LIMIT)
+            query = select(News).where(
+                News.member_id.in_([0, member_id]) if member_id else News.member_id == 0
+            )
+            if group:
+                query = query.where(News.group.in_([0, group]))
+            if before_id is not None:
+                cursor_created_at = select(News.created_at).where(News.id == before_id).scalar_subquery()
+                query = query.where(tuple_(News.created_at, News.id) < tuple_(cursor_created_at, before_id))
+            news_list = db.execute(
+                query.order_by(News.created_at.desc(), News.id.desc()).limit(limit)
+            ).scalars().all()
             
-            return [
+            items = [
                 NewsItem(
                     id=news.id,
                     member_id=news.member_id or 0,
@@ -39,19 +88,127 @@ class NewsModule:
                 )
                 for news in news_list
             ]
+            next_before_id = news_list[-1].id if len(news_list) == limit else None
+            return items, next_before_id
+        except Exception as e:
+            logger.error(f"查詢最新消息失敗: {str(e)}", exc_info=True)
+            return [], None
+    
+    @staticmethod
+    def get_news_page(
+        db: Session, limit: int = NEWS_DEFAULT_LIMIT, before_id: Optional[int] = None,
+        member_id: Optional[int] = None, group: Optional[int] = None
+    ) -> Optional[bytes]:
+        """
+        獲取序列化後的最新消息回應（JSON）
+        
+        沒有個人消息的用戶共用同一份快取頁面；有個人消息的用戶直接查詢。
+        
+        Args:
+            db: 資料庫 session
+            limit: 每頁筆數
+            before_id: 上一頁最後一筆消息的 ID
+            member_id: 目前用戶 ID（未登入為 None）
+            group: 分組
+            
+        Returns:
+            回應內容，查詢失敗時回傳 None
+        """
+        try:
+            version, _ = get_data_version(GLOBAL_USER_ID, SCOPE_NEWS)
+            news_cache.sync(version)
+            
+            if member_id and member_id not in NewsModule._get_targeted_members(db, version):
+                member_id = None
+            if member_id:
+                return NewsModule._serialize_page(*NewsModule.get_news_list(db, limit, before_id, member_id, group))
+            
+            key = (group or 0, limit, before_id)
+            body = news_cache.get_page(key)
+            if body is None:
+                body = NewsModule._serialize_page(*NewsModule.get_news_list(db, limit, before_id, None, group))
+                news_cache.put_page(key, body, version)
+            return body
         except Exception as e:
             logger.error(f"查詢最新消息失敗: {str(e)}", exc_info=True)
-            return []
+            return None
+    
+    @staticmethod
+    def create_news(
+        db: Session, title: str, message: str, member_id: int = 0, group: int = 0,
+        pushed_at: Optional[datetime] = None
+    ) -> Optional[int]:
+        """
+        新增最新消息（News 的 trigger 會更新版本號，所有 worker 的快取與 ETag 隨之失效）
+        
+        Args:
+            db: 資料庫 session
+            title: 標題
+            message: 內容
+            member_id: 指定用戶（0 = 所有人）
+            group: 指定分組（0 = 所有人）
+            pushed_at: 推送時間
+            
+        Returns:
+            消息 ID，失敗時回傳 None
+        """
+        try:
+            news = News(
+                member_id=member_id or 0,
+                group=group or 0,
+                title=title,
+                message=message,
+                pushed_at=pushed_at
+            )
+            db.add(news)
+            db.commit()
+            return news.id
+        except Exception as e:
+            logger.error(f"新增最新消息失敗: {str(e)}", exc_info=True)
+            db.rollback()
+            return None
+    
+    @staticmethod
+    def _get_targeted_members(db: Session, version: int) -> Set[int]:
+        """取得有個人消息的用戶 ID（與頁面一起快取）"""
+        members = news_cache.get_targeted_members()
+        if members is None:
+            members = set(db.execute(
+                select(News.member_id).where(News.member_id > 0).distinct()
+            ).scalars())
+            news_cache.put_targeted_members(members, version)
+        return members
+    
+    @staticmethod
+    def _serialize_page(items: List[NewsItem], next_before_id: Optional[int]) -> bytes:
+        """組成與 JSONResponse 相同格式的回應內容"""
+        payload = {
+            "status": "0",
+            "message": "ok" if items else "目前沒有最新消息",
+            "news": [item.dict() for item in items],
+            "next_before_id": next_before_id,
+        }
+        return dump_json(payload)
 
 
 class ShareModule:
     """分享業務邏輯"""
     
+    # data_type 對應的測量資料表（3: 飲食為 raw sqlite 表 DiaryDiet，4: 其他沒有對應的表）
+    RECORD_MODELS = {
+        0: BloodPressureRecord,
+        1: WeightRecord,
+        2: BloodSugarRecord,
+    }
+    
     @staticmethod
     def create_share(db: Session, record_id: int, data_type: int, relation_type: int, user_id: int) -> bool:
         """
         創建分享記錄
         
+        為每位符合關係類型的好友各寫入一筆 Share（shared_with_user_id），
+        並同時寫入他們的動態收件匣；沒有好友時仍保留一筆分享記錄。
+        
         Args:
             db: 資料庫 session
             record_id: 記錄ID
@@ -64,21 +221,46 @@ class ShareModule:
         """
         try:
             # 檢查記錄是否存在
-            if not ShareModule._check_record_exists(db, record_id, data_type):
+            if not ShareModule._check_record_exists(db, record_id, data_type, user_id):
                 return False
             
+            # 分享會讓收件者永久可讀取這筆記錄，不使用各 worker 的好友快取
+            # （其他 worker 刪除好友後最多 30 秒才失效），直接從資料庫讀取目前的好友
+            recipients = [
+                friend_id
+                for friend_id, friend_relation in FriendModule()._load_friend_edges(user_id)
+                if friend_relation == relation_type
+            ]
+            
             # 創建分享記錄
-            share = ShareDB(
-                fid=str(record_id),
+            now = datetime.utcnow()
+            shares = [
+                ShareDB(
+                    fid=str(record_id),
+                    data_type=data_type,
+                    relation_type=relation_type,
+                    user_id=user_id,
+                    shared_with_user_id=recipient_id,
+                    created_at=now,
+                    updated_at=now
+                )
+                for recipient_id in (recipients or [None])
+            ]
+            db.add_all(shares)
+            db.flush()
+            
+            # 寫入好友的動態收件匣（與分享記錄同一個交易）
+            FeedModule.fan_out(
+                db,
+                [(share.shared_with_user_id, share.id) for share in shares if share.shared_with_user_id],
+                actor_id=user_id,
+                record_id=str(record_id),
                 data_type=data_type,
-                relation_type=relation_type,
-                user_id=user_id,
-                created_at=datetime.utcnow(),
-                updated_at=datetime.utcnow()
+                relation_type=relation_type
             )
             
-            db.add(share)
             db.commit()
+            badges.record_share(user_id)
             return True
             
         except Exception as e:
@@ -87,124 +269,248 @@ class ShareModule:
             return False
     
     @staticmethod
-    def _check_record_exists(db: Session, record_id: int, data_type: int) -> bool:
+    def _check_record_exists(db: Session, record_id: int, data_type: int, user_id: int) -> bool:
         """
-        檢查記錄是否存在
+        檢查記錄是否存在且屬於分享者
         
         Args:
             db: 資料庫 session
             record_id: 記錄ID
             data_type: 資料類型
+            user_id: 分享者ID
             
         Returns:
             是否存在
         """
-        # TODO: 根據 data_type 查詢對應的資料表
-        # 0: BloodPressure, 1: Weight, 2: BloodSugar, 3: DiaryDiet, 4: 其他
-        # 暫時返回 True
-        return True
+        if data_type == 4:
+            # 其他：沒有對應的資料表
+            return True
+        
+        record = ShareModule._load_records(db, data_type, [str(record_id)]).get(str(record_id))
+        return record is not None and record["user_id"] == user_id
     
     @staticmethod
-    def get_shared_records(db: Session, data_type: int, user_id: int) -> List[ShareRecord]:
+    def get_shared_records(
+        db: Session, data_type: int, user_id: int, limit: int = SHARE_DEFAULT_LIMIT, before_id: Optional[int] = None
+    ) -> Tuple[List[ShareRecord], Optional[int]]:
         """
-        獲取分享記錄列表
+        獲取分享給當前用戶的記錄列表
+        
+        一次查詢取得這一頁的 Share（走 (shared_with_user_id, data_type, created_at) 索引，
+        同時帶出分享者名稱與帳號），再以一次 IN 查詢取得對應的測量記錄。
         
         Args:
             db: 資料庫 session
             data_type: 資料類型
             user_id: 當前用戶ID
+            limit: 每頁筆數
+            before_id: 上一頁最後一筆 Share 的 ID
             
         Returns:
-            分享記錄列表
+            (分享記錄列表, 下一頁的 before_id)
         """
         try:
-            # 查詢分享給當前用戶的記錄
-            shares = db.query(ShareDB).filter(
-                ShareDB.data_type == data_type,
-                # TODO: 添加分享對象過濾條件
-                # ShareDB.shared_with_user_id == user_id
+            query = (
+                select(ShareDB, UserProfile.name, User.account)
+                .outerjoin(UserProfile, UserProfile.user_id == ShareDB.user_id)
+                .outerjoin(User, User.id == ShareDB.user_id)
+                .where(
+                    ShareDB.shared_with_user_id == user_id,
+                    ShareDB.data_type == data_type
+                )
+            )
+            if before_id is not None:
+                cursor_created_at = select(ShareDB.created_at).where(ShareDB.id == before_id).scalar_subquery()
+                query = query.where(tuple_(ShareDB.created_at, ShareDB.id) < tuple_(cursor_created_at, before_id))
+            rows = db.execute(
+                query.order_by(ShareDB.created_at.desc(), ShareDB.id.desc()).limit(min(limit, SHARE_MAX_LIMIT))
             ).all()
             
+            if not rows:
+                return [], None
+            
+            health_records = ShareModule._load_records(db, data_type, [share.fid for share, _, _ in rows])
+            
             records = []
-            for share in shares:
-                # TODO: 根據 data_type 查詢對應的健康記錄
-                record = ShareModule._get_health_record(db, int(share.fid), data_type)
-                if record:
-                    records.append(record)
+            for share, name, account in rows:
+                if data_type == 4:
+                    # 其他：沒有對應的資料表，只回傳分享本身
+                    record = {
+                        "id": int(share.fid) if share.fid.isdigit() else 0,
+                        "user_id": share.user_id,
+                        "recorded_at": str(share.created_at) if share.created_at else "",
+                    }
+                else:
+                    record = health_records.get(share.fid)
+                # 記錄已被刪除，或不屬於分享者時不列出
+                if not record or record["user_id"] != share.user_id:
+                    continue
+                # App 端期望數值欄位都有值，其他類型的欄位補 0
+                fields = dict(SHARE_RECORD_DEFAULTS)
+                fields.update((key, value) for key, value in record.items() if value is not None)
+                records.append(ShareRecord(
+                    relation_type=share.relation_type,
+                    relation_id=share.user_id,
+                    message="",
+                    type=data_type,
+                    url="",
+                    created_at=str(share.created_at) if share.created_at else "",
+                    user=UserInfo(id=share.user_id, name=name or "", account=account or ""),
+                    **fields
+                ))
             
-            return records
+            next_before_id = rows[-1][0].id if len(rows) == min(limit, SHARE_MAX_LIMIT) else None
+            return records, next_before_id
             
         except Exception as e:
             logger.error(f"查詢分享記錄失敗: {str(e)}", exc_info=True)
-            return []
+            return [], None
     
     @staticmethod
-    def _get_health_record(db: Session, record_id: int, data_type: int) -> Optional[ShareRecord]:
+    def _load_records(db: Session, data_type: int, record_ids: List[str]) -> Dict[str, Dict[str, Any]]:
         """
-        獲取健康記錄詳情
+        以一次 IN 查詢載入多筆健康記錄
         
         Args:
             db: 資料庫 session
-            record_id: 記錄ID
             data_type: 資料類型
+            record_ids: 記錄ID（Share.fid）
             
         Returns:
-            健康記錄或 None
-        """
-        # TODO: 根據 data_type 查詢對應的健康記錄
-        # 目前返回假資料
-        return ShareRecord(
-            id=record_id,
-            user_id=0,
-            sugar=0.0,
-            timeperiod=0,
-            weight=0.0,
-            body_fat=0.0,
-            bmi=0.0,
-            systolic=0,
-            diastolic=0,
-            pulse=0,
-            meal=0,
-            tag=[],
-            image=[],
-            location=LocationData(lat="0", lng="0"),
-            relation_type=1,
-            relation_id=0,
-            message="",
-            type=data_type,
-            url="",
-            recorded_at="2023-06-26 17:10:11",
-            created_at="2023-06-26 17:10:11",
-            user=UserInfo(id=0, name="測試用戶", account="test")
-        )
+            {記錄ID: ShareRecord 的健康資料欄位}
+        """
+        if data_type == 3:
+            return ShareModule._load_diet_records(db, record_ids)
+        
+        model = ShareModule.RECORD_MODELS.get(data_type)
+        if model is None:
+            return {}
+        
+        ids = [int(record_id) for record_id in set(record_ids) if record_id.isdigit()]
+        if not ids:
+            return {}
+        
+        records = {}
+        for row in db.execute(select(model).where(model.id.in_(ids))).scalars():
+            record = {
+                "id": row.id,
+                "user_id": row.user_id,
+                "recorded_at": str(row.measured_at) if row.measured_at else "",
+            }
+            if data_type == 0:
+                record.update(systolic=row.systolic, diastolic=row.diastolic, pulse=row.pulse)
+            elif data_type == 1:
+                record.update(weight=row.weight, bmi=row.bmi, body_fat=row.body_fat)
+            else:
+                record.update(sugar=float(row.glucose), timeperiod=row.meal_time)
+            records[str(row.id)] = record
+        return records
+    
+    @staticmethod
+    def _load_diet_records(db: Session, record_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """以一次 IN 查詢載入多筆飲食記錄（DiaryDiet 沒有 SQLAlchemy 模型）"""
+        rows = db.execute(
+            text(
+                "SELECT id, user_id, meal, tag, image, lat, lng, recorded_at "
+                "FROM DiaryDiet WHERE id IN :ids"
+            ).bindparams(bindparam("ids", expanding=True)),
+            {"ids": list(set(record_ids))}
+        ).mappings()
+        
+        records = {}
+        for row in rows:
+            try:
+                tags = json.loads(row["tag"]) if row["tag"] else []
+            except (TypeError, ValueError):
+                tags = []
+            records[str(row["id"])] = {
+                "id": int(row["id"]) if str(row["id"]).isdigit() else 0,
+                "user_id": row["user_id"],
+                "meal": row["meal"],
+                "tag": [str(tag) for tag in tags] if isinstance(tags, list) else [str(tags)],
+                "image": [str(row["image"])] if row["image"] else [],
+                "location": LocationData(lat=str(row["lat"] or 0), lng=str(row["lng"] or 0)),
+                "recorded_at": str(row["recorded_at"]) if row["recorded_at"] else "",
+            }
+        return records
 
 
 class BadgeModule:
     """徽章業務邏輯"""
     
     @staticmethod
-    def update_user_badge(db: Session, user_id: int) -> bool:
+    def update_user_badge(db: Session, user_id: int) -> Optional[Dict[str, int]]:
         """
-        更新用戶徽章
+        讀取用戶目前的徽章與連續記錄狀態
+        
+        狀態在上傳記錄、分享時已遞增更新，這裡只做一次主鍵查詢；
+        需要重新計算的用戶由背景任務處理。
         
         Args:
             db: 資料庫 session
             user_id: 用戶ID
             
         Returns:
-            是否成功
+            徽章狀態，失敗時回傳 None
         """
         try:
-            # TODO: 計算用戶的各種成就
-            # 1. 連續記錄天數
-            # 2. 分享次數
-            # 3. 血糖/血壓控制良好天數
-            # 4. 其他成就條件
+            state = db.get(UserBadge, user_id)
+            if not state:
+                return {"badge": 0, "record_streak": 0, "in_range_streak": 0, "share_count": 0}
             
-            # TODO: 更新用戶的徽章資料
-            
-            return True
+            today = get_taiwan_time().date()
+            return {
+                "badge": state.badge,
+                "record_streak": BadgeModule._current_streak(state.last_record_date, state.record_streak, today),
+                "in_range_streak": BadgeModule._current_streak(state.last_sugar_date, state.in_range_streak, today),
+                "share_count": state.share_count,
+            }
             
         except Exception as e:
-            logger.error(f"更新徽章失敗: {str(e)}", exc_info=True)
-            return False
\ No newline at end of file
+            logger.error(f"查詢徽章失敗: {str(e)}", exc_info=True)
+            return None
+    
+    @staticmethod
+    def recompute_badges(db: Session, limit: int = BADGE_RECOMPUTE_BATCH) -> int:
+        """
+        重新計算被標記的用戶，以及還沒有徽章狀態的用戶（補建歷史資料）
+        
+        被標記的用戶依 updated_at 由舊到新處理；重新計算失敗時更新 updated_at，
+        排到下一輪的最後，持續失敗的用戶不會佔滿每一批
+        
+        Args:
+            db: 資料庫 session
+            limit: 單次處理的用戶數
+            
+        Returns:
+            處理的用戶數
+        """
+        user_ids = db.execute(
+            select(UserBadge.user_id)
+            .where(UserBadge.needs_recompute == True)
+            .order_by(UserBadge.updated_at)
+            .limit(limit)
+        ).scalars().all()
+        if len(user_ids) < limit:
+            user_ids += db.execute(
+                select(User.id)
+                .outerjoin(UserBadge, UserBadge.user_id == User.id)
+                .where(UserBadge.user_id == None)
+                .limit(limit - len(user_ids))
+            ).scalars().all()
+        
+        failed = [user_id for user_id in user_ids if not badges.recompute_user(user_id)]
+        if failed:
+            db.execute(
+                update(UserBadge).where(UserBadge.user_id.in_(failed)).values(updated_at=get_taiwan_time())
+            )
+            db.commit()
+            logger.warning(f"{len(failed)} 位用戶的徽章重新計算失敗，延後到下一輪")
+        if user_ids:
+            logger.info(f"已重新計算 {len(user_ids)} 位用戶的徽章")
+        return len(user_ids)
+    
+    @staticmethod
+    def _current_streak(last_day, streak: int, today) -> int:
+        """最後一次記錄在前天以前時，連續天數已中斷"""
+        return streak if last_day and last_day >= today - timedelta(days=1) else 0
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+最新消息頁面快取（每個 worker 一份）
+
+所有用戶看到的公告相同，因此把序列化後的 JSON 頁面直接保存起來，
+以 data_versions 的 news 版本號判斷是否過期：News 資料表的 trigger 在任何新增、
+修改、刪除時更新版本號（包含直接寫入資料庫），下一個請求就會重新載入，
+ETag 也使用同一個版本號。存活時間只是額外的保險。
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional, Set
+
+# 快取存活秒數
+NEWS_CACHE_TTL = float(os.getenv("NEWS_CACHE_TTL", 300))
+
+# 最多快取的頁面數（不同 group / limit / before_id 組合）
+NEWS_CACHE_MAX_PAGES = int(os.getenv("NEWS_CACHE_MAX_PAGES", 256))
+
+
+class NewsCache:
+    """最新消息頁面快取"""
+
+    def __init__(self, ttl: float = NEWS_CACHE_TTL, max_pages: int = NEWS_CACHE_MAX_PAGES):
+        self.ttl = ttl
+        self.max_pages = max_pages
+        self._lock = threading.Lock()
+        self._pages: "OrderedDict[Hashable, bytes]" = OrderedDict()
+        self._targeted_members: Optional[Set[int]] = None
+        self._version: Optional[int] = None
+        self._expires = 0.0
+        self.hits = 0
+        self.misses = 0
+
+    def sync(self, version: int) -> None:
+        """
+        以目前的版本號檢查快取，版本改變或過期時清除
+
+        Args:
+            version: data_versions 中的 news 版本號
+        """
+        now = time.monotonic()
+        with self._lock:
+            if version != self._version or now >= self._expires:
+                self._pages.clear()
+                self._targeted_members = None
+                self._version = version
+                self._expires = now + self.ttl
+
+    def get_page(self, key: Hashable) -> Optional[bytes]:
+        """取得快取的頁面，沒有時回傳 None"""
+        with self._lock:
+            body = self._pages.get(key)
+            if body is None:
+                self.misses += 1
+                return None
+            self._pages.move_to_end(key)
+            self.hits += 1
+            return body
+
+    def put_page(self, key: Hashable, body: bytes, version: int) -> None:
+        """
+        寫入頁面（載入期間版本已改變時不寫入，避免存到舊資料）
+
+        Args:
+            key: 頁面的 key
+            body: 序列化後的回應
+            version: 載入前取得的版本號
+        """
+        with self._lock:
+            if version != self._version:
+                return
+            self._pages[key] = body
+            self._pages.move_to_end(key)
+            while len(self._pages) > self.max_pages:
+                self._pages.popitem(last=False)
+
+    def get_targeted_members(self) -> Optional[Set[int]]:
+        """取得有個人消息的用戶 ID，尚未載入時回傳 None"""
+        with self._lock:
+            return self._targeted_members
+
+    def put_targeted_members(self, members: Set[int], version: int) -> None:
+        """寫入有個人消息的用戶 ID"""
+        with self._lock:
+            if version == self._version:
+                self._targeted_members = members
+
+    def clear(self) -> None:
+        """清除全部快取"""
+        with self._lock:
+            self._pages.clear()
+            self._targeted_members = None
+            self._version = None
+
+
+news_cache = NewsCache()
@@ -13,6 +13,8 @@ from app._journal.models import (
     DiaryListResponse
 )
 from app._journal.module import JournalModule
+from app.core.responses import trusted_response
+from app.core.query_budget import query_budget
 from common.utils import get_logger
 
 logger = get_logger(__name__)
@@ -22,6 +24,7 @@ security = HTTPBearer()
 # ==================== 日記 ====================
 
 @router.get("/diary", response_model=DiaryListResponse, summary="獲取日記列表資料", tags=["日記"])
+@query_budget(statements=10, repeats=1)
 def get_diary_list(
     date: str = Query(..., description="要查詢日期 (格式: YYYY-MM-DD)"),
     credentials: HTTPAuthorizationCredentials = Depends(security),
@@ -46,31 +49,32 @@ def get_diary_list(
     """
     # 1. 從 credentials 解析 Token
     authorization = f"Bearer {credentials.credentials}"
-    logger.debug(f"Authorization header: {authorization[:50]}...")
+    logger.debug("Authorization header: %s...", authorization[:50])
     user_id = JournalModule.parse_user_id_from_token(authorization)
-    logger.debug(f"Parsed user_id: {user_id}")
+    logger.debug("Parsed user_id: %s", user_id)
     
     if not user_id:
         return DiaryListResponse(status="1", message="身份驗證失敗", diary=[])
     
     # 2. 檢查用戶是否存在
     user = JournalModule.get_user(db, user_id)
-    logger.debug(f"User exists: {user is not None}")
+    logger.debug("User exists: %s", user is not None)
     
     if not user:
         return DiaryListResponse(status="1", message="用戶不存在", diary=[])
     
     # 3. 獲取日記列表
-    logger.debug(f"Calling get_diary_list with user_id={user_id}, date={date}")
+    logger.debug("Calling get_diary_list with user_id=%s, date=%s", user_id, date)
     diary_list = JournalModule.get_diary_list(db, user_id, date)
-    logger.debug(f"get_diary_list returned {len(diary_list) if diary_list else 0} records")
+    logger.debug("get_diary_list returned %s records", len(diary_list) if diary_list else 0)
     
     if diary_list is not None:
-        return DiaryListResponse(
-            status="0",
-            message="ok",
-            diary=diary_list
-        )
+        # get_diary_list 已將每個欄位轉成 DiaryRecord 的型別，直接輸出
+        return trusted_response({
+            "status": "0",
+            "message": "ok",
+            "diary": diary_list
+        })
     else:
         return DiaryListResponse(status="1", message="失敗", diary=[])
 
@@ -141,6 +145,7 @@ def upload_diet(
 
 
 @router.delete("/records", response_model=BaseResponse, summary="刪除日記記錄", tags=["日記"])
+@query_budget(statements=10, repeats=1)
 def delete_records(
     request: DeleteRecordsRequest,
     credentials: HTTPAuthorizationCredentials = Depends(security),
@@ -3,8 +3,11 @@ from sqlalchemy.orm import Session
 from app.account.models import User
 from datetime import datetime
 from typing import Optional, List, Dict, Any
+from app.core.database import connect_raw
 from app.core.security import verify_token
+from app._else import badges
 import json
+import logging
 from common.utils import get_logger
 
 logger = get_logger(__name__)
@@ -17,24 +20,24 @@ class JournalModule:
     def parse_user_id_from_token(authorization: str) -> Optional[int]:
         '''從 Authorization Header 解析用戶 ID'''
         try:
-            logger.debug(f'收到的 authorization: {authorization[:50] if authorization else "None"}...')
+            logger.debug('收到的 authorization: %s...', authorization[:50] if authorization else "None")
             
             if not authorization or not authorization.startswith('Bearer '):
                 logger.debug('authorization 格式錯誤或為空')
                 return None
             
             token = authorization.split(' ')[1]
-            logger.debug(f'解析出的 token: {token[:30]}...')
+            logger.debug('解析出的 token: %s...', token[:30])
             
             payload = verify_token(token)
-            logger.debug(f'verify_token 回傳: {payload}')
+            logger.debug('verify_token 回傳: %s', payload)
             
             if not payload:
                 logger.debug('payload 為空')
                 return None
             
             user_id = int(payload.get('sub'))
-            logger.debug(f'解析出的 user_id: {user_id}')
+            logger.debug('解析出的 user_id: %s', user_id)
             return user_id
             
         except Exception as e:
@@ -50,34 +53,32 @@ class JournalModule:
     def get_diary_list(db: Session, user_id: int, date: str) -> List[Dict[str, Any]]:
         '''獲取指定日期的日記列表'''
         try:
-            logger.debug(f'開始查詢日記列表: user_id={user_id}, date={date}')
+            logger.debug('開始查詢日記列表: user_id=%s, date=%s', user_id, date)
             
             # 使用 sqlite3 直接查詢,避免導入問題
-            import sqlite3
-            
             diary_list = []
             
             # 解析日期範圍
             target_date = datetime.strptime(date, '%Y-%m-%d').date()
-            logger.debug(f'解析後的日期: {target_date}')
+            logger.debug('解析後的日期: %s', target_date)
             
             # 連接資料庫
-            conn = sqlite3.connect('Puyuan.db')
+            conn = connect_raw()
             cursor = conn.cursor()
             
-            # 先檢查資料庫中有哪些日期的資料
-            cursor.execute("""
-                SELECT DATE(measured_at), COUNT(*) 
-                FROM blood_pressure_records 
-                WHERE user_id = ? 
-                GROUP BY DATE(measured_at)
-            """, (user_id,))
-            available_dates = cursor.fetchall()
-            logger.debug(f'用戶 {user_id} 的血壓記錄日期: {available_dates}')
+            # 列出資料庫中有哪些日期的資料（只用於除錯，整個用戶掃描一次，只在 DEBUG 時查詢）
+            if logger.isEnabledFor(logging.DEBUG):
+                cursor.execute("""
+                    SELECT DATE(measured_at), COUNT(*) 
+                    FROM blood_pressure_records 
+                    WHERE user_id = ? 
+                    GROUP BY DATE(measured_at)
+                """, (user_id,))
+                logger.debug('用戶 %s 的血壓記錄日期: %s', user_id, cursor.fetchall())
             
             # 查詢血壓記錄
             query_date = str(target_date)
-            logger.debug(f'查詢日期字串: {query_date}')
+            logger.debug('查詢日期字串: %s', query_date)
             
             cursor.execute("""
                 SELECT id, user_id, systolic, diastolic, pulse, measured_at
@@ -86,9 +87,9 @@ class JournalModule:
             """, (user_id, query_date))
             
             blood_pressure_records = cursor.fetchall()
-            logger.debug(f'查詢到 {len(blood_pressure_records)} 筆血壓記錄')
+            logger.debug('查詢到 %s 筆血壓記錄', len(blood_pressure_records))
             if blood_pressure_records:
-                logger.debug(f'第一筆血壓記錄: {blood_pressure_records[0]}')
+                logger.debug('第一筆血壓記錄: %s', blood_pressure_records[0])
             
             for record in blood_pressure_records:
                 diary_list.append({
@@ -122,9 +123,9 @@ class JournalModule:
             """, (user_id, query_date))
             
             weight_records = cursor.fetchall()
-            logger.debug(f'查詢到 {len(weight_records)} 筆體重記錄')
+            logger.debug('查詢到 %s 筆體重記錄', len(weight_records))
             if weight_records:
-                logger.debug(f'第一筆體重記錄: {weight_records[0]}')
+                logger.debug('第一筆體重記錄: %s', weight_records[0])
             
             for record in weight_records:
                 diary_list.append({
@@ -158,9 +159,9 @@ class JournalModule:
             """, (user_id, query_date))
             
             blood_sugar_records = cursor.fetchall()
-            logger.debug(f'查詢到 {len(blood_sugar_records)} 筆血糖記錄')
+            logger.debug('查詢到 %s 筆血糖記錄', len(blood_sugar_records))
             if blood_sugar_records:
-                logger.debug(f'第一筆血糖記錄: {blood_sugar_records[0]}')
+                logger.debug('第一筆血糖記錄: %s', blood_sugar_records[0])
             
             for record in blood_sugar_records:
                 diary_list.append({
@@ -195,7 +196,7 @@ class JournalModule:
             """, (user_id,))
             
             diet_records = cursor.fetchall()
-            logger.debug(f'查詢到 {len(diet_records)} 筆飲食記錄(未過濾)')
+            logger.debug('查詢到 %s 筆飲食記錄(未過濾)', len(diet_records))
             
             # 在 Python 中過濾符合日期的記錄
             filtered_diet_records = []
@@ -223,7 +224,7 @@ class JournalModule:
                 if match:
                     filtered_diet_records.append(record)
             
-            logger.debug(f'過濾後符合日期 {query_date} 的飲食記錄: {len(filtered_diet_records)} 筆')
+            logger.debug('過濾後符合日期 %s 的飲食記錄: %s 筆', query_date, len(filtered_diet_records))
             
             for record in filtered_diet_records:
                 # 處理 None 的 id - Swift 期望 Int，所以用 0 代替
@@ -274,7 +275,7 @@ class JournalModule:
             # 關閉資料庫連接
             conn.close()
             
-            logger.debug(f'總共查詢到 {len(diary_list)} 筆日記記錄')
+            logger.debug('總共查詢到 %s 筆日記記錄', len(diary_list))
             return diary_list
             
         except Exception as e:
@@ -295,10 +296,8 @@ class JournalModule:
     ) -> bool:
         '''上傳飲食日記'''
         try:
-            import sqlite3
-            
             # 使用 sqlite3 直接操作
-            conn = sqlite3.connect('Puyuan.db')
+            conn = connect_raw()
             cursor = conn.cursor()
             
             # 將 tags 轉換為 JSON 字符串
@@ -312,6 +311,7 @@ class JournalModule:
             
             conn.commit()
             conn.close()
+            badges.record_activity(user_id, recorded_at)
             return True
             
         except Exception as e:
@@ -331,53 +331,38 @@ class JournalModule:
                 WeightRecord,
                 BloodSugarRecord
             )
-            import sqlite3
-            
-            # 刪除血壓記錄
-            if 'blood_pressures' in delete_object:
-                for record_id in delete_object['blood_pressures']:
-                    record = db.query(BloodPressureRecord).filter(
-                        BloodPressureRecord.id == record_id,
-                        BloodPressureRecord.user_id == user_id
-                    ).first()
-                    if record:
-                        db.delete(record)
-            
-            # 刪除體重記錄
-            if 'weights' in delete_object:
-                for record_id in delete_object['weights']:
-                    record = db.query(WeightRecord).filter(
-                        WeightRecord.id == record_id,
-                        WeightRecord.user_id == user_id
-                    ).first()
-                    if record:
-                        db.delete(record)
-            
-            # 刪除血糖記錄
-            if 'blood_sugars' in delete_object:
-                for record_id in delete_object['blood_sugars']:
-                    record = db.query(BloodSugarRecord).filter(
-                        BloodSugarRecord.id == record_id,
-                        BloodSugarRecord.user_id == user_id
-                    ).first()
-                    if record:
-                        db.delete(record)
+            
+            # 每種記錄以一個 IN 條件刪除（確保只能刪除自己的記錄）
+            for key, model in (
+                ('blood_pressures', BloodPressureRecord),
+                ('weights', WeightRecord),
+                ('blood_sugars', BloodSugarRecord)
+            ):
+                record_ids = delete_object.get(key)
+                if record_ids:
+                    db.query(model).filter(
+                        model.id.in_(record_ids),
+                        model.user_id == user_id
+                    ).delete(synchronize_session=False)
+            # 先提交，釋放寫入鎖後才能以 sqlite3 連線刪除飲食記錄
+            db.commit()
             
             # 刪除飲食記錄
-            if 'diets' in delete_object:
-                conn = sqlite3.connect('Puyuan.db')
+            diet_ids = delete_object.get('diets')
+            if diet_ids:
+                conn = connect_raw()
                 cursor = conn.cursor()
                 
-                for record_id in delete_object['diets']:
-                    cursor.execute("""
-                        DELETE FROM DiaryDiet
-                        WHERE id = ? AND user_id = ?
-                    """, (record_id, user_id))
+                placeholders = ','.join('?' * len(diet_ids))
+                cursor.execute(f"""
+                    DELETE FROM DiaryDiet
+                    WHERE user_id = ? AND id IN ({placeholders})
+                """, [user_id] + list(diet_ids))
                 
                 conn.commit()
                 conn.close()
             
-            db.commit()
+            badges.mark_recompute(user_id)
             return True
             
         except Exception as e:
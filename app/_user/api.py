@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Response
 from sqlalchemy.orm import Session
 from app.core.database import get_db
 from app._user.models import UserProfileUpdate, UserSettingsUpdate, BaseResponse, UserProfileResponse
 from app._user.module import UserModule
+from app._else.models import BadgeResponse
+from app._else.module import BadgeModule
 from typing import Optional
 from common.utils import get_logger
 
@@ -22,26 +24,26 @@ def update_user_profile(
     - **可更新欄位**: name, gender, birthday, height, weight, phone, address, avatar, fcm_id
     - **只更新提供的欄位**，未提供的欄位保持原值
     """
-    logger.debug(f"收到請求，authorization={authorization}")
-    logger.debug(f"request={request}")
+    logger.debug("收到請求，authorization=%s", authorization)
+    logger.debug("request=%s", request)
     
     # 1. 解析 Token
     user_id = UserModule.parse_user_id_from_token(authorization)
-    logger.debug(f"解析後 user_id={user_id}")
+    logger.debug("解析後 user_id=%s", user_id)
     if not user_id:
         logger.warning(f"Token 解析失敗")
         return BaseResponse(status="1", message="authentication failed")
     
     # 2. 檢查用戶是否存在
     user = UserModule.get_user(db, user_id)
-    logger.debug(f"查詢用戶結果: {user}")
+    logger.debug("查詢用戶結果: %s", user)
     if not user:
         logger.warning(f"用戶不存在")
         return BaseResponse(status="1", message="user not found")
     
-    # 3. 更新資料 - 包含所有欄位（包括未設置的）
+    # 3. 更新資料 - 未設置的欄位為 None，upsert 時保留原值
     update_data = request.dict()
-    logger.debug(f"原始 update_data={update_data}")
+    logger.debug("原始 update_data=%s", update_data)
     
     # 處理空字串和類型轉換
     # 注意：空字串 "" 應該被保留（不轉換為 None），除非特別指定
@@ -68,10 +70,10 @@ def update_user_profile(
             except (ValueError, TypeError):
                 update_data["weight"] = None
     
-    logger.debug(f"處理後 update_data={update_data}")
+    logger.debug("處理後 update_data=%s", update_data)
     
     success = UserModule.create_or_update_profile(db, user_id, update_data)
-    logger.debug(f"更新結果: success={success}")
+    logger.debug("更新結果: success=%s", success)
     
     if success:
         return BaseResponse(status="0", message="success")
@@ -95,25 +97,9 @@ def get_user_profile(
     if not user_id:
         return {"status": "1", "message": "authentication failed", "user": None}
     
-    # 2. 獲取用戶完整資料
-    user_data = UserModule.get_user_complete_data(db, user_id)
-    if not user_data:
-        return {"status": "1", "message": "user not found", "user": None}
-        
-    # 3. 按照 App 預期的格式回傳
+    # 2. 獲取用戶完整資料（資料沒有變更時直接使用快取的回應）
     try:
-        # 嘗試驗證數據，避免 FastAPI 自動驗證失敗導致回傳 422 (缺少 status 欄位)
-        from app._user.models import UserProfileData
-        # 確保 user_data 符合 UserProfileData 的結構
-        validated_user_data = UserProfileData(**user_data)
-        
-        final_response = {
-            "status": "0",
-            "message": "success",
-            "user": validated_user_data
-        }
-        logger.debug(f"API 最終回傳資料: {final_response}")
-        return final_response
+        body = UserModule.get_user_profile_json(db, user_id)
     except Exception as e:
         logger.error(f"資料驗證失敗: {e}", exc_info=True)
         # 若驗證失敗，回傳帶有 status 的錯誤訊息，防止 App 崩潰
@@ -122,6 +108,11 @@ def get_user_profile(
             "message": f"data format error: {str(e)}", 
             "user": None
         }
+    if body is None:
+        return {"status": "1", "message": "user not found", "user": None}
+    
+    # 3. 已按照 App 預期的格式序列化，直接回傳
+    return Response(content=body, media_type="application/json")
 
 
 @router.patch("/setting", response_model=BaseResponse, summary="更新個人設定", tags=["個人資訊"])
@@ -157,7 +148,7 @@ def update_user_settings(
         return BaseResponse(status="1", message="failed")
 
 
-@router.put("/badge", response_model=BaseResponse, summary="更新徽章", tags=["個人資訊"])
+@router.put("/badge", response_model=BadgeResponse, summary="更新徽章", tags=["個人資訊"])
 def update_user_badge(
     authorization: Optional[str] = Header(None),
     db: Session = Depends(get_db)
@@ -166,7 +157,7 @@ def update_user_badge(
     更新用戶徽章
     
     - **需要 Bearer Token**
-    - **功能**: 更新用戶的徽章/成就狀態
+    - **功能**: 回傳用戶的徽章/成就狀態（上傳記錄、分享時已遞增計算）
     
     ### 徽章類型
     - 🏆 連續記錄 7 天
@@ -178,19 +169,10 @@ def update_user_badge(
     # 1. 解析 Token
     user_id = UserModule.parse_user_id_from_token(authorization)
     if not user_id:
-        return BaseResponse(status="1", message="authentication failed")
+        return BadgeResponse(status="1", message="authentication failed")
     
-    # 2. 檢查用戶是否存在
-    user = UserModule.get_user(db, user_id)
-    if not user:
-        return BaseResponse(status="1", message="user not found")
-    
-    # 3. 更新徽章 (這裡簡化處理,實際應該根據業務邏輯計算)
-    try:
-        # TODO: 實作徽章計算邏輯
-        # - 查詢用戶記錄天數
-        # - 檢查血糖控制情況
-        # - 統計分享次數等
-        return BaseResponse(status="0", message="success")
-    except Exception as e:
-        return BaseResponse(status="1", message=f"failed: {str(e)}")
\ No newline at end of file
+    # 2. 讀取預先計算的徽章狀態
+    state = BadgeModule.update_user_badge(db, user_id)
+    if state is None:
+        return BadgeResponse(status="1", message="failed")
+    return BadgeResponse(status="0", message="success", **state)
\ No newline at end of file
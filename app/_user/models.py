@@ -30,7 +30,7 @@ class UserProfile(Base):
     height = Column(Float, nullable=True)
     phone = Column(String, nullable=True)
     avatar = Column(String, nullable=True)
-    invite_code = Column(String, nullable=True)
+    invite_code = Column(String, nullable=True, unique=True, index=True)
     badge = Column(Integer, default=0)
     created_at = Column(DateTime, default=get_taiwan_time)
     updated_at = Column(DateTime, default=get_taiwan_time, onupdate=get_taiwan_time)
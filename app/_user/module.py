@@ -1,17 +1,43 @@
 ﻿# -*- coding: utf-8 -*-
+from sqlalchemy import select
 from sqlalchemy.orm import Session
 from app.account.models import User as UserAuth
-from app._user.models import UserProfile, UserDefaults, UserSettings, get_taiwan_time
+from app._user.models import UserProfile, UserDefaults, UserSettings, UserProfileData, get_taiwan_time
+from app._user.profile_cache import profile_cache
 from app.care.models import Care
 from typing import Optional
 import jwt
 from datetime import datetime, timedelta
 # 導入統一的設定，移除本地的 SECRET_KEY 和 ALGORITHM
 from app.core.security import SECRET_KEY, ALGORITHM, verify_token
+from app.core.data_version import bump_data_version, get_data_version, SCOPE_PROFILE
+from app.core.responses import dump_json
+from app.core.upsert import UserRowUpsert
 from common.utils import get_logger
 
 logger = get_logger(__name__)
 
+# 個人資料回應中 default 的欄位（依規格書順序）
+DEFAULT_FIELDS = (
+    "sugar_morning_max", "sugar_morning_min", "sugar_evening_max", "sugar_evening_min",
+    "sugar_before_max", "sugar_before_min", "sugar_after_max", "sugar_after_min",
+    "systolic_max", "systolic_min", "diastolic_max", "diastolic_min",
+    "pulse_max", "pulse_min", "weight_max", "weight_min",
+    "bmi_max", "bmi_min", "body_fat_max", "body_fat_min",
+)
+
+# 個人資料回應中 setting 的欄位
+SETTING_FIELDS = (
+    "after_recording", "no_recording_for_a_day", "over_max_or_under_min", "after_meal",
+    "unit_of_sugar", "unit_of_weight", "unit_of_height",
+)
+
+# 每位用戶一列的資料表（邀請碼與徽章由各自的流程寫入，不開放更新）
+PROFILE_UPSERT = UserRowUpsert.from_model(UserProfile, exclude=("invite_code", "badge"))
+DEFAULTS_UPSERT = UserRowUpsert.from_model(UserDefaults)
+SETTINGS_UPSERT = UserRowUpsert.from_model(UserSettings)
+
+
 class UserModule:
     
     @staticmethod
@@ -65,46 +91,11 @@ class UserModule:
     
     @staticmethod
     def create_or_update_profile(db: Session, user_id: int, update_data: dict) -> bool:
-        '''創建或更新用戶個人資料'''
+        '''創建或更新用戶個人資料（值為 None 的欄位保持原值）'''
         try:
-            logger.debug(f"開始更新，user_id={user_id}, update_data={update_data}")
-            
-            # 先查詢現有 profile
-            profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
-            
-            if not profile:
-                logger.debug(f"找不到現有 profile，創建新的")
-                profile = UserProfile(user_id=user_id)
-                db.add(profile)
-                db.flush()  # 先 flush 以確保 profile 被添加到 session
-                logger.debug(f"新 profile 已添加到 session")
-            else:
-                logger.debug(f"找到現有 profile，id={profile.id}")
-            
-            # 更新欄位
-            for key, value in update_data.items():
-                # 跳過不應該更新的欄位
-                if key in ['id', 'user_id', 'created_at']:
-                    logger.debug(f"跳過唯讀欄位: {key}")
-                    continue
-                    
-                if hasattr(profile, key):
-                    old_value = getattr(profile, key, None)
-                    logger.debug(f"設定 {key}: {old_value} -> {value}")
-                    setattr(profile, key, value)
-                else:
-                    logger.warning(f"profile 沒有屬性 {key}")
-            
-            # 確保 updated_at 被更新
-            profile.updated_at = get_taiwan_time()
-            
-            logger.debug(f"準備提交到資料庫")
+            PROFILE_UPSERT.execute(db, user_id, update_data, get_taiwan_time())
+            bump_data_version(db, user_id, SCOPE_PROFILE)
             db.commit()
-            logger.debug(f"成功提交")
-            
-            # 重新查詢以驗證更新
-            db.refresh(profile)
-            logger.debug(f"成功更新，profile={profile.__dict__}")
             return True
         except Exception as e:
             logger.error(f'更新個人資料錯誤: {str(e)}', exc_info=True)
@@ -113,17 +104,11 @@ class UserModule:
     
     @staticmethod
     def create_or_update_defaults(db: Session, user_id: int, update_data: dict) -> bool:
-        '''創建或更新用戶預設值'''
+        '''創建或更新用戶預設值（值為 None 的欄位保持原值）'''
         try:
-            defaults = UserModule.get_defaults(db, user_id)
-            if not defaults:
-                defaults = UserDefaults(user_id=user_id)
-                db.add(defaults)
-            for key, value in update_data.items():
-                if hasattr(defaults, key):
-                    setattr(defaults, key, value)
+            DEFAULTS_UPSERT.execute(db, user_id, update_data, get_taiwan_time())
+            bump_data_version(db, user_id, SCOPE_PROFILE)
             db.commit()
-            db.refresh(defaults)
             return True
         except Exception as e:
             logger.error(f'更新預設值錯誤: {str(e)}', exc_info=True)
@@ -132,17 +117,11 @@ class UserModule:
 
     @staticmethod
     def create_or_update_settings(db: Session, user_id: int, update_data: dict) -> bool:
-        '''創建或更新用戶設定'''
+        '''創建或更新用戶設定（值為 None 的欄位保持原值）'''
         try:
-            settings = UserModule.get_settings(db, user_id)
-            if not settings:
-                settings = UserSettings(user_id=user_id)
-                db.add(settings)
-            for key, value in update_data.items():
-                if hasattr(settings, key):
-                    setattr(settings, key, value)
+            SETTINGS_UPSERT.execute(db, user_id, update_data, get_taiwan_time())
+            bump_data_version(db, user_id, SCOPE_PROFILE)
             db.commit()
-            db.refresh(settings)
             return True
         except Exception as e:
             logger.error(f'更新設定錯誤: {str(e)}', exc_info=True)
@@ -151,89 +130,43 @@ class UserModule:
 
     @staticmethod
     def get_user_complete_data(db: Session, user_id: int) -> Optional[dict]:
-        """獲取用戶所有相關資料，組合成一個字典"""
+        """
+        獲取用戶所有相關資料，組合成一個字典
+        
+        以一次 LEFT JOIN 查詢同時取得 UserAuth、UserProfile、UserDefaults、UserSettings。
+        """
         try:
-            logger.debug(f"開始獲取用戶資料，user_id={user_id}")
-            
-            # 清除會話快取，確保讀取最新資料
-            db.expire_all()
-            
-            user_auth = db.query(UserAuth).filter(UserAuth.id == user_id).first()
-            if not user_auth:
+            row = db.execute(
+                select(UserAuth, UserProfile, UserDefaults, UserSettings)
+                .outerjoin(UserProfile, UserProfile.user_id == UserAuth.id)
+                .outerjoin(UserDefaults, UserDefaults.user_id == UserAuth.id)
+                .outerjoin(UserSettings, UserSettings.user_id == UserAuth.id)
+                .where(UserAuth.id == user_id)
+                .execution_options(populate_existing=True)
+            ).first()
+            if not row:
                 logger.warning(f"找不到 UserAuth，user_id={user_id}")
                 return None
-
-            logger.debug(f"找到 UserAuth: email={user_auth.email}")
+            user_auth, user_profile, user_defaults, user_settings = row
             
-            user_profile = db.query(UserProfile).filter(UserProfile.user_id == user_id).first()
-            
-            if not user_profile:
-                logger.warning(f"找不到 UserProfile，user_id={user_id}")
-            else:
-                logger.debug(f"找到 UserProfile: name={user_profile.name}")
-
-            # 獲取用戶預設值
-            user_defaults = db.query(UserDefaults).filter(UserDefaults.user_id == user_id).first()
-            
-            # 構建 default 字典 - 根據規格書順序（max 在前，min 在後）
-            default_data = {
-                "id": user_defaults.id if user_defaults else 0,
-                "user_id": user_id,
-                "sugar_morning_max": user_defaults.sugar_morning_max if user_defaults and user_defaults.sugar_morning_max is not None else 0,
-                "sugar_morning_min": user_defaults.sugar_morning_min if user_defaults and user_defaults.sugar_morning_min is not None else 0,
-                "sugar_evening_max": user_defaults.sugar_evening_max if user_defaults and user_defaults.sugar_evening_max is not None else 0,
-                "sugar_evening_min": user_defaults.sugar_evening_min if user_defaults and user_defaults.sugar_evening_min is not None else 0,
-                "sugar_before_max": user_defaults.sugar_before_max if user_defaults and user_defaults.sugar_before_max is not None else 0,
-                "sugar_before_min": user_defaults.sugar_before_min if user_defaults and user_defaults.sugar_before_min is not None else 0,
-                "sugar_after_max": user_defaults.sugar_after_max if user_defaults and user_defaults.sugar_after_max is not None else 0,
-                "sugar_after_min": user_defaults.sugar_after_min if user_defaults and user_defaults.sugar_after_min is not None else 0,
-                "systolic_max": user_defaults.systolic_max if user_defaults and user_defaults.systolic_max is not None else 0,
-                "systolic_min": user_defaults.systolic_min if user_defaults and user_defaults.systolic_min is not None else 0,
-                "diastolic_max": user_defaults.diastolic_max if user_defaults and user_defaults.diastolic_max is not None else 0,
-                "diastolic_min": user_defaults.diastolic_min if user_defaults and user_defaults.diastolic_min is not None else 0,
-                "pulse_max": user_defaults.pulse_max if user_defaults and user_defaults.pulse_max is not None else 0,
-                "pulse_min": user_defaults.pulse_min if user_defaults and user_defaults.pulse_min is not None else 0,
-                "weight_max": user_defaults.weight_max if user_defaults and user_defaults.weight_max is not None else 0,
-                "weight_min": user_defaults.weight_min if user_defaults and user_defaults.weight_min is not None else 0,
-                "bmi_max": user_defaults.bmi_max if user_defaults and user_defaults.bmi_max is not None else 0,
-                "bmi_min": user_defaults.bmi_min if user_defaults and user_defaults.bmi_min is not None else 0,
-                "body_fat_max": user_defaults.body_fat_max if user_defaults and user_defaults.body_fat_max is not None else 0,
-                "body_fat_min": user_defaults.body_fat_min if user_defaults and user_defaults.body_fat_min is not None else 0,
-                "created_at": user_defaults.created_at.isoformat() if user_defaults and user_defaults.created_at else "",
-                "updated_at": user_defaults.updated_at.isoformat() if user_defaults and user_defaults.updated_at else ""
-            }
-            
-            if user_defaults:
-                logger.debug(f"找到 UserDefaults 資料")
-            else:
-                logger.warning(f"找不到 UserDefaults，返回 null 值，user_id={user_id}")
-
-            # 獲取用戶設定
-            user_settings = db.query(UserSettings).filter(UserSettings.user_id == user_id).first()
+            # 構建 default 字典 - 根據規格書順序（max 在前，min 在後），沒有設定時為 0
+            default_data = {"id": user_defaults.id if user_defaults else 0, "user_id": user_id}
+            for field in DEFAULT_FIELDS:
+                value = getattr(user_defaults, field) if user_defaults else None
+                default_data[field] = value if value is not None else 0
+            default_data["created_at"] = user_defaults.created_at.isoformat() if user_defaults and user_defaults.created_at else ""
+            default_data["updated_at"] = user_defaults.updated_at.isoformat() if user_defaults and user_defaults.updated_at else ""
             
             # 構建 setting 字典 - 所有欄位使用預設值，避免 Swift 解析失敗
-            setting_data = {
-                "id": user_settings.id if user_settings else 0,
-                "user_id": user_id,
-                "after_recording": 1 if user_settings and user_settings.after_recording else 0,
-                "no_recording_for_a_day": 1 if user_settings and user_settings.no_recording_for_a_day else 0,
-                "over_max_or_under_min": 1 if user_settings and user_settings.over_max_or_under_min else 0,
-                "after_meal": 1 if user_settings and user_settings.after_meal else 0,
-                "unit_of_sugar": 1 if user_settings and user_settings.unit_of_sugar else 0,
-                "unit_of_weight": 1 if user_settings and user_settings.unit_of_weight else 0,
-                "unit_of_height": 1 if user_settings and user_settings.unit_of_height else 0,
-                "created_at": user_settings.created_at.isoformat() if user_settings and user_settings.created_at else "",
-                "updated_at": user_settings.updated_at.isoformat() if user_settings and user_settings.updated_at else ""
-            }
+            setting_data = {"id": user_settings.id if user_settings else 0, "user_id": user_id}
+            for field in SETTING_FIELDS:
+                setting_data[field] = 1 if user_settings and getattr(user_settings, field) else 0
+            setting_data["created_at"] = user_settings.created_at.isoformat() if user_settings and user_settings.created_at else ""
+            setting_data["updated_at"] = user_settings.updated_at.isoformat() if user_settings and user_settings.updated_at else ""
             
-            if user_settings:
-                logger.debug(f"找到 UserSettings 資料")
-            else:
-                logger.warning(f"找不到 UserSettings，返回預設值，user_id={user_id}")
-
             # 確保 user_profile 不是 None，否則創建一個空的
             if not user_profile:
-                logger.warning(f"找不到 UserProfile，創建默認值")
+                logger.warning(f"找不到 UserProfile，user_id={user_id}，使用預設值")
                 user_profile = UserProfile(user_id=user_id)
             
             user_data = {
@@ -241,7 +174,7 @@ class UserModule:
                 "id": user_auth.id,
                 "account": user_auth.account or "",
                 "email": user_auth.email or "",
-                "phone": (user_profile.phone or "") if user_profile.phone else "",  # 從 UserProfile 獲取
+                "phone": user_profile.phone or "",  # 從 UserProfile 獲取
                 "google_id": user_auth.google_id or "",
                 "apple_id": user_auth.apple_id or "",
                 "login_times": user_auth.login_times or 0,
@@ -250,16 +183,16 @@ class UserModule:
                 "must_change_password": 1 if user_auth.must_change_password else 0,
 
                 # 從 UserProfile 獲取
-                "name": user_profile.name or "" if user_profile else "",
-                "gender": user_profile.gender if user_profile and user_profile.gender is not None else 0,
-                "birthday": user_profile.birthday or "" if user_profile else "",
-                "height": user_profile.height or 0.0 if user_profile else 0.0,
-                "weight": user_profile.weight or 0.0 if user_profile else 0.0,
-                "address": user_profile.address or "" if user_profile else "",
-                "invite_code": user_profile.invite_code or "" if user_profile else "",
-                "inviteCode": user_profile.invite_code or "" if user_profile else "",  # 駝峰命名版本
-                "badge": user_profile.badge or 0 if user_profile else 0,
-                "avatar": user_profile.avatar or "" if user_profile else "",  # 從 UserProfile 獲取
+                "name": user_profile.name or "",
+                "gender": user_profile.gender if user_profile.gender is not None else 0,
+                "birthday": user_profile.birthday or "",
+                "height": user_profile.height or 0.0,
+                "weight": user_profile.weight or 0.0,
+                "address": user_profile.address or "",
+                "invite_code": user_profile.invite_code or "",
+                "inviteCode": user_profile.invite_code or "",  # 駝峰命名版本
+                "badge": user_profile.badge or 0,
+                "avatar": user_profile.avatar or "",
 
                 # 固定或暫時性欄位
                 "group": "",
@@ -287,9 +220,41 @@ class UserModule:
                 # 設定欄位（從 user_settings 表獲取）
                 "setting": setting_data
             }
-            
-            logger.debug(f"成功組合用戶資料")
             return user_data
         except Exception as e:
             logger.error(f"發生錯誤: {str(e)}", exc_info=True)
-            return None
\ No newline at end of file
+            return None
+
+    @staticmethod
+    def get_user_profile_json(db: Session, user_id: int) -> Optional[bytes]:
+        """
+        獲取序列化後的 GET /api/user 回應
+        
+        回應依 profile 資料版本號快取，資料沒有變更時不查詢資料表、
+        也不重新驗證與序列化。
+        
+        Args:
+            db: 資料庫 session
+            user_id: 使用者 ID
+            
+        Returns:
+            回應內容（JSON），找不到用戶時回傳 None；資料格式錯誤時拋出例外
+        """
+        version, _ = get_data_version(user_id, SCOPE_PROFILE)
+        body = profile_cache.get(user_id, version)
+        if body is not None:
+            return body
+        
+        user_data = UserModule.get_user_complete_data(db, user_id)
+        if not user_data:
+            return None
+        
+        # 只在重新載入時驗證一次，確保格式符合 App 預期
+        payload = {
+            "status": "0",
+            "message": "success",
+            "user": UserProfileData(**user_data).dict()
+        }
+        body = dump_json(payload)
+        profile_cache.put(user_id, version, body)
+        return body
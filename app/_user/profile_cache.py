@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""
+個人資料回應快取（每個 worker 一份）
+
+以 user_id 為 key 保存序列化後的 GET /api/user 回應，並記下產生時的
+profile 資料版本號。更新個人資料、預設值、設定、密碼或徽章時版本號會改變，
+所有 worker 的下一個請求都會重新載入。
+"""
+import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+# 最多快取的用戶數，超過時淘汰最久未使用的
+PROFILE_CACHE_MAX_USERS = int(os.getenv("PROFILE_CACHE_MAX_USERS", 10000))
+
+
+class ProfileCache:
+    """個人資料回應快取"""
+
+    def __init__(self, max_users: int = PROFILE_CACHE_MAX_USERS):
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Tuple[int, bytes]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int, version: int) -> Optional[bytes]:
+        """
+        取得快取的回應
+
+        Args:
+            user_id: 使用者 ID
+            version: 目前的 profile 資料版本號
+
+        Returns:
+            回應內容，沒有快取或版本不符時回傳 None
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[0] != version:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, user_id: int, version: int, body: bytes) -> None:
+        """
+        寫入回應
+
+        Args:
+            user_id: 使用者 ID
+            version: 載入資料前取得的版本號
+            body: 序列化後的回應
+        """
+        with self._lock:
+            entry = self._entries.get(user_id)
+            # 其他請求已存入較新的版本時不覆蓋
+            if entry is not None and entry[0] > version:
+                return
+            self._entries[user_id] = (version, body)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *user_ids: int) -> None:
+        """清除指定用戶的快取"""
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        """清除全部快取"""
+        with self._lock:
+            self._entries.clear()
+
+
+profile_cache = ProfileCache()
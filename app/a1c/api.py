@@ -13,6 +13,7 @@ from .models import (
     A1cRecord
 )
 from .module import A1cModule
+from app.core.responses import trusted_response
 
 router = APIRouter()
 security = HTTPBearer()
@@ -88,7 +89,7 @@ def get_a1c_list(
     a1cs = A1cModule.get_a1c_list(user_id=user_id)
     
     if a1cs is not None:
-        return A1cListResponse(status="0", message="ok", a1cs=a1cs)
+        return trusted_response({"status": "0", "message": "ok", "a1cs": a1cs})
     else:
         return A1cListResponse(status="1", message="失敗", a1cs=[])
 
@@ -2,8 +2,9 @@
 from sqlalchemy.orm import Session
 from datetime import datetime
 from typing import Optional, List, Dict, Any
+from app.core.data_version import bump_data_version_raw, SCOPE_A1C
+from app.core.database import connect_raw
 from app.core.security import verify_token
-import sqlite3
 from common.utils import get_logger
 
 logger = get_logger(__name__)
@@ -35,10 +36,10 @@ class A1cModule:
     def upload_a1c(user_id: int, a1c: str, recorded_at: str) -> bool:
         '''上傳糖化血色素記錄'''
         try:
-            logger.debug(f'上傳糖化血色素: user_id={user_id}, a1c={a1c}, recorded_at={recorded_at}')
+            logger.debug('上傳糖化血色素: user_id=%s, a1c=%s, recorded_at=%s', user_id, a1c, recorded_at)
             
             # 使用 sqlite3 直接操作
-            conn = sqlite3.connect('Puyuan.db')
+            conn = connect_raw()
             cursor = conn.cursor()
             
             # 插入記錄
@@ -48,6 +49,7 @@ class A1cModule:
                 (user_id, a1c, recorded_at, created_at, updated_at)
                 VALUES (?, ?, ?, ?, ?)
             """, (user_id, a1c, recorded_at, now, now))
+            bump_data_version_raw(cursor, user_id, SCOPE_A1C)
             
             conn.commit()
             conn.close()
@@ -63,10 +65,10 @@ class A1cModule:
     def get_a1c_list(user_id: int) -> List[Dict[str, Any]]:
         '''獲取用戶的所有糖化血色素記錄'''
         try:
-            logger.debug(f'查詢糖化血色素列表: user_id={user_id}')
+            logger.debug('查詢糖化血色素列表: user_id=%s', user_id)
             
             # 使用 sqlite3 直接查詢
-            conn = sqlite3.connect('Puyuan.db')
+            conn = connect_raw()
             cursor = conn.cursor()
             
             cursor.execute("""
@@ -79,18 +81,18 @@ class A1cModule:
             records = cursor.fetchall()
             conn.close()
             
-            logger.debug(f'查詢到 {len(records)} 筆糖化血色素記錄')
+            logger.debug('查詢到 %s 筆糖化血色素記錄', len(records))
             
             # 轉換為字典列表
             result = []
             for record in records:
                 result.append({
                     'id': record[0],
-                    'user_id': record[1],
                     'a1c': record[2],
                     'recorded_at': record[3],
+                    'updated_at': record[5],
                     'created_at': record[4],
-                    'updated_at': record[5]
+                    'user_id': record[1]
                 })
             
             return result
@@ -103,14 +105,14 @@ class A1cModule:
     def delete_a1c_records(user_id: int, ids: List[int]) -> bool:
         '''刪除糖化血色素記錄'''
         try:
-            logger.debug(f'刪除糖化血色素記錄: user_id={user_id}, ids={ids}')
+            logger.debug('刪除糖化血色素記錄: user_id=%s, ids=%s', user_id, ids)
             
             if not ids:
                 logger.debug('沒有要刪除的記錄')
                 return True
             
             # 使用 sqlite3 直接操作
-            conn = sqlite3.connect('Puyuan.db')
+            conn = connect_raw()
             cursor = conn.cursor()
             
             # 刪除記錄(確保只能刪除自己的記錄)
@@ -122,6 +124,8 @@ class A1cModule:
             
             cursor.execute(query, [user_id] + ids)
             deleted_count = cursor.rowcount
+            if deleted_count:
+                bump_data_version_raw(cursor, user_id, SCOPE_A1C)
             
             conn.commit()
             conn.close()
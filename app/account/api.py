@@ -2,6 +2,7 @@
 from fastapi import APIRouter, Depends, Header
 from sqlalchemy.orm import Session
 from app.core.database import get_db
+from app.core.rate_limit import rate_limit
 from app.account.models import (
     UserRegister, UserLogin, PasswordReset, PasswordForgot,
     VerificationSend, VerificationCheck,
@@ -109,7 +110,7 @@ def check_register(email: str, db: Session = Depends(get_db)):
     """
     try:
         result = AccountModule.check_register_status(db, email)
-        logger.debug(f"check_register_status 返回: {result}")
+        logger.debug("check_register_status 返回: %s", result)
         
         # 帳號不存在 → status = "0"（可以註冊）
         if not result["exists"]:
@@ -124,17 +125,14 @@ def check_register(email: str, db: Session = Depends(get_db)):
             response = BaseResponse(status="0", message="帳號未驗證，可以重新註冊")
             logger.debug("帳號未驗證，允許重新註冊")
         
-        response_dict = response.model_dump()
-        response_json = response.model_dump_json()
-        logger.debug(f"返回的 response dict: {response_dict}")
-        logger.debug(f"返回的 response JSON: {response_json}")
+        logger.debug("返回: %s", response)
         return response
     except Exception as e:
         logger.error(f"check_register 錯誤: {str(e)}", exc_info=True)
         return BaseResponse(status="1", message="查詢失敗")
 
 
-@router.post("/auth", summary="用戶登入", tags=["用戶身份"])
+@router.post("/auth", summary="用戶登入", tags=["用戶身份"], dependencies=[Depends(rate_limit("auth"))])
 def login_user(request: UserLogin, db: Session = Depends(get_db)):
     """
     用戶登入
@@ -236,7 +234,7 @@ def reset_password(
         return BaseResponse(status="1", message="失敗")
 
 
-@router.post("/password/forgot", response_model=BaseResponse, summary="忘記密碼", tags=["用戶身份"])
+@router.post("/password/forgot", response_model=BaseResponse, summary="忘記密碼", tags=["用戶身份"], dependencies=[Depends(rate_limit("password_forgot"))])
 def forgot_password(request: PasswordForgot, db: Session = Depends(get_db)):
     """
     忘記密碼 - 發送臨時密碼到郵件
@@ -280,7 +278,7 @@ def forgot_password(request: PasswordForgot, db: Session = Depends(get_db)):
         return BaseResponse(status="1", message="失敗")
 
 
-@router.post("/verification/send", response_model=VerificationSendResponse, response_model_exclude_none=True, summary="發送驗證碼", tags=["用戶身份"])
+@router.post("/verification/send", response_model=VerificationSendResponse, response_model_exclude_none=True, summary="發送驗證碼", tags=["用戶身份"], dependencies=[Depends(rate_limit("verification_send"))])
 def send_verification(request: VerificationSend, db: Session = Depends(get_db)):
     """
     發送驗證碼到郵箱
@@ -334,7 +332,7 @@ def send_verification(request: VerificationSend, db: Session = Depends(get_db)):
         )
 
 
-@router.post("/verification/check", response_model=BaseResponse, summary="檢查驗證碼", tags=["用戶身份"])
+@router.post("/verification/check", response_model=BaseResponse, summary="檢查驗證碼", tags=["用戶身份"], dependencies=[Depends(rate_limit("verification_check"))])
 def check_verification(request: VerificationCheck, db: Session = Depends(get_db)):
     """
     檢查驗證碼是否正確
@@ -6,6 +6,7 @@ from app.core.security import hash_password, verify_password, create_access_toke
 from typing import Optional, Dict
 from datetime import datetime, timedelta
 import random
+from app.core.data_version import bump_data_version, SCOPE_PROFILE
 from common.utils import get_logger
 
 logger = get_logger(__name__)
@@ -61,7 +62,7 @@ class AccountModule:
                     ).all()
                     for old_verification in old_verifications:
                         db.delete(old_verification)
-                    logger.debug(f"已刪除 {len(old_verifications)} 條舊驗證碼")
+                    logger.debug("已刪除 %s 條舊驗證碼", len(old_verifications))
                     
                     # 1.2 更新帳號密碼和驗證過期時間
                     hashed_pwd = hash_password(password)
@@ -131,12 +132,12 @@ class AccountModule:
             {"success": bool, "message": str, "token": str}
         """
         try:
-            logger.info("--- 登入流程開始 ---")
+            logger.debug("--- 登入流程開始 ---")
             # 1. 查詢用戶
-            logger.debug(f"步驟 1: 正在資料庫中查詢用戶 {email}...")
+            logger.debug("步驟 1: 正在資料庫中查詢用戶 %s...", email)
             user = AccountModule.get_user_by_email(db, email)
             if not user:
-                logger.warning(f"結果: 找不到用戶 {email}。")
+                logger.warning("結果: 找不到用戶 %s。", email)
                 return {"success": False, "message": "帳號或密碼錯誤", "token": None}
             logger.debug("結果: 已找到用戶。")
             
@@ -158,7 +159,7 @@ class AccountModule:
             logger.debug("步驟 4: 正在生成 JWT Token...")
             token = create_access_token({"sub": str(user.id)})
             logger.debug("結果: Token 生成成功。")
-            logger.info("--- 登入流程成功結束 ---")
+            logger.info("用戶 %s 登入成功", user.id)
             
             return {"success": True, "message": "登入成功", "token": token}
             
@@ -185,6 +186,7 @@ class AccountModule:
             # 2. 更新密碼
             user.password = hash_password(new_password)
             user.must_change_password = False
+            bump_data_version(db, user_id, SCOPE_PROFILE)
             db.commit()
             
             logger.info(f"用戶 {user_id} 密碼已更新")
@@ -216,13 +218,14 @@ class AccountModule:
             
             # 2. 生成 6 位數臨時密碼
             temp_password = AccountModule.generate_code()
-            logger.debug(f"生成臨時密碼: {temp_password}")
+            logger.debug("生成臨時密碼: %s", temp_password)
             
             # 3. 用臨時密碼取代原本的密碼
             user.password = hash_password(temp_password)
             user.must_change_password = True  # 標記需要更改密碼
+            bump_data_version(db, user.id, SCOPE_PROFILE)
             db.commit()
-            logger.debug(f"已更新密碼為臨時密碼")
+            logger.debug("已更新密碼為臨時密碼")
             
             # 4. 發送臨時密碼到郵件
             from app.core.email_config import EmailService
@@ -286,7 +289,7 @@ class AccountModule:
             
             # 1. 生成驗證碼
             code = AccountModule.generate_code()
-            logger.debug(f"生成驗證碼: {code}")
+            logger.debug("生成驗證碼: %s", code)
             
             # 2. 所有驗證碼都存到 verification_codes 表
             verification = VerificationCodeDB(
@@ -296,10 +299,10 @@ class AccountModule:
                 is_used=False
             )
             db.add(verification)
-            logger.debug(f"驗證碼已存到 verification_codes 表")
+            logger.debug("驗證碼已存到 verification_codes 表")
             
             db.commit()
-            logger.debug(f"已儲存到資料庫")
+            logger.debug("已儲存到資料庫")
             
             # 發送郵件
             from app.core.email_config import EmailService
@@ -326,27 +329,28 @@ class AccountModule:
             True = 驗證成功, False = 驗證失敗
         """
         try:
-            logger.debug(f"開始驗證 - Email: {email}, Code: {code}")
+            logger.debug("開始驗證 - Email: %s, Code: %s", email, code)
             
             # 1. 先檢查 UserAuth.code（已註冊用戶）
             user = AccountModule.get_user_by_email(db, email)
             if user:
-                logger.debug(f"找到用戶，資料庫中的 code: '{user.code}', 輸入的 code: '{code}'")
+                logger.debug("找到用戶，資料庫中的 code: '%s', 輸入的 code: '%s'", user.code, code)
                 # 確保兩邊都是字串並去除空白
                 db_code = str(user.code).strip() if user.code else None
                 input_code = str(code).strip() if code else None
-                logger.debug(f"比對: db_code='{db_code}' vs input_code='{input_code}'")
+                logger.debug("比對: db_code='%s' vs input_code='%s'", db_code, input_code)
                 
                 if db_code and input_code and db_code == input_code:
                     logger.info(f"從 UserAuth.code 驗證成功")
                     user.verified = True
                     user.code = None  # 清除驗證碼
+                    bump_data_version(db, user.id, SCOPE_PROFILE)
                     db.commit()
                     return True
                 else:
-                    logger.debug(f"UserAuth.code 不匹配，繼續檢查 verification_codes 表")
+                    logger.debug("UserAuth.code 不匹配，繼續檢查 verification_codes 表")
             else:
-                logger.debug(f"用戶不存在，檢查 verification_codes 表")
+                logger.debug("用戶不存在，檢查 verification_codes 表")
             
             # 2. 再檢查 verification_codes 表（未註冊用戶）
             verification = db.query(VerificationCodeDB).filter(
@@ -371,6 +375,7 @@ class AccountModule:
             if user:
                 user.verified = True
                 user.verification_expires_at = None  # 清除驗證過期時間
+                bump_data_version(db, user.id, SCOPE_PROFILE)
             
             db.commit()
             
@@ -5,6 +5,7 @@ from fastapi import APIRouter, Depends, HTTPException, Header
 from typing import Optional
 from .models import CareMessageUpload, CareListResponse, BaseResponse
 from .module import CareModule
+from app.core.responses import trusted_response
 
 router = APIRouter(tags=["關懷諮詢"])
 
@@ -27,11 +28,11 @@ async def get_care_list(
         # 獲取關懷諮詢列表
         cares = care_module.get_care_list(user_id)
         
-        return CareListResponse(
-            status="0",
-            message="ok",
-            cares=cares
-        )
+        return trusted_response({
+            "status": "0",
+            "message": "ok",
+            "cares": cares
+        })
         
     except Exception as e:
         return CareListResponse(
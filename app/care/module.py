@@ -2,9 +2,10 @@
 關懷諮詢模組
 """
 import sqlite3
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
 from .models import CareMessageUpload, CareRecord
+from app.core.database import connect_raw
 import sys
 import os
 from common.utils import get_logger
@@ -49,11 +50,11 @@ class CareModule:
     
     def get_db_connection(self):
         """獲取資料庫連線"""
-        conn = sqlite3.connect(self.db_path)
+        conn = connect_raw(self.db_path)
         conn.row_factory = sqlite3.Row
         return conn
     
-    def get_care_list(self, user_id: int) -> List[CareRecord]:
+    def get_care_list(self, user_id: int) -> List[Dict[str, Any]]:
         """
         獲取使用者的關懷諮詢紀錄列表
         
@@ -61,7 +62,7 @@ class CareModule:
             user_id: 使用者 ID
             
         Returns:
-            關懷諮詢紀錄列表
+            關懷諮詢紀錄列表（欄位與 CareRecord 相同）
         """
         conn = self.get_db_connection()
         cursor = conn.cursor()
@@ -76,15 +77,15 @@ class CareModule:
             rows = cursor.fetchall()
             
             return [
-                CareRecord(
-                    id=row['id'],
-                    user_id=row['user_id'],
-                    member_id=row['member_id'],
-                    reply_id=row['reply_id'],
-                    message=row['message'],
-                    updated_at=row['updated_at'],
-                    created_at=row['created_at']
-                )
+                {
+                    'id': row['id'],
+                    'user_id': row['user_id'],
+                    'member_id': row['member_id'],
+                    'reply_id': row['reply_id'],
+                    'message': row['message'],
+                    'updated_at': row['updated_at'] or '',
+                    'created_at': row['created_at'] or ''
+                }
                 for row in rows
             ]
             
@@ -2,86 +2,101 @@
 """
 清理過期未驗證帳號的任務
 """
+from sqlalchemy import select, delete
 from sqlalchemy.orm import Session
 from app.account.models import User
 from app._user.models import UserProfile
 from datetime import datetime, timezone, timedelta
-import threading
-import time
 from common.utils import get_logger
 
 logger = get_logger(__name__)
 TAIWAN_TZ = timezone(timedelta(hours=8))
 
+# 每次清理最多刪除的帳號數，避免單一交易長時間佔用寫入鎖
+CLEANUP_BATCH_SIZE = 500
+
+# 清理間隔（秒）：有資料時縮短，連續沒有資料時逐步拉長
+CLEANUP_MIN_INTERVAL = 10
+CLEANUP_BASE_INTERVAL = 60
+CLEANUP_MAX_INTERVAL = 600
+
 
 class CleanupService:
     """清理服務"""
-    
+
     @staticmethod
-    def cleanup_expired_unverified_users(db: Session) -> int:
+    def cleanup_expired_unverified_users(db: Session, batch_size: int = CLEANUP_BATCH_SIZE) -> int:
         """
         清理過期未驗證的帳號
-        
+
+        以 DELETE ... WHERE id IN (SELECT ...) 一次刪除，
+        UserProfile 與 UserAuth 在同一個交易中處理。
+
+        Args:
+            db: 資料庫 session
+            batch_size: 單次最多刪除的帳號數
+
         Returns:
             刪除的帳號數量
         """
         try:
             now = datetime.now(TAIWAN_TZ).replace(tzinfo=None)
-            
-            # 查詢所有過期未驗證的帳號
-            expired_users = db.query(User).filter(
-                User.verified == False,
-                User.verification_expires_at != None,
-                User.verification_expires_at <= now
-            ).all()
-            
-            deleted_count = 0
-            for user in expired_users:
-                try:
-                    logger.info(f"刪除過期未驗證帳號: {user.email} (過期時間: {user.verification_expires_at})")
-                    
-                    # 刪除相關的 user_profile
-                    db.query(UserProfile).filter(UserProfile.user_id == user.id).delete()
-                    
-                    # 刪除用戶
-                    db.delete(user)
-                    deleted_count += 1
-                except Exception as e:
-                    logger.error(f"刪除帳號 {user.email} 時出錯: {str(e)}", exc_info=True)
-            
+
+            # 過期未驗證帳號的 id（依 id 排序，兩次刪除取到同一批）
+            expired_ids = (
+                select(User.id)
+                .where(
+                    User.verified == False,
+                    User.verification_expires_at != None,
+                    User.verification_expires_at <= now
+                )
+                .order_by(User.id)
+                .limit(batch_size)
+            )
+
+            # 先刪除相關的 user_profile，再刪除用戶
+            db.execute(
+                delete(UserProfile)
+                .where(UserProfile.user_id.in_(expired_ids))
+                .execution_options(synchronize_session=False)
+            )
+            result = db.execute(
+                delete(User)
+                .where(User.id.in_(expired_ids))
+                .execution_options(synchronize_session=False)
+            )
             db.commit()
-            
+
+            deleted_count = result.rowcount or 0
             if deleted_count > 0:
                 logger.info(f"成功刪除 {deleted_count} 個過期未驗證帳號")
-            
+
             return deleted_count
-            
+
         except Exception as e:
             logger.error(f"清理過期帳號時出錯: {str(e)}", exc_info=True)
             db.rollback()
             return 0
 
+    @staticmethod
+    def next_interval(current: int, deleted_count: int, batch_size: int = CLEANUP_BATCH_SIZE) -> int:
+        """
+        依本次清理的數量決定下一次的間隔
+
+        - 刪滿一批：代表還有積壓，用最短間隔儘快再跑
+        - 有刪除：回到基本間隔
+        - 沒有資料：間隔加倍，直到上限
+
+        Args:
+            current: 目前的間隔（秒）
+            deleted_count: 本次刪除的數量
+            batch_size: 單次最多刪除的帳號數
 
-def start_cleanup_scheduler(db_session_factory):
-    """
-    啟動定期清理任務（每分鐘檢查一次）
-    
-    Args:
-        db_session_factory: SQLAlchemy session factory
-    """
-    def cleanup_loop():
-        while True:
-            try:
-                db = db_session_factory()
-                CleanupService.cleanup_expired_unverified_users(db)
-                db.close()
-            except Exception as e:
-                logger.error(f"清理任務出錯: {str(e)}", exc_info=True)
-            
-            # 每分鐘檢查一次
-            time.sleep(60)
-    
-    # 以後台線程啟動清理任務
-    cleanup_thread = threading.Thread(target=cleanup_loop, daemon=True)
-    cleanup_thread.start()
-    logger.info("已啟動過期帳號清理任務（每分鐘檢查一次）")
+        Returns:
+            下一次的間隔（秒）
+        """
+        if deleted_count >= batch_size:
+            return CLEANUP_MIN_INTERVAL
+        if deleted_count > 0:
+            return CLEANUP_BASE_INTERVAL
+        return min(current * 2, CLEANUP_MAX_INTERVAL)
@@ -0,0 +1,271 @@
+# -*- coding: utf-8 -*-
+"""
+回應壓縮：依 Accept-Encoding 協商 brotli 或 gzip
+
+日記、糖化血色素、藥物列表等回應在行動網路上可能有數十 KB。
+一般回應小於 COMPRESSION_MINIMUM_SIZE 時不壓縮；StreamingResponse
+（第一段之後還有內容）逐段壓縮並立即送出，不等待完整內容。
+已帶有 Content-Encoding 或本身已壓縮的內容類型（圖片、影音、壓縮檔）直接送出。
+
+brotli 為選用套件，沒有安裝時只使用 gzip。每個路由的壓縮前後大小與
+壓縮耗用的 CPU 時間記錄在 compression_stats。
+"""
+import os
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional
+from starlette.datastructures import MutableHeaders
+from app.core.route_names import route_name
+from common.utils import get_logger
+
+try:
+    import brotli
+except ImportError:  # brotli 為選用套件
+    brotli = None
+
+logger = get_logger(__name__)
+
+# 是否啟用壓縮
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() != "false"
+
+# 小於此大小（bytes）的回應不壓縮
+COMPRESSION_MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", 1024))
+
+# 壓縮等級：動態產生的回應以速度為主
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", 4))
+
+# 本身已壓縮、再壓縮沒有效果的內容類型
+COMPRESSED_CONTENT_TYPES = (
+    "image/", "video/", "audio/", "font/woff",
+    "application/zip", "application/gzip", "application/x-gzip",
+    "application/x-7z-compressed", "application/x-rar-compressed",
+    "application/octet-stream", "application/pdf",
+)
+
+# 同樣接受時優先使用的編碼
+ENCODING_PREFERENCE = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """
+    依 Accept-Encoding 選擇壓縮方式
+
+    Args:
+        accept_encoding: Accept-Encoding header（可含 q 值與 *）
+
+    Returns:
+        "br"、"gzip"，都不接受時回傳 None
+    """
+    weights: Dict[str, float] = {}
+    for item in accept_encoding.lower().split(","):
+        name, _, params = item.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        weights[name.strip()] = quality
+
+    best, best_quality = None, 0.0
+    for encoding in ENCODING_PREFERENCE:
+        quality = weights.get(encoding, weights.get("*", 0.0))
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+class _GzipEncoder:
+    """gzip 串流壓縮"""
+
+    def __init__(self):
+        self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        output = self._compressor.compress(data)
+        return output + self._compressor.flush(zlib.Z_SYNC_FLUSH) if flush else output
+
+    def finish(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliEncoder:
+    """brotli 串流壓縮"""
+
+    def __init__(self):
+        self._compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def compress(self, data: bytes, flush: bool) -> bytes:
+        output = self._compressor.process(data)
+        return output + self._compressor.flush() if flush else output
+
+    def finish(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+ENCODERS = {"gzip": _GzipEncoder, "br": _BrotliEncoder}
+
+
+class CompressionStats:
+    """各路由的壓縮統計"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._routes: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, route: str, encoding: str, bytes_in: int, bytes_out: int, cpu_seconds: float) -> None:
+        """
+        記錄一次壓縮
+
+        Args:
+            route: 路由（方法與路徑樣板）
+            encoding: 使用的編碼
+            bytes_in: 壓縮前大小
+            bytes_out: 壓縮後大小
+            cpu_seconds: 壓縮耗用的 CPU 時間
+        """
+        with self._lock:
+            entry = self._routes.setdefault(route, {
+                "responses": 0, "bytes_in": 0, "bytes_out": 0, "cpu_seconds": 0.0, "encodings": {}
+            })
+            entry["responses"] += 1
+            entry["bytes_in"] += bytes_in
+            entry["bytes_out"] += bytes_out
+            entry["cpu_seconds"] += cpu_seconds
+            entry["encodings"][encoding] = entry["encodings"].get(encoding, 0) + 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """
+        取得目前的統計
+
+        Returns:
+            {路由: {responses, bytes_in, bytes_out, ratio, cpu_seconds, encodings}}，
+            ratio 為壓縮後 / 壓縮前
+        """
+        with self._lock:
+            result = {}
+            for route, entry in self._routes.items():
+                result[route] = dict(
+                    entry,
+                    encodings=dict(entry["encodings"]),
+                    ratio=entry["bytes_out"] / entry["bytes_in"] if entry["bytes_in"] else 1.0
+                )
+            return result
+
+    def log_summary(self) -> None:
+        """將各路由的統計寫入 log"""
+        for route, entry in sorted(self.snapshot().items()):
+            logger.info(
+                "壓縮統計 %s: %d 次, %d -> %d bytes (%.1f%%), CPU %.1f ms",
+                route, entry["responses"], entry["bytes_in"], entry["bytes_out"],
+                entry["ratio"] * 100, entry["cpu_seconds"] * 1000
+            )
+
+    def clear(self) -> None:
+        """清除統計"""
+        with self._lock:
+            self._routes.clear()
+
+
+compression_stats = CompressionStats()
+
+
+def _is_compressible(headers: MutableHeaders) -> bool:
+    """回應是否需要壓縮（已編碼或本身已壓縮的內容不處理）"""
+    if "content-encoding" in headers:
+        return False
+    content_type = headers.get("content-type", "").lower()
+    return not content_type.startswith(COMPRESSED_CONTENT_TYPES)
+
+
+class CompressionMiddleware:
+    """依 Accept-Encoding 壓縮回應內容"""
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MINIMUM_SIZE, stats: CompressionStats = compression_stats):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.stats = stats
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        accept_encoding = dict(scope["headers"]).get(b"accept-encoding", b"").decode("latin-1")
+        encoding = choose_encoding(accept_encoding)
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        await self._send_compressed(scope, receive, send, encoding)
+
+    async def _send_compressed(self, scope, receive, send, encoding):
+        """執行路由，依第一段內容決定是否壓縮"""
+        start_message = None
+        encoder = None
+        passthrough = False
+        bytes_in = bytes_out = 0
+        cpu_seconds = 0.0
+
+        async def compressing_send(message):
+            nonlocal start_message, encoder, passthrough, bytes_in, bytes_out, cpu_seconds
+            message_type = message["type"]
+            if message_type == "http.response.start":
+                start_message = message
+                return
+            if passthrough:
+                await send(message)
+                return
+            if message_type != "http.response.body":
+                # 其他訊息（例如檔案傳送）不壓縮
+                passthrough = True
+                if start_message is not None:
+                    await send(start_message)
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+            if encoder is None:
+                headers = MutableHeaders(scope=start_message)
+                declared_length = headers.get("content-length")
+                too_small = (
+                    len(body) < self.minimum_size if not more_body
+                    else declared_length is not None and int(declared_length) < self.minimum_size
+                )
+                if too_small or not _is_compressible(headers):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                encoder = ENCODERS[encoding]()
+                headers["content-encoding"] = encoding
+                headers.add_vary_header("Accept-Encoding")
+                if "content-length" in headers:
+                    del headers["content-length"]
+
+            started = time.thread_time()
+            # 串流回應每段都 flush，讓用戶端立即收到已產生的內容
+            compressed = encoder.compress(body, flush=True) if more_body else encoder.finish(body)
+            cpu_seconds += time.thread_time() - started
+            bytes_in += len(body)
+            bytes_out += len(compressed)
+
+            if start_message is not None:
+                if not more_body:
+                    MutableHeaders(scope=start_message)["content-length"] = str(len(compressed))
+                await send(start_message)
+                start_message = None
+
+            await send({"type": "http.response.body", "body": compressed, "more_body": more_body})
+            if not more_body:
+                self.stats.record(route_name(scope), encoding, bytes_in, bytes_out, cpu_seconds)
+
+        await self.app(scope, receive, compressing_send)
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""
+條件式 GET：以資料版本號產生 ETag
+
+App 每次開啟畫面都會重新輪詢這些端點。請求帶有相同的 If-None-Match 時，
+只查一次 data_versions 就直接回 304，不需要執行路由與查詢資料表。
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from typing import Dict, Optional
+from anyio import to_thread
+from app.core.data_version import (
+    get_data_version, GLOBAL_USER_ID,
+    SCOPE_PROFILE, SCOPE_A1C, SCOPE_DRUG_USED, SCOPE_MEDICAL, SCOPE_NEWS
+)
+from app.core.security import verify_token
+from common.utils import get_logger
+
+logger = get_logger(__name__)
+
+# 支援條件式 GET 的路徑與對應的版本範圍
+CONDITIONAL_ROUTES: Dict[str, str] = {
+    "/api/user": SCOPE_PROFILE,
+    "/api/user/a1c": SCOPE_A1C,
+    "/api/user/drug-used": SCOPE_DRUG_USED,
+    "/api/user/medical": SCOPE_MEDICAL,
+    "/api/news": SCOPE_NEWS,
+}
+
+# 全站共用、不需要身分驗證的範圍
+GLOBAL_SCOPES = {SCOPE_NEWS}
+
+# 回應內容依使用者而異，瀏覽器/代理伺服器每次都要重新驗證
+CACHE_CONTROL = b"private, no-cache"
+
+# 未登入時的全站共用資料可由代理伺服器快取的秒數
+PUBLIC_MAX_AGE = int(os.getenv("PUBLIC_MAX_AGE", 60))
+PUBLIC_CACHE_CONTROL = f"public, max-age={PUBLIC_MAX_AGE}".encode("latin-1")
+
+# 成功回應的開頭（失敗的回應不發 ETag，避免錯誤被快取）
+SUCCESS_PREFIX = b'{"status":"0"'
+
+
+def _user_id_from_headers(headers: Dict[bytes, bytes]) -> Optional[int]:
+    """從 Authorization header 解析用戶 ID"""
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    if not authorization.startswith("Bearer "):
+        return None
+    payload = verify_token(authorization[7:])
+    try:
+        return int(payload.get("sub")) if payload else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _http_date(taiwan_time: datetime) -> bytes:
+    """將台灣時間（無時區）轉成 HTTP 日期格式"""
+    utc_time = (taiwan_time - timedelta(hours=8)).replace(tzinfo=timezone.utc)
+    return format_datetime(utc_time, usegmt=True).encode("latin-1")
+
+
+def _etag_matches(if_none_match: bytes, etag: bytes) -> bool:
+    """比對 If-None-Match（弱比對，可包含多個 ETag 或 *）"""
+    candidates = [value.strip() for value in if_none_match.split(b",")]
+    return b"*" in candidates or etag in candidates or etag[2:] in candidates
+
+
+class ConditionalGetMiddleware:
+    """為 CONDITIONAL_ROUTES 的 GET 請求加上 ETag / Last-Modified，並回應 304"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        data_scope = CONDITIONAL_ROUTES.get(scope["path"].rstrip("/") or "/")
+        if data_scope is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        user_id = _user_id_from_headers(headers)
+        if data_scope in GLOBAL_SCOPES:
+            version_owner = GLOBAL_USER_ID
+        elif user_id is not None:
+            version_owner = user_id
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            version, updated_at = await to_thread.run_sync(get_data_version, version_owner, data_scope)
+        except Exception as e:
+            logger.error(f"讀取資料版本失敗: {str(e)}", exc_info=True)
+            await self.app(scope, receive, send)
+            return
+
+        # 全站資料登入後可能包含個人內容，ETag 也要帶上用戶 ID
+        etag = f'W/"{data_scope}-{user_id or GLOBAL_USER_ID}-{version}"'.encode("latin-1")
+        validators = [
+            (b"etag", etag),
+            (b"last-modified", _http_date(updated_at)),
+            (b"cache-control", CACHE_CONTROL if user_id is not None else PUBLIC_CACHE_CONTROL),
+            (b"vary", b"Authorization"),
+        ]
+
+        if_none_match = headers.get(b"if-none-match")
+        if if_none_match and _etag_matches(if_none_match, etag):
+            await send({"type": "http.response.start", "status": 304, "headers": validators})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        await self._send_with_validators(scope, receive, send, validators)
+
+    async def _send_with_validators(self, scope, receive, send, validators):
+        """執行路由並暫存回應，成功時才加上 ETag 等標頭"""
+        start_message = None
+        body_parts = []
+
+        async def buffered_send(message):
+            nonlocal start_message
+            if message["type"] == "http.response.start":
+                start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body_parts.append(message.get("body", b""))
+            if message.get("more_body", False):
+                return
+
+            body = b"".join(body_parts)
+            if start_message["status"] == 200 and body.startswith(SUCCESS_PREFIX):
+                start_message["headers"] = list(start_message.get("headers", [])) + validators
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, buffered_send)
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+"""
+每位用戶的資料版本號
+
+各模組在寫入資料的同一個交易中呼叫 bump_data_version（SQLAlchemy session / 連線）
+或 bump_data_version_raw（sqlite3 cursor），由呼叫端一起 commit；版本號更新失敗時
+資料寫入也一起回滾，不會出現資料已變更、版本號卻沒有變的情況（ETag 一直回 304、
+快取一直回傳舊資料）。讀取端以 (user_id, scope) 的版本號判斷資料是否變更，
+不需要查詢實際的資料表。全站共用的資料（例如最新消息）使用 user_id = 0。
+"""
+from datetime import datetime
+from typing import Tuple
+from sqlalchemy import Column, Integer, String, DateTime, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app.core.database import Base, engine
+from common.utils import get_logger, get_taiwan_time
+
+logger = get_logger(__name__)
+
+# 版本範圍
+SCOPE_PROFILE = "profile"      # /api/user：UserAuth、UserProfile、UserDefaults、UserSettings
+SCOPE_A1C = "a1c"              # /api/user/a1c
+SCOPE_DRUG_USED = "drug_used"  # /api/user/drug-used
+SCOPE_MEDICAL = "medical"      # /api/user/medical
+SCOPE_NEWS = "news"            # /api/news（全站共用）
+
+# 全站共用資料的 user_id
+GLOBAL_USER_ID = 0
+
+# 版本號加一（具名參數，SQLAlchemy 與 sqlite3 都能執行）
+BUMP_VERSION_SQL = """
+    INSERT INTO data_versions (user_id, scope, version, updated_at)
+    VALUES (:user_id, :scope, 1, :now)
+    ON CONFLICT (user_id, scope) DO UPDATE SET version = version + 1, updated_at = excluded.updated_at
+"""
+
+
+class DataVersion(Base):
+    """資料版本表：每位用戶每個範圍一列"""
+    __tablename__ = "data_versions"
+
+    user_id = Column(Integer, primary_key=True)
+    scope = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=1)
+    updated_at = Column(DateTime, nullable=False)
+
+
+def _bump_params(user_id: int, scopes) -> list:
+    """每個範圍一組參數（時間格式與 SQLAlchemy 的 DateTime 相同）"""
+    now = get_taiwan_time().strftime("%Y-%m-%d %H:%M:%S.%f")
+    return [{"user_id": user_id, "scope": scope, "now": now} for scope in scopes]
+
+
+def bump_data_version(db, user_id: int, *scopes: str) -> None:
+    """
+    將指定範圍的版本號加一（與資料寫入在同一個交易中，由呼叫端 commit）
+
+    失敗時引發例外，呼叫端回滾資料寫入。
+
+    Args:
+        db: 資料庫 session 或連線
+        user_id: 使用者 ID（全站資料為 GLOBAL_USER_ID）
+        *scopes: 版本範圍
+    """
+    for params in _bump_params(user_id, scopes):
+        db.execute(text(BUMP_VERSION_SQL), params)
+
+
+def bump_data_version_raw(cursor, user_id: int, *scopes: str) -> None:
+    """
+    同 bump_data_version，以 sqlite3 cursor 執行（由呼叫端 commit）
+
+    Args:
+        cursor: sqlite3 cursor
+        user_id: 使用者 ID（全站資料為 GLOBAL_USER_ID）
+        *scopes: 版本範圍
+    """
+    cursor.executemany(BUMP_VERSION_SQL, _bump_params(user_id, scopes))
+
+
+def get_data_version(user_id: int, scope: str) -> Tuple[int, datetime]:
+    """
+    取得目前的版本號，沒有記錄時建立第一版
+
+    Args:
+        user_id: 使用者 ID
+        scope: 版本範圍
+
+    Returns:
+        (版本號, 最後更新時間)
+    """
+    with engine.connect() as conn:
+        row = conn.execute(
+            select(DataVersion.version, DataVersion.updated_at)
+            .where(DataVersion.user_id == user_id, DataVersion.scope == scope)
+        ).first()
+        if row:
+            return row.version, row.updated_at
+
+    now = get_taiwan_time()
+    with engine.begin() as conn:
+        conn.execute(
+            sqlite_insert(DataVersion)
+            .values(user_id=user_id, scope=scope, version=1, updated_at=now)
+            .on_conflict_do_nothing(index_elements=[DataVersion.user_id, DataVersion.scope])
+        )
+        row = conn.execute(
+            select(DataVersion.version, DataVersion.updated_at)
+            .where(DataVersion.user_id == user_id, DataVersion.scope == scope)
+        ).first()
+    return row.version, row.updated_at
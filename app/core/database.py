@@ -1,15 +1,23 @@
+import sqlite3
 from sqlalchemy import create_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from app.core.sql_events import install_engine_hooks, InstrumentedConnection
 
 # 資料庫連接設定（使用 Puyuan.db）
 SQLALCHEMY_DATABASE_URL = "sqlite:///./puyuan.db"
 
+# 直接使用 sqlite3 的模組所連接的資料庫檔案
+RAW_DATABASE_PATH = "Puyuan.db"
+
 engine = create_engine(
     SQLALCHEMY_DATABASE_URL, 
     connect_args={"check_same_thread": False}  # SQLite 需要這個參數
 )
 
+# SQL 執行事件（指標、慢查詢紀錄等）
+install_engine_hooks(engine)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
@@ -20,4 +28,17 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def connect_raw(db_path: str = RAW_DATABASE_PATH) -> sqlite3.Connection:
+    """
+    取得 sqlite3 連線（執行的 SQL 與 SQLAlchemy 一樣會通知 SQL 執行事件）
+
+    Args:
+        db_path: 資料庫路徑
+
+    Returns:
+        sqlite3 連線
+    """
+    return sqlite3.connect(db_path, factory=InstrumentedConnection)
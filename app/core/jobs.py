@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+"""
+定期維護任務 - 註冊到背景排程器
+"""
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import delete, or_, text
+from sqlalchemy.orm import Session
+from app._else.module import BadgeModule
+from app.account.models import VerificationCodeDB
+from app.core.cleanup import CleanupService, CLEANUP_BASE_INTERVAL, CLEANUP_MAX_INTERVAL
+from app.core.database import SessionLocal
+from app.core.scheduler import Scheduler
+from app.friend.invite_codes import invite_code_pool
+from app.friend.module import FriendModule
+from common.utils import get_logger
+
+logger = get_logger(__name__)
+
+# 設為 false 可停用背景任務（例如測試或一次性腳本）
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "true").lower() == "true"
+
+# 已使用或過期的驗證碼保留時間
+VERIFICATION_CODE_RETENTION = timedelta(hours=1)
+
+# 每次 incremental vacuum 回收的頁數上限
+INCREMENTAL_VACUUM_PAGES = 1000
+
+scheduler = Scheduler(SessionLocal)
+
+
+def cleanup_expired_accounts_job():
+    """建立清理過期未驗證帳號的任務函式（依清理數量調整下一次間隔）"""
+    state = {"interval": CLEANUP_BASE_INTERVAL}
+
+    def run(db: Session) -> int:
+        deleted_count = CleanupService.cleanup_expired_unverified_users(db)
+        state["interval"] = CleanupService.next_interval(state["interval"], deleted_count)
+        return state["interval"]
+
+    return run
+
+
+def purge_verification_codes(db: Session) -> int:
+    """
+    刪除已使用或已過期的驗證碼
+
+    Returns:
+        刪除的筆數
+    """
+    cutoff = datetime.now() - VERIFICATION_CODE_RETENTION
+    result = db.execute(
+        delete(VerificationCodeDB)
+        .where(or_(
+            VerificationCodeDB.is_used == True,
+            VerificationCodeDB.expires_at < cutoff,
+            VerificationCodeDB.created_at < cutoff - timedelta(days=1)
+        ))
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+    deleted_count = result.rowcount or 0
+    if deleted_count > 0:
+        logger.info(f"已清除 {deleted_count} 筆過期驗證碼")
+    return deleted_count
+
+
+def optimize_database(db: Session) -> None:
+    """執行 PRAGMA optimize（只對統計資料過時的表重新 ANALYZE）"""
+    db.execute(text("PRAGMA optimize"))
+    db.commit()
+
+
+def analyze_database(db: Session) -> None:
+    """完整重建查詢規劃器的統計資料"""
+    db.execute(text("ANALYZE"))
+    db.commit()
+
+
+def incremental_vacuum(db: Session) -> None:
+    """
+    回收空閒頁面
+
+    只有在資料庫設定 auto_vacuum=INCREMENTAL 時才有作用；
+    切換模式需要一次完整 VACUUM，這裡不自動進行。
+    """
+    mode = db.execute(text("PRAGMA auto_vacuum")).scalar()
+    if mode != 2:
+        logger.debug(f"auto_vacuum={mode}，略過 incremental vacuum")
+        return
+
+    free_pages = db.execute(text("PRAGMA freelist_count")).scalar() or 0
+    if free_pages:
+        db.execute(text(f"PRAGMA incremental_vacuum({min(free_pages, INCREMENTAL_VACUUM_PAGES)})"))
+        db.commit()
+        logger.info(f"incremental vacuum 回收 {min(free_pages, INCREMENTAL_VACUUM_PAGES)} 頁")
+
+
+def refill_invite_code_pool(db: Session) -> int:
+    """
+    補充本 worker 的邀請碼池
+
+    Returns:
+        新增的邀請碼數量
+    """
+    return invite_code_pool.refill(FriendModule().find_used_invite_codes)
+
+
+def recompute_badges(db: Session) -> int:
+    """
+    重新計算補登、刪除記錄的用戶與尚未建立狀態的用戶的徽章
+
+    Returns:
+        處理的用戶數
+    """
+    return BadgeModule.recompute_badges(db)
+
+
+def register_default_jobs(target: Scheduler = scheduler) -> Scheduler:
+    """
+    註冊所有預設維護任務
+
+    Args:
+        target: 排程器
+
+    Returns:
+        排程器
+    """
+    target.add_job(
+        "cleanup_expired_accounts", cleanup_expired_accounts_job(),
+        interval=CLEANUP_BASE_INTERVAL, jitter=5, timeout=CLEANUP_MAX_INTERVAL, adaptive=True
+    )
+    target.add_job("purge_verification_codes", purge_verification_codes, cron="*/30 * * * *", jitter=30, timeout=300)
+    target.add_job("optimize_database", optimize_database, cron="15 3 * * *", jitter=60, timeout=600)
+    target.add_job("analyze_database", analyze_database, cron="45 3 * * 0", jitter=60, timeout=1800)
+    target.add_job("incremental_vacuum", incremental_vacuum, cron="30 4 * * *", jitter=60, timeout=1800)
+    target.add_job("recompute_badges", recompute_badges, interval=300, jitter=30, timeout=600)
+    # 邀請碼池在每個 worker 各自一份，不需要租約
+    target.add_job(
+        "refill_invite_code_pool", refill_invite_code_pool,
+        interval=30, timeout=60, single_runner=False, run_on_start=True
+    )
+    return target
+
+
+def start_scheduler() -> None:
+    """註冊預設任務並啟動排程器（由 FastAPI lifespan 呼叫）"""
+    if not SCHEDULER_ENABLED:
+        logger.info("SCHEDULER_ENABLED=false，不啟動背景任務")
+        return
+    if not scheduler.jobs:
+        register_default_jobs(scheduler)
+    scheduler.start()
+
+
+def stop_scheduler() -> None:
+    """停止排程器（由 FastAPI lifespan 呼叫）"""
+    if SCHEDULER_ENABLED:
+        scheduler.stop()
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+背景任務租約鎖 - 多個 worker 共用同一個資料庫時，確保同一時間只有一個程序執行任務
+"""
+import os
+import socket
+from datetime import timedelta
+from sqlalchemy import Column, String, DateTime, or_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from app.core.database import Base
+from common.utils import get_logger, get_taiwan_time
+
+logger = get_logger(__name__)
+
+
+class JobLease(Base):
+    """任務租約資料表（每個任務一列）"""
+    __tablename__ = "job_leases"
+
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)
+    expires_at = Column(DateTime, nullable=False)
+    updated_at = Column(DateTime, default=get_taiwan_time, onupdate=get_taiwan_time)
+
+
+def get_worker_id() -> str:
+    """
+    取得目前程序的識別字串（主機名稱 + PID）
+
+    每次呼叫都重新讀取 PID，fork 出來的 worker 才不會沿用父程序的值
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def acquire_lease(db: Session, name: str, ttl_seconds: int) -> bool:
+    """
+    嘗試取得（或續約）任務租約
+
+    以單一 INSERT ... ON CONFLICT DO UPDATE 完成，只有在租約已過期
+    或本來就屬於自己時才會更新，因此不會有兩個 worker 同時持有。
+
+    Args:
+        db: 資料庫 session
+        name: 任務名稱
+        ttl_seconds: 租約有效秒數
+
+    Returns:
+        True = 取得租約, False = 由其他 worker 持有
+    """
+    owner = get_worker_id()
+    now = get_taiwan_time()
+    expires_at = now + timedelta(seconds=ttl_seconds)
+
+    stmt = sqlite_insert(JobLease).values(
+        name=name, owner=owner, expires_at=expires_at, updated_at=now
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[JobLease.name],
+        set_={"owner": owner, "expires_at": expires_at, "updated_at": now},
+        where=or_(JobLease.owner == owner, JobLease.expires_at <= now),
+    )
+
+    try:
+        result = db.execute(stmt)
+        db.commit()
+        return result.rowcount > 0
+    except Exception as e:
+        logger.error(f"取得租約 {name} 失敗: {str(e)}", exc_info=True)
+        db.rollback()
+        return False
+
+
+def release_lease(db: Session, name: str) -> None:
+    """
+    釋放自己持有的租約（讓其他 worker 可以立即接手）
+
+    Args:
+        db: 資料庫 session
+        name: 任務名稱
+    """
+    try:
+        db.execute(
+            update(JobLease)
+            .where(JobLease.name == name, JobLease.owner == get_worker_id())
+            .values(expires_at=get_taiwan_time())
+        )
+        db.commit()
+    except Exception as e:
+        logger.error(f"釋放租約 {name} 失敗: {str(e)}", exc_info=True)
+        db.rollback()
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+依路由類別的自適應並行上限（超過時立即回應忙碌）
+
+尖峰時段大量上傳時，SQLite 寫入只能逐一執行，請求在伺服器內排隊直到用戶端逾時，
+伺服器仍繼續處理已經沒有人等待的請求。此 middleware 依路由類別
+（讀取、寫入、登入驗證、寄信）限制同時處理的請求數，超過上限的請求立即回應
+HTTP 200 + {"status": "1", "message": "伺服器忙碌中，請稍後再試"}（App 既有的失敗格式），
+並帶 Retry-After 標頭。
+
+上限以 AIMD 調整：
+  - 請求耗時超過類別的目標延遲時，上限乘以 LOAD_SHEDDING_BACKOFF
+    （每個目標延遲的時間內最多減少一次，避免同一波慢請求把上限一次降到底）
+  - 耗時正常且使用中的請求數達上限一半以上時，上限每個請求增加 1 / 上限
+    （約每處理「上限」個請求增加 1）
+上限介於類別的最小值與最大值之間。計數只在事件迴圈中更新，不需要鎖。
+"""
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+from app.core.metrics import Counter, Gauge, LabelValues, registry
+from app.core.responses import DefaultJSONResponse
+from common.utils import get_logger
+
+logger = get_logger(__name__)
+
+# 是否啟用
+LOAD_SHEDDING_ENABLED = os.getenv("LOAD_SHEDDING_ENABLED", "true").lower() != "false"
+
+# 超過目標延遲時上限的倍率
+LOAD_SHEDDING_BACKOFF = float(os.getenv("LOAD_SHEDDING_BACKOFF", 0.9))
+
+# 各類別的目標延遲（毫秒），例如 reads=300,writes=800
+LOAD_SHEDDING_TARGETS = os.getenv("LOAD_SHEDDING_TARGETS", "")
+
+# 同一類別的忙碌警告最短間隔（秒）
+SHED_LOG_INTERVAL = 10.0
+
+ROUTE_CLASS_READS = "reads"
+ROUTE_CLASS_WRITES = "writes"
+ROUTE_CLASS_AUTH = "auth"
+ROUTE_CLASS_EMAIL = "email"
+
+# 類別: (初始上限, 最小上限, 最大上限, 目標延遲秒數)
+# 寫入受 SQLite 單一寫入者限制；登入驗證類是暴力嘗試的目標，其中註冊、重設密碼與驗證碼檢查
+# 也會寫入；寄信需等待 SMTP，上限較低
+ROUTE_CLASS_SETTINGS: Dict[str, Tuple[int, int, int, float]] = {
+    ROUTE_CLASS_READS: (40, 4, 200, 0.5),
+    ROUTE_CLASS_WRITES: (10, 2, 50, 1.0),
+    ROUTE_CLASS_AUTH: (8, 2, 32, 1.0),
+    ROUTE_CLASS_EMAIL: (4, 1, 8, 5.0),
+}
+
+# 寄送郵件的路徑
+EMAIL_PATHS = ("/api/verification/send", "/api/password/forgot")
+
+# 登入、註冊與驗證的路徑
+AUTH_PATHS = ("/api/auth", "/api/register", "/api/register/check", "/api/password/reset", "/api/verification/check")
+
+# 以 GET 呼叫但會寫入資料的路徑結尾（好友邀請的接受與拒絕）
+GET_WRITE_SUFFIXES = ("/accept", "/refuse")
+
+# 以 GET 呼叫但會寫入資料的路徑（邀請結果讀取後標記為已讀）
+GET_WRITE_PATHS = ("/api/friend/results",)
+
+# 不限制的路徑（監控、管理與 API 文件）
+EXEMPT_PREFIXES = ("/metrics", "/api/admin/", "/docs", "/redoc", "/openapi.json")
+
+BUSY_MESSAGE = "伺服器忙碌中，請稍後再試"
+
+READ_METHODS = ("GET", "HEAD")
+
+
+def parse_targets(value: str) -> Dict[str, float]:
+    """
+    解析 LOAD_SHEDDING_TARGETS
+
+    Args:
+        value: 「類別=毫秒」以逗號分隔
+
+    Returns:
+        {類別: 目標延遲秒數}，格式錯誤或不認得的類別略過
+    """
+    targets = {}
+    for item in value.split(","):
+        name, _, milliseconds = item.partition("=")
+        name = name.strip()
+        if name in ROUTE_CLASS_SETTINGS:
+            try:
+                targets[name] = float(milliseconds) / 1000
+            except ValueError:
+                continue
+    return targets
+
+
+def route_class(scope) -> Optional[str]:
+    """
+    取得請求的路由類別
+
+    Returns:
+        reads / writes / auth / email，不限制的請求回傳 None
+    """
+    method = scope["method"]
+    path = scope["path"].rstrip("/") or "/"
+    if method == "OPTIONS" or path == "/" or path.startswith(EXEMPT_PREFIXES):
+        return None
+    if path in EMAIL_PATHS:
+        return ROUTE_CLASS_EMAIL
+    if path in AUTH_PATHS:
+        return ROUTE_CLASS_AUTH
+    if method in READ_METHODS and not path.endswith(GET_WRITE_SUFFIXES) and path not in GET_WRITE_PATHS:
+        return ROUTE_CLASS_READS
+    return ROUTE_CLASS_WRITES
+
+
+class AIMDLimiter:
+    """依延遲調整的並行上限（只在事件迴圈中使用）"""
+
+    def __init__(self, initial: int, minimum: int, maximum: int, target: float, backoff: float = LOAD_SHEDDING_BACKOFF):
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target = target
+        self.backoff = backoff
+        self.in_flight = 0
+        self.rejected = 0
+        self._last_decrease = float("-inf")
+
+    def try_acquire(self) -> bool:
+        """取得處理名額，已達上限時回傳 False"""
+        if self.in_flight >= int(self.limit):
+            self.rejected += 1
+            return False
+        self.in_flight += 1
+        return True
+
+    def release(self, latency: float) -> None:
+        """
+        歸還名額並依耗時調整上限
+
+        Args:
+            latency: 請求耗時（秒）
+        """
+        self.in_flight -= 1
+        if latency > self.target:
+            now = time.monotonic()
+            if now - self._last_decrease >= self.target:
+                self.limit = max(float(self.minimum), self.limit * self.backoff)
+                self._last_decrease = now
+        elif self.in_flight * 2 >= self.limit:
+            self.limit = min(float(self.maximum), self.limit + 1 / self.limit)
+
+
+def create_limiters() -> Dict[str, AIMDLimiter]:
+    """依設定建立各類別的 limiter"""
+    targets = parse_targets(LOAD_SHEDDING_TARGETS)
+    return {
+        name: AIMDLimiter(initial, minimum, maximum, targets.get(name, target))
+        for name, (initial, minimum, maximum, target) in ROUTE_CLASS_SETTINGS.items()
+    }
+
+
+limiters = create_limiters()
+
+
+def _limiter_values(attribute: str):
+    def values() -> List[Tuple[LabelValues, float]]:
+        return [((name,), getattr(limiter, attribute)) for name, limiter in limiters.items()]
+    return values
+
+
+registry.register(Gauge(
+    "concurrency_limit", "Adaptive in-flight request limit per route class", ("route_class",),
+    callback=_limiter_values("limit")
+))
+registry.register(Gauge(
+    "concurrency_in_flight", "In-flight requests per route class", ("route_class",),
+    callback=_limiter_values("in_flight")
+))
+registry.register(Counter(
+    "http_requests_shed_total", "Requests rejected with a busy response per route class", ("route_class",),
+    callback=_limiter_values("rejected")
+))
+
+
+class LoadSheddingMiddleware:
+    """超過路由類別的並行上限時立即回應忙碌"""
+
+    def __init__(self, app):
+        self.app = app
+        self._last_logged: Dict[str, float] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not LOAD_SHEDDING_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        name = route_class(scope)
+        limiter = limiters.get(name)
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not limiter.try_acquire():
+            self._log_shed(name, limiter)
+            response = DefaultJSONResponse(
+                status_code=200,
+                content={"status": "1", "message": BUSY_MESSAGE},
+                headers={"Retry-After": "1"},
+            )
+            await response(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(time.perf_counter() - started)
+
+    def _log_shed(self, name: str, limiter: AIMDLimiter) -> None:
+        """同一類別每 SHED_LOG_INTERVAL 秒最多記錄一次"""
+        now = time.monotonic()
+        if now - self._last_logged.get(name, float("-inf")) < SHED_LOG_INTERVAL:
+            return
+        self._last_logged[name] = now
+        logger.warning(
+            "%s 類請求已達並行上限 %d，回應忙碌（累計 %d 次）",
+            name, int(limiter.limit), limiter.rejected
+        )
@@ -0,0 +1,183 @@
+# -*- coding: utf-8 -*-
+"""
+Logging 設定：非同步輸出、JSON 格式、各 logger 等級與 debug 抽樣
+
+root logger 只掛一個 QueueHandler，請求與背景執行緒只把紀錄放進記憶體佇列，
+由 QueueListener 的執行緒格式化並寫入 stderr，寫入變慢（磁碟、容器 log 收集）
+時不會拖慢請求。佇列滿時丟棄紀錄並計數，不阻塞。
+
+呼叫端請使用 logger.debug("... %s", value)，等級未啟用或被抽樣略過時不會組字串。
+通過等級與抽樣的紀錄在放入佇列前組好訊息（% 參數），避免參數中的 dict、list
+在 listener 格式化前被呼叫端修改；例外堆疊與 JSON 仍在 listener 執行緒格式化。
+
+DEBUG 等級的紀錄依呼叫位置（logger 與行號）限速，每個位置每秒最多
+LOG_DEBUG_RATE 筆，略過的筆數記在下一筆的 suppressed 欄位。
+
+環境變數：
+  LOG_LEVEL：root 等級（預設 INFO）
+  LOG_LEVELS：個別 logger 的等級，例如 app._journal=DEBUG,sqlalchemy.engine=WARNING
+  LOG_FORMAT：json（預設）或 text
+  LOG_QUEUE_SIZE：佇列上限
+  LOG_DEBUG_RATE：每個位置每秒的 debug 紀錄數（0 表示不限速）
+
+日誌設定在 lifespan 中（每個 worker 程序）啟動；gunicorn preload 時
+master 啟動的執行緒不會帶到 fork 出來的 worker。
+"""
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, Tuple
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+LOG_DEBUG_RATE = float(os.getenv("LOG_DEBUG_RATE", 10))
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# LogRecord 本身的屬性，其餘屬性視為 extra={...} 傳入的結構化欄位
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+def parse_levels(value: str) -> Dict[str, str]:
+    """
+    解析 LOG_LEVELS
+
+    Args:
+        value: 「logger=等級」以逗號分隔
+
+    Returns:
+        {logger 名稱: 等級}，格式錯誤的項目略過
+    """
+    levels = {}
+    for item in value.split(","):
+        name, _, level = item.partition("=")
+        if name.strip() and level.strip():
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+class JsonFormatter(logging.Formatter):
+    """每筆紀錄輸出一行 JSON"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            "function": record.funcName,
+            "line": record.lineno,
+            "thread": record.threadName,
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exception"] = record.exc_text
+        if record.stack_info:
+            entry["stack"] = self.formatStack(record.stack_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class DebugSampler(logging.Filter):
+    """DEBUG 紀錄依呼叫位置限速（token bucket，每秒補充 rate 筆）"""
+
+    def __init__(self, rate: float = LOG_DEBUG_RATE):
+        super().__init__()
+        self.rate = rate
+        self._lock = threading.Lock()
+        # (logger, 行號) -> [剩餘 token, 上次補充時間, 略過筆數]
+        self._buckets: Dict[Tuple[str, int], list] = {}
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG or self.rate <= 0:
+            return True
+        now = time.monotonic()
+        key = (record.name, record.lineno)
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [self.rate, now, 0]
+            bucket[0] = min(self.rate, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False
+            bucket[0] -= 1
+            suppressed, bucket[2] = bucket[2], 0
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """佇列滿時丟棄紀錄，不阻塞呼叫端；例外堆疊與 JSON 的格式化留給 listener 執行緒"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # handle() 先執行等級與抽樣的 filter，到這裡的紀錄才組訊息；
+        # 參數可能是之後會被修改的物件，在呼叫端執行緒組好並清除 args。
+        # 同一程序內的佇列不需要序列化，保留 exc_info 由 listener 格式化
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_listener: Optional[QueueListener] = None
+_queue_handler: Optional[NonBlockingQueueHandler] = None
+
+
+def setup_logging() -> None:
+    """設定 root logger 並啟動 listener 執行緒（重複呼叫只會設定一次）"""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT))
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    _queue_handler = NonBlockingQueueHandler(log_queue)
+    _queue_handler.addFilter(DebugSampler())
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.addHandler(_queue_handler)
+    root.setLevel(LOG_LEVEL)
+    for name, level in parse_levels(LOG_LEVELS).items():
+        logging.getLogger(name).setLevel(level)
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=True)
+    _listener.start()
+
+
+def stop_logging() -> None:
+    """停止 listener（寫出佇列中剩餘的紀錄）"""
+    global _listener, _queue_handler
+    if _listener is None:
+        return
+    _listener.stop()
+    if _queue_handler.dropped:
+        sys.stderr.write(f"佇列已滿，丟棄 {_queue_handler.dropped} 筆日誌\n")
+    logging.getLogger().removeHandler(_queue_handler)
+    _listener = _queue_handler = None
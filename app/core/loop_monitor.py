@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+事件迴圈延遲與執行緒池飽和監控
+
+同步路由在 anyio 的執行緒池中執行，async 路由（好友、關懷等）直接在事件迴圈中執行，
+延遲突然變高時可能是事件迴圈被同步程式碼佔用，也可能是執行緒池用完、請求在排隊。
+背景工作每隔 LOOP_LAG_INTERVAL 秒：
+  - 量測事件迴圈延遲（實際醒來時間比預期晚多少）
+  - 讀取執行緒池使用中、上限與等待中的工作數
+  - 送出一個空工作到執行緒池，量測它等待執行緒的時間
+
+事件迴圈被阻塞時，背景工作本身也無法執行，因此另由一條監看執行緒檢查心跳：
+超過 LOOP_BLOCK_THRESHOLD 秒沒有更新時，立即取得事件迴圈執行緒當下的堆疊
+（正在佔用事件迴圈的程式碼）寫入 warning log，每次阻塞只記錄一次。
+
+結果輸出為 /metrics 的 event_loop_lag_seconds、event_loop_blocked_total、
+threadpool_tasks 與 threadpool_wait_seconds。
+"""
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Dict, Optional
+from anyio import to_thread
+from app.core.metrics import (
+    event_loop_lag, event_loop_lag_last, event_loop_blocked,
+    threadpool_wait, threadpool_wait_last, update_threadpool_snapshot
+)
+from common.utils import get_logger
+
+logger = get_logger(__name__)
+
+# 是否啟用監控
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() != "false"
+
+# 量測間隔（秒）
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", 0.5))
+
+# 事件迴圈超過此秒數沒有回應時記錄堆疊
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", 0.2))
+
+# 執行緒池等待超過此秒數時寫入 warning log
+THREADPOOL_WAIT_WARNING = float(os.getenv("THREADPOOL_WAIT_WARNING", 0.1))
+
+# 同一種警告的最短間隔（秒），避免持續飽和時洗版
+MONITOR_LOG_INTERVAL = float(os.getenv("MONITOR_LOG_INTERVAL", 10))
+
+# 堆疊最多顯示的層數（最內層）
+STACK_LIMIT = 30
+
+
+def _probe_started() -> float:
+    """在工作執行緒中執行：回傳開始執行的時間"""
+    return time.perf_counter()
+
+
+class RuntimeMonitor:
+    """事件迴圈與執行緒池監控"""
+
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, block_threshold: float = LOOP_BLOCK_THRESHOLD):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat = time.monotonic()
+        self._reported_heartbeat: Optional[float] = None
+        self._last_logged: Dict[str, float] = {}
+        self._stopped = threading.Event()
+        self._probe: Optional[asyncio.Task] = None
+
+    def _should_log(self, kind: str) -> bool:
+        """同一種警告每 MONITOR_LOG_INTERVAL 秒最多一次"""
+        now = time.monotonic()
+        if now - self._last_logged.get(kind, float("-inf")) < MONITOR_LOG_INTERVAL:
+            return False
+        self._last_logged[kind] = now
+        return True
+
+    async def run(self) -> None:
+        """背景工作：量測延遲與執行緒池，並啟動監看執行緒（取消時停止）"""
+        loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._stopped.clear()
+        watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        watchdog.start()
+        try:
+            while True:
+                self._heartbeat = time.monotonic()
+                expected = loop.time() + self.interval
+                await asyncio.sleep(self.interval)
+                lag = max(0.0, loop.time() - expected)
+                event_loop_lag.observe(value=lag)
+                event_loop_lag_last.set(value=lag)
+
+                update_threadpool_snapshot()
+                if self._probe is None or self._probe.done():
+                    self._probe = asyncio.create_task(self._probe_threadpool())
+        finally:
+            self._stopped.set()
+            if self._probe is not None:
+                self._probe.cancel()
+
+    async def _probe_threadpool(self) -> None:
+        """送出空工作到執行緒池，量測等待執行緒的時間"""
+        statistics = to_thread.current_default_thread_limiter().statistics()
+        submitted = time.perf_counter()
+        started = await to_thread.run_sync(_probe_started)
+        wait = max(0.0, started - submitted)
+        threadpool_wait.observe(value=wait)
+        threadpool_wait_last.set(value=wait)
+        if wait >= THREADPOOL_WAIT_WARNING and self._should_log("threadpool"):
+            logger.warning(
+                "執行緒池飽和：等待 %.0f ms 才取得執行緒（使用中 %d / %d，等待中 %d）",
+                wait * 1000, statistics.borrowed_tokens, statistics.total_tokens, statistics.tasks_waiting
+            )
+
+    def _watch(self) -> None:
+        """監看執行緒：事件迴圈太久沒有更新心跳時記錄它當下的堆疊"""
+        check_interval = max(self.block_threshold / 2, 0.01)
+        while not self._stopped.wait(check_interval):
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval
+            if blocked < self.block_threshold or self._reported_heartbeat == heartbeat:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None or frame.f_code.co_filename.endswith("selectors.py"):
+                # 事件迴圈在等待 I/O，只是計時器還沒觸發
+                continue
+            self._reported_heartbeat = heartbeat
+            event_loop_blocked.inc()
+            if self._should_log("loop"):
+                logger.warning(
+                    "事件迴圈已阻塞 %.0f ms，目前執行位置:\n%s",
+                    blocked * 1000, "".join(traceback.format_stack(frame, limit=STACK_LIMIT))
+                )
+
+
+runtime_monitor = RuntimeMonitor()
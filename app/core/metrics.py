@@ -0,0 +1,325 @@
+# -*- coding: utf-8 -*-
+"""
+Prometheus 格式的執行指標（GET /metrics）
+
+不依賴 prometheus_client，只實作需要的 Counter、Histogram 與 Gauge，
+以 Prometheus 文字格式 0.0.4 輸出。指標保存在各 worker 的記憶體中，
+多個 worker 時每次抓取取得的是處理該次請求的 worker 的數值。
+
+收集的指標：
+  - 各路由的請求數、狀態碼與延遲分布（MetricsMiddleware）
+  - SQL 語句數與耗時分布，分為 SQLAlchemy（orm）與 sqlite3（raw）（SQL 執行事件）
+  - 執行緒池使用中、上限與等待中的工作數（抓取時讀取）
+  - 事件迴圈延遲與阻塞次數、執行緒池等待時間（app.core.loop_monitor 背景工作）
+  - 各路由的回應壓縮統計（compression_stats）
+"""
+import bisect
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+from anyio import to_thread
+from app.core.compression import compression_stats
+from app.core.route_names import route_template
+from app.core.sql_events import add_statement_listener
+from common.utils import get_logger
+
+logger = get_logger(__name__)
+
+# 是否收集指標
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() != "false"
+
+# 設定後 /metrics 需要帶 Authorization: Bearer <METRICS_TOKEN>
+METRICS_TOKEN = os.getenv("METRICS_TOKEN", "")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# SQL 語句分類
+SQL_OPERATIONS = ("SELECT", "INSERT", "UPDATE", "DELETE", "PRAGMA", "BEGIN", "COMMIT", "ROLLBACK")
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    """跳脫標籤值"""
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    """組成 {name="value",...}"""
+    parts = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    """輸出數值（整數不帶小數點）"""
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Metric:
+    """指標的共同部分"""
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class _ValueMetric(_Metric):
+    """每組標籤一個數值的指標（數值可由程式更新，或在抓取時由 callback 取得）"""
+
+    def __init__(
+        self, name: str, documentation: str, labelnames: Sequence[str] = (),
+        callback: Optional[Callable[[], Iterable[Tuple[LabelValues, float]]]] = None
+    ):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._callback = callback
+
+    def render(self) -> List[str]:
+        if self._callback is not None:
+            items = sorted(self._callback())
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+            for labels, value in items
+        ]
+
+
+class Counter(_ValueMetric):
+    """只會增加的計數"""
+
+    type_name = "counter"
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+
+class Gauge(_ValueMetric):
+    """目前的數值"""
+
+    type_name = "gauge"
+
+    def set(self, *labels: str, value: float) -> None:
+        with self._lock:
+            self._values[labels] = value
+
+
+class Histogram(_Metric):
+    """數值分布（累積 bucket、總和與次數）"""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = REQUEST_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # labels -> [各 bucket 的次數（非累積，最後一格為 +Inf）, 總和, 次數]
+        self._values: Dict[LabelValues, list] = {}
+
+    def observe(self, *labels: str, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(labels)
+            if entry is None:
+                entry = self._values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((labels, (list(counts), total, count)) for labels, (counts, total, count) in self._values.items())
+        lines = self.header()
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """指標集合"""
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> bytes:
+        """以 Prometheus 文字格式輸出全部指標"""
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                logger.error(f"輸出指標 {metric.name} 失敗: {str(e)}", exc_info=True)
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+
+registry = MetricsRegistry()
+
+http_requests = registry.register(Counter(
+    "http_requests_total", "HTTP requests by route and status code", ("method", "route", "status")
+))
+http_request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency in seconds", ("method", "route"), REQUEST_BUCKETS
+))
+http_requests_in_progress = registry.register(Gauge(
+    "http_requests_in_progress", "HTTP requests currently being handled"
+))
+sql_statements = registry.register(Counter(
+    "db_statements_total", "SQL statements executed", ("source", "operation")
+))
+sql_duration = registry.register(Histogram(
+    "db_statement_duration_seconds", "SQL statement execution time in seconds", ("source", "operation"), SQL_BUCKETS
+))
+event_loop_lag = registry.register(Histogram(
+    "event_loop_lag_seconds", "Delay of event loop wake-ups beyond the scheduled time", (), LAG_BUCKETS
+))
+event_loop_lag_last = registry.register(Gauge(
+    "event_loop_lag_last_seconds", "Most recent event loop lag measurement"
+))
+event_loop_blocked = registry.register(Counter(
+    "event_loop_blocked_total", "Times the event loop was blocked longer than the threshold"
+))
+threadpool_wait = registry.register(Histogram(
+    "threadpool_wait_seconds", "Time a probe task waited for a worker thread", (), WAIT_BUCKETS
+))
+threadpool_wait_last = registry.register(Gauge(
+    "threadpool_wait_last_seconds", "Most recent worker thread wait measurement"
+))
+
+
+# 執行緒池狀態（只能在事件迴圈中讀取，由 render_metrics 先更新）
+_threadpool_snapshot: Dict[str, float] = {}
+
+
+def _threadpool_values() -> List[Tuple[LabelValues, float]]:
+    return [((state,), value) for state, value in _threadpool_snapshot.items()]
+
+registry.register(Gauge(
+    "threadpool_tasks", "Worker threadpool usage: busy threads, limit and tasks waiting for a thread",
+    ("state",), callback=_threadpool_values
+))
+
+
+def _compression_values(key: str) -> Callable[[], List[Tuple[LabelValues, float]]]:
+    """壓縮統計中的某個欄位"""
+    def values():
+        return [(tuple(route.split(" ", 1)), entry[key]) for route, entry in compression_stats.snapshot().items()]
+    return values
+
+
+registry.register(Counter(
+    "http_compression_input_bytes_total", "Response bytes before compression", ("method", "route"),
+    callback=_compression_values("bytes_in")
+))
+registry.register(Counter(
+    "http_compression_output_bytes_total", "Response bytes after compression", ("method", "route"),
+    callback=_compression_values("bytes_out")
+))
+registry.register(Counter(
+    "http_compression_cpu_seconds_total", "CPU time spent compressing responses", ("method", "route"),
+    callback=_compression_values("cpu_seconds")
+))
+
+
+def sql_operation(statement: str) -> str:
+    """取得 SQL 語句的類型（SELECT、INSERT 等）"""
+    keyword = statement.lstrip(" \t\r\n(").split(None, 1)[0].upper() if statement.strip() else ""
+    if keyword == "WITH":
+        return "SELECT"
+    return keyword if keyword in SQL_OPERATIONS else "OTHER"
+
+
+def record_statement(statement: str, parameters, duration: float, source: str) -> None:
+    """SQL 執行事件的 listener"""
+    operation = sql_operation(statement)
+    sql_statements.inc(source, operation)
+    sql_duration.observe(source, operation, value=duration)
+
+
+def update_threadpool_snapshot() -> None:
+    """讀取 anyio 預設執行緒池的使用狀態（在事件迴圈中呼叫）"""
+    limiter = to_thread.current_default_thread_limiter()
+    statistics = limiter.statistics()
+    _threadpool_snapshot.update(
+        busy=statistics.borrowed_tokens,
+        limit=statistics.total_tokens,
+        waiting=statistics.tasks_waiting,
+    )
+
+
+async def render_metrics() -> bytes:
+    """輸出 /metrics 的內容"""
+    try:
+        update_threadpool_snapshot()
+    except Exception as e:
+        logger.error(f"讀取執行緒池狀態失敗: {str(e)}", exc_info=True)
+    return registry.render()
+
+
+class MetricsMiddleware:
+    """記錄每個請求的路由、狀態碼與延遲"""
+
+    def __init__(self, app):
+        self.app = app
+        self._in_progress = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not METRICS_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status_code = 500
+        self._in_progress += 1
+        http_requests_in_progress.set(value=self._in_progress)
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self._in_progress -= 1
+            http_requests_in_progress.set(value=self._in_progress)
+            route = route_template(scope)
+            http_requests.inc(scope["method"], route, str(status_code))
+            http_request_duration.observe(scope["method"], route, value=time.perf_counter() - started)
+
+
+def setup_metrics() -> None:
+    """註冊 SQL 執行事件的 listener"""
+    if METRICS_ENABLED:
+        add_statement_listener(record_statement)
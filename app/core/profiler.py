@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+"""
+按需的請求取樣分析（flame graph）
+
+符合條件的請求在執行期間，由背景執行緒每隔 PROFILE_INTERVAL 秒以
+sys._current_frames() 取樣呼叫堆疊，結束後以 collapsed stack 格式
+（每行「frame;frame;... 次數」，speedscope 與 flamegraph.pl 都能直接開啟）
+寫入 PROFILE_DIR，只保留最新的 PROFILE_MAX_FILES 個檔案。
+
+觸發條件：
+  - 依 PROFILE_SAMPLE_RATE 隨機抽樣（可用 PROFILE_ROUTES 限定路徑前綴）
+  - 請求帶有 X-Profile-Token: <管理用 token>（python -m app.core.profiler token 產生）
+
+取樣範圍：事件迴圈執行緒（async 路由與 middleware），以及正在執行此路由
+函式的工作執行緒（同步路由）。事件迴圈同時處理其他請求，
+取樣結果可能包含並行請求的堆疊，第一層以 loop / worker 區分。
+同時間最多分析 PROFILE_MAX_CONCURRENT 個請求，限制額外負擔。
+"""
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+from anyio import to_thread
+from fastapi import APIRouter, Header
+from fastapi.responses import Response
+from app.core.route_names import route_template
+from app.core.security import create_access_token, verify_token
+from common.utils import get_logger
+
+logger = get_logger(__name__)
+
+# 隨機分析的請求比例（0 表示只分析帶有管理 token 的請求）
+PROFILE_SAMPLE_RATE = float(os.getenv("PROFILE_SAMPLE_RATE", 0))
+
+# 隨機分析只套用在這些路徑前綴（逗號分隔，空白表示全部）
+PROFILE_ROUTES = tuple(route for route in os.getenv("PROFILE_ROUTES", "").split(",") if route)
+
+# 取樣間隔（秒）
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", 0.005))
+
+# 結果存放目錄與保留的檔案數
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_MAX_FILES = int(os.getenv("PROFILE_MAX_FILES", 50))
+
+# 同時分析的請求數上限
+PROFILE_MAX_CONCURRENT = int(os.getenv("PROFILE_MAX_CONCURRENT", 2))
+
+# 管理用 token 的 scope
+PROFILER_SCOPE = "profiler"
+
+PROFILE_HEADER = b"x-profile-token"
+
+# 結果檔名（下載時只接受此格式，避免路徑穿越）
+PROFILE_NAME_PATTERN = re.compile(r"^[0-9]{8}-[0-9]{6}-[0-9]{6}_[A-Z]+_[A-Za-z0-9_.{}-]*_[0-9]+ms\.collapsed$")
+
+# 專案根目錄（堆疊中的檔名以相對路徑顯示）
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))).replace("\\", "/") + "/"
+
+# 堆疊中不需要顯示的底層框架（執行緒啟動、事件迴圈排程）
+_SKIPPED_FILES = ("threading.py", "asyncio/events.py", "asyncio/base_events.py", "asyncio/runners.py")
+
+
+def create_profiler_token(hours: int = 24) -> str:
+    """產生管理用 token（觸發分析與下載結果）"""
+    return create_access_token({"scope": PROFILER_SCOPE}, timedelta(hours=hours))
+
+
+def is_profiler_token(token: Optional[str]) -> bool:
+    """是否為有效的管理用 token"""
+    if not token:
+        return False
+    payload = verify_token(token)
+    return bool(payload) and payload.get("scope") == PROFILER_SCOPE
+
+
+def _frame_label(frame) -> str:
+    """堆疊框架的名稱：函式 (模組:行號)"""
+    code = frame.f_code
+    filename = code.co_filename.replace("\\", "/")
+    if filename.startswith(ROOT):
+        filename = filename[len(ROOT):]
+    else:
+        for marker in ("/site-packages/", "/lib/python"):
+            if marker in filename:
+                filename = filename.split(marker, 1)[1]
+                break
+    return f"{code.co_name} ({filename}:{frame.f_lineno})".replace(";", ":")
+
+
+def _collapse(frame, root: str) -> str:
+    """將堆疊轉成 collapsed 格式（外層在前）"""
+    labels = []
+    while frame is not None:
+        if not frame.f_code.co_filename.replace("\\", "/").endswith(_SKIPPED_FILES):
+            labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.append(root)
+    return ";".join(reversed(labels))
+
+
+def _contains_code(frame, code) -> bool:
+    """堆疊中是否有執行指定函式"""
+    while frame is not None:
+        if frame.f_code is code:
+            return True
+        frame = frame.f_back
+    return False
+
+
+class RequestSampler:
+    """分析單一請求的取樣執行緒"""
+
+    def __init__(self, scope, interval: float = PROFILE_INTERVAL):
+        self.scope = scope
+        self.interval = interval
+        self.loop_thread_id = threading.get_ident()
+        self.samples: Counter = Counter()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="request-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stopped.wait(self.interval):
+            # 路由比對後才知道路由函式，同步路由在工作執行緒中執行
+            endpoint_code = getattr(self.scope.get("endpoint"), "__code__", None)
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.loop_thread_id:
+                    # 事件迴圈等待 I/O 時只記為 idle
+                    idle = frame.f_code.co_filename.endswith("selectors.py")
+                    self.samples["loop;idle" if idle else _collapse(frame, "loop")] += 1
+                elif thread_id != own_id and endpoint_code is not None and _contains_code(frame, endpoint_code):
+                    self.samples[_collapse(frame, "worker")] += 1
+
+
+class ProfileStore:
+    """存放分析結果的目錄（超過上限時刪除最舊的檔案）"""
+
+    def __init__(self, directory: str = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES):
+        self.directory = directory
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def save(self, method: str, route: str, duration: float, samples: Counter) -> Optional[str]:
+        """
+        寫入一次分析結果
+
+        Args:
+            method: HTTP 方法
+            route: 路徑樣板
+            duration: 請求耗時（秒）
+            samples: collapsed stack 與取樣次數
+
+        Returns:
+            檔名，沒有取樣結果或寫入失敗時回傳 None
+        """
+        if not samples:
+            return None
+        safe_route = re.sub(r"[^A-Za-z0-9_.{}-]", "_", route.strip("/")) or "root"
+        name = f"{datetime.now():%Y%m%d-%H%M%S-%f}_{method}_{safe_route}_{int(duration * 1000)}ms.collapsed"
+        content = "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+        try:
+            with self._lock:
+                os.makedirs(self.directory, exist_ok=True)
+                with open(os.path.join(self.directory, name), "w", encoding="utf-8") as f:
+                    f.write(content)
+                self._trim()
+            return name
+        except OSError as e:
+            logger.error(f"寫入分析結果失敗: {str(e)}", exc_info=True)
+            return None
+
+    def _trim(self) -> None:
+        """只保留最新的 max_files 個檔案（檔名以時間開頭，依名稱排序即為時間順序）"""
+        names = sorted(self._names())
+        for name in names[:max(0, len(names) - self.max_files)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+
+    def _names(self) -> List[str]:
+        if not os.path.isdir(self.directory):
+            return []
+        return [name for name in os.listdir(self.directory) if PROFILE_NAME_PATTERN.match(name)]
+
+    def list(self) -> List[Dict]:
+        """列出分析結果（新的在前）"""
+        result = []
+        for name in sorted(self._names(), reverse=True):
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            result.append({
+                "name": name,
+                "size": stat.st_size,
+                "created_at": datetime.fromtimestamp(stat.st_mtime).strftime("%Y-%m-%d %H:%M:%S"),
+            })
+        return result
+
+    def read(self, name: str) -> Optional[bytes]:
+        """讀取分析結果，檔名不合法或不存在時回傳 None"""
+        if not PROFILE_NAME_PATTERN.match(name):
+            return None
+        try:
+            with open(os.path.join(self.directory, name), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+
+profile_store = ProfileStore()
+
+
+class ProfilerMiddleware:
+    """對抽樣或帶有管理 token 的請求進行取樣分析"""
+
+    def __init__(self, app, store: ProfileStore = profile_store):
+        self.app = app
+        self.store = store
+        self._active = 0
+
+    def _should_profile(self, scope) -> bool:
+        token = dict(scope["headers"]).get(PROFILE_HEADER)
+        if token is not None:
+            return is_profiler_token(token.decode("latin-1"))
+        if PROFILE_SAMPLE_RATE <= 0 or random.random() >= PROFILE_SAMPLE_RATE:
+            return False
+        return not PROFILE_ROUTES or scope["path"].startswith(PROFILE_ROUTES)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self._active >= PROFILE_MAX_CONCURRENT or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        self._active += 1
+        sampler = RequestSampler(scope)
+        started = time.perf_counter()
+        sampler.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            sampler.stop()
+            self._active -= 1
+            duration = time.perf_counter() - started
+            await to_thread.run_sync(
+                self.store.save, scope["method"], route_template(scope), duration, sampler.samples
+            )
+
+
+router = APIRouter()
+
+
+@router.get("/profiles")
+async def list_profiles(authorization: Optional[str] = Header(None)):
+    """列出分析結果（需要管理用 token）"""
+    token = authorization[7:] if authorization and authorization.startswith("Bearer ") else None
+    if not is_profiler_token(token):
+        return {"status": "1", "message": "未授權"}
+    profiles = await to_thread.run_sync(profile_store.list)
+    return {"status": "0", "message": "ok", "profiles": profiles}
+
+
+@router.get("/profiles/{name}")
+async def download_profile(name: str, authorization: Optional[str] = Header(None)):
+    """下載分析結果（collapsed stack 文字檔）"""
+    token = authorization[7:] if authorization and authorization.startswith("Bearer ") else None
+    if not is_profiler_token(token):
+        return {"status": "1", "message": "未授權"}
+    content = await to_thread.run_sync(profile_store.read, name)
+    if content is None:
+        return {"status": "1", "message": "找不到分析結果"}
+    return Response(
+        content=content, media_type="text/plain; charset=utf-8",
+        headers={"content-disposition": f'attachment; filename="{name}"'}
+    )
+
+
+if __name__ == "__main__":
+    # python -m app.core.profiler token [小時]
+    if len(sys.argv) >= 2 and sys.argv[1] == "token":
+        print(create_profiler_token(int(sys.argv[2]) if len(sys.argv) >= 3 else 24))
+    else:
+        print("用法: python -m app.core.profiler token [有效小時數]")
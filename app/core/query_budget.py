@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+"""
+每個請求的 SQL 語句預算（N+1 查詢偵測）
+
+請求期間以 ContextVar 保存計數（同步路由在工作執行緒中執行時也會複製 context），
+SQL 執行事件的 listener 依正規化 SQL 的 fingerprint 累計語句數。
+回應開始送出時檢查：
+  - 語句總數超過路由的預算
+  - 同一個 fingerprint（只有參數值不同的語句）執行超過允許的次數，
+    通常是迴圈中逐筆查詢（N+1）
+
+路由以 @query_budget(statements=..., repeats=...) 宣告自己的預算，
+沒有宣告的路由使用 QUERY_BUDGET_STATEMENTS / QUERY_BUDGET_REPEATS。
+
+QUERY_BUDGET_MODE：
+  - off（預設）：不計數，正式環境沒有額外負擔
+  - warn：超過時寫入 warning log（staging）
+  - error：超過時引發 QueryBudgetExceeded，請求回傳 status "1"，
+    TestClient 與測試腳本會失敗（測試環境）
+warn 與 error 模式的回應帶有 X-Query-Count 標頭。
+
+回應開始送出之後（StreamingResponse 的內容、背景工作）執行的語句不檢查。
+"""
+import os
+from collections import Counter
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+from starlette.datastructures import MutableHeaders
+from app.core.route_names import route_name
+from app.core.slow_queries import fingerprint, normalize_sql
+from app.core.sql_events import add_statement_listener
+from common.utils import get_logger
+
+logger = get_logger(__name__)
+
+MODE_OFF = "off"
+MODE_WARN = "warn"
+MODE_ERROR = "error"
+
+# off / warn / error
+QUERY_BUDGET_MODE = os.getenv("QUERY_BUDGET_MODE", MODE_OFF).lower()
+
+# 沒有宣告預算的路由：每個請求最多的語句數，以及同一語句最多執行的次數
+QUERY_BUDGET_STATEMENTS = int(os.getenv("QUERY_BUDGET_STATEMENTS", 30))
+QUERY_BUDGET_REPEATS = int(os.getenv("QUERY_BUDGET_REPEATS", 5))
+
+QUERY_COUNT_HEADER = "x-query-count"
+
+# 路由函式上保存預算的屬性名稱
+_BUDGET_ATTRIBUTE = "__query_budget__"
+
+
+class QueryBudgetExceeded(Exception):
+    """請求的 SQL 語句超過預算（QUERY_BUDGET_MODE=error）"""
+
+
+class QueryBudget:
+    """路由的 SQL 語句預算"""
+
+    def __init__(self, statements: int = QUERY_BUDGET_STATEMENTS, repeats: int = QUERY_BUDGET_REPEATS):
+        self.statements = statements
+        self.repeats = repeats
+
+
+DEFAULT_BUDGET = QueryBudget()
+
+
+def query_budget(statements: Optional[int] = None, repeats: Optional[int] = None) -> Callable:
+    """
+    宣告路由的 SQL 語句預算（放在 @router.get 等裝飾器下方）
+
+    Args:
+        statements: 每個請求最多的語句數，None 使用預設值
+        repeats: 同一語句最多執行的次數，None 使用預設值
+
+    Returns:
+        裝飾器（不改變路由函式本身）
+    """
+    budget = QueryBudget(
+        QUERY_BUDGET_STATEMENTS if statements is None else statements,
+        QUERY_BUDGET_REPEATS if repeats is None else repeats,
+    )
+
+    def decorator(func):
+        setattr(func, _BUDGET_ATTRIBUTE, budget)
+        return func
+    return decorator
+
+
+class RequestQueries:
+    """一個請求執行的 SQL 語句"""
+
+    def __init__(self):
+        self.total = 0
+        self.counts: Counter = Counter()
+        self.statements: Dict[str, str] = {}
+
+    def add(self, statement: str) -> None:
+        normalized = normalize_sql(statement)
+        key = fingerprint(normalized)
+        self.total += 1
+        self.counts[key] += 1
+        self.statements.setdefault(key, normalized)
+
+    def violations(self, budget: QueryBudget) -> List[str]:
+        """
+        檢查是否超過預算
+
+        Args:
+            budget: 路由的預算
+
+        Returns:
+            超過預算的說明，沒有超過時為空列表
+        """
+        result = []
+        if self.total > budget.statements:
+            result.append(f"執行 {self.total} 個語句，預算 {budget.statements}")
+        for key, count in self.counts.most_common():
+            if count <= budget.repeats:
+                break
+            result.append(f"同一語句執行 {count} 次（上限 {budget.repeats}）: {self.statements[key]}")
+        return result
+
+
+_current_queries: ContextVar[Optional[RequestQueries]] = ContextVar("request_queries", default=None)
+
+
+def record_statement(statement: str, parameters, duration: float, source: str) -> None:
+    """SQL 執行事件的 listener：計入目前請求"""
+    queries = _current_queries.get()
+    if queries is not None:
+        queries.add(statement)
+
+
+def budget_for(scope) -> QueryBudget:
+    """取得路由宣告的預算（沒有宣告時使用預設值）"""
+    return getattr(scope.get("endpoint"), _BUDGET_ATTRIBUTE, DEFAULT_BUDGET)
+
+
+class QueryBudgetMiddleware:
+    """計算每個請求的 SQL 語句數，超過預算時警告或引發錯誤"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or QUERY_BUDGET_MODE not in (MODE_WARN, MODE_ERROR):
+            await self.app(scope, receive, send)
+            return
+
+        queries = RequestQueries()
+        token = _current_queries.set(queries)
+
+        async def send_with_check(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)[QUERY_COUNT_HEADER] = str(queries.total)
+                violations = queries.violations(budget_for(scope))
+                if violations:
+                    description = f"{route_name(scope)} 超過 SQL 語句預算: " + "; ".join(violations)
+                    if QUERY_BUDGET_MODE == MODE_ERROR:
+                        raise QueryBudgetExceeded(description)
+                    logger.warning(description)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_check)
+        finally:
+            _current_queries.reset(token)
+
+
+def setup_query_budget() -> None:
+    """註冊 SQL 執行事件的 listener"""
+    if QUERY_BUDGET_MODE in (MODE_WARN, MODE_ERROR):
+        add_statement_listener(record_statement)
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+登入、驗證碼、忘記密碼與好友邀請的頻率限制（token bucket）
+
+這些 API 呼叫成本低、處理成本高（寄信、寫入資料庫），六位數驗證碼也可以被逐一嘗試。
+每個路由依用戶（token 的 user_id）、email（請求內容）與 IP 各自計算：
+桶子容量為允許的突發次數，依「容量 / 期間」的速率補充，取用時才依經過時間補充（lazy refill）。
+
+儲存方式（RATE_LIMIT_BACKEND）：
+  - memory（預設）：各 worker 記憶體中的 LRU，最多 RATE_LIMIT_MAX_KEYS 個 key
+  - sqlite：獨立的 SQLite 檔案（RATE_LIMIT_DB），多個 worker 共用同一份限制；
+    不放在主資料庫，避免與一般寫入互相等待。定期刪除已補滿的 key（補滿等同不存在）
+
+超過限制時以 HTTPException(429) 中止，由全域例外處理回傳 {"status": "1", "message": ...}，
+並帶 Retry-After 標頭。
+
+使用方式：@router.post(..., dependencies=[Depends(rate_limit("auth"))])
+"""
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+from anyio import to_thread
+from fastapi import HTTPException, Request
+from app.core.security import verify_token
+from common.utils import get_logger
+
+logger = get_logger(__name__)
+
+# 是否啟用
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() != "false"
+
+# memory 或 sqlite
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+
+# sqlite 儲存的檔案
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB", "rate_limit.db")
+
+# memory 儲存最多保留的 key 數（超過時淘汰最久沒有使用的）
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", 100000))
+
+# 在反向代理之後時，以 X-Forwarded-For 的第一個位址作為用戶端 IP
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "false").lower() == "true"
+
+# sqlite 儲存每隔多少次呼叫清除一次已補滿的 key
+PURGE_EVERY = 1000
+
+KEY_USER = "user"
+KEY_EMAIL = "email"
+KEY_IP = "ip"
+
+RATE_LIMITED_MESSAGE = "請求過於頻繁，請稍後再試"
+
+# 路由: [(key 類型, 容量, 期間秒數), ...]
+RATE_LIMIT_RULES: Dict[str, List[Tuple[str, int, float]]] = {
+    "auth": [(KEY_EMAIL, 10, 300), (KEY_IP, 30, 300)],
+    "verification_send": [(KEY_EMAIL, 3, 600), (KEY_IP, 10, 600)],
+    "verification_check": [(KEY_EMAIL, 5, 600), (KEY_IP, 30, 600)],
+    "password_forgot": [(KEY_EMAIL, 3, 3600), (KEY_IP, 10, 3600)],
+    "friend_send": [(KEY_USER, 20, 3600), (KEY_IP, 60, 3600)],
+}
+
+
+class MemoryBuckets:
+    """各 worker 記憶體中的 token bucket（LRU，限制 key 數）"""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        # key -> (剩餘 token, 上次更新時間)
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+
+    def take(self, key: str, capacity: int, rate: float) -> float:
+        """
+        取用一個 token
+
+        Args:
+            key: 限制對象
+            capacity: 桶子容量
+            rate: 每秒補充的 token 數
+
+        Returns:
+            0 表示允許，否則為需要等待的秒數
+        """
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (float(capacity), now))
+            tokens = min(float(capacity), tokens + (now - updated) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class SQLiteBuckets:
+    """多個 worker 共用的 token bucket（獨立的 SQLite 檔案）"""
+
+    def __init__(self, path: str = RATE_LIMIT_DB):
+        self.path = path
+        self._local = threading.local()
+        self._calls = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        """每個執行緒一條連線（autocommit，交易自行控制）"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+                "key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL, full_at REAL NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, capacity: int, rate: float) -> float:
+        """同 MemoryBuckets.take，以 BEGIN IMMEDIATE 讓讀取與更新不被其他 worker 插入"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)).fetchone()
+            tokens = float(capacity) if row is None else min(float(capacity), row[0] + (now - row[1]) * rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / rate
+            if not wait:
+                tokens -= 1
+            conn.execute(
+                "INSERT INTO rate_limit_buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, "
+                "updated_at = excluded.updated_at, full_at = excluded.full_at",
+                (key, tokens, now, now + (capacity - tokens) / rate)
+            )
+            self._calls += 1
+            if self._calls % PURGE_EVERY == 0:
+                conn.execute("DELETE FROM rate_limit_buckets WHERE full_at <= ?", (now,))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+
+def create_buckets():
+    """依 RATE_LIMIT_BACKEND 建立儲存"""
+    if RATE_LIMIT_BACKEND == "sqlite":
+        return SQLiteBuckets()
+    return MemoryBuckets()
+
+
+buckets = create_buckets()
+
+
+def client_ip(request: Request) -> str:
+    """用戶端 IP（RATE_LIMIT_TRUST_PROXY 時使用 X-Forwarded-For）"""
+    if RATE_LIMIT_TRUST_PROXY:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def token_user_id(request: Request) -> Optional[str]:
+    """Authorization 中 token 的 user_id，沒有或無效時回傳 None"""
+    authorization = request.headers.get("authorization", "")
+    if not authorization.startswith("Bearer "):
+        return None
+    payload = verify_token(authorization[7:])
+    return str(payload["sub"]) if payload and payload.get("sub") is not None else None
+
+
+async def request_email(request: Request) -> Optional[str]:
+    """請求內容中的 email（小寫），沒有或無法解析時回傳 None"""
+    try:
+        body = await request.json()
+    except Exception:
+        return None
+    email = body.get("email") if isinstance(body, dict) else None
+    return email.strip().lower() if isinstance(email, str) and email.strip() else None
+
+
+def check_limits(route: str, identities: Dict[str, Optional[str]]) -> float:
+    """
+    依路由的規則取用 token
+
+    Args:
+        route: 規則名稱
+        identities: {key 類型: 值}，值為 None 的類型略過
+
+    Returns:
+        0 表示允許，否則為最長需要等待的秒數
+    """
+    wait = 0.0
+    for kind, capacity, period in RATE_LIMIT_RULES[route]:
+        identity = identities.get(kind)
+        if identity is None:
+            continue
+        wait = max(wait, buckets.take(f"{route}:{kind}:{identity}", capacity, capacity / period))
+    return wait
+
+
+def rate_limit(route: str) -> Callable:
+    """
+    建立頻率限制的 dependency
+
+    Args:
+        route: RATE_LIMIT_RULES 中的規則名稱
+
+    Returns:
+        FastAPI dependency，超過限制時引發 HTTPException(429)
+    """
+    kinds = {kind for kind, _, _ in RATE_LIMIT_RULES[route]}
+
+    async def dependency(request: Request) -> None:
+        if not RATE_LIMIT_ENABLED:
+            return
+        identities = {KEY_IP: client_ip(request)}
+        if KEY_EMAIL in kinds:
+            identities[KEY_EMAIL] = await request_email(request)
+        if KEY_USER in kinds:
+            identities[KEY_USER] = token_user_id(request)
+
+        try:
+            if isinstance(buckets, SQLiteBuckets):
+                wait = await to_thread.run_sync(check_limits, route, identities)
+            else:
+                wait = check_limits(route, identities)
+        except Exception as e:
+            # 限制無法運作時不阻擋正常請求
+            logger.error(f"頻率限制檢查失敗: {str(e)}", exc_info=True)
+            return
+
+        if wait:
+            logger.warning("頻率限制 %s: ip=%s 需等待 %.0f 秒", route, identities[KEY_IP], wait)
+            raise HTTPException(
+                status_code=429, detail=RATE_LIMITED_MESSAGE,
+                headers={"Retry-After": str(math.ceil(wait))}
+            )
+
+    return dependency
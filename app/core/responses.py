@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+"""
+JSON 回應的序列化
+
+有 response_model 的路由由 FastAPI 交給 Pydantic（Rust 核心）直接輸出 JSON，
+其餘路徑（例外處理、回傳 dict 的路由、預先序列化的快取回應）使用 dump_json：
+有安裝 orjson 時使用 orjson，否則退回標準函式庫 json，兩者輸出格式相同
+（UTF-8、不跳脫非 ASCII 字元、沒有多餘空白）。
+
+列表類的回應（日記、糖化血色素、好友等）由模組直接組成與回應模型欄位、
+型別相同的 dict，以 trusted_response 輸出，不再逐筆建立 Pydantic 模型。
+Pydantic v2 的 model_construct 在 Python 中逐欄位設定，實測比 Rust 核心的驗證還慢，
+因此快速路徑不建立模型；路由上的 response_model 仍保留作為 API 文件。
+"""
+import json
+from typing import Any
+from fastapi.responses import JSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # orjson 為選用套件
+    orjson = None
+
+
+def dump_json(content: Any) -> bytes:
+    """
+    將內容序列化為 JSON
+
+    Args:
+        content: 可序列化的內容（dict、list 等）
+
+    Returns:
+        UTF-8 編碼的 JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class DefaultJSONResponse(JSONResponse):
+    """全站預設的 JSON 回應類別（使用 dump_json）"""
+
+    def render(self, content: Any) -> bytes:
+        return dump_json(content)
+
+
+def trusted_response(content: Any) -> Response:
+    """
+    直接輸出已確定格式的回應內容，跳過 response_model 的驗證與轉換
+
+    只用於由資料庫讀出、欄位順序與型別已符合回應模型的資料。
+
+    Args:
+        content: 回應內容
+
+    Returns:
+        JSON 回應
+    """
+    return Response(content=dump_json(content), media_type="application/json")
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+ASGI scope 的路由名稱（用於各路由的統計）
+
+路由比對後 FastAPI 會把 APIRoute 寫入 scope["route"]，但 include_router 的
+前綴不在 route.path 中，因此以實際路徑把路徑參數的值換回 {名稱}。
+沒有比對到路由的請求（404、掃描）一律歸為 unmatched，避免統計項目無限增加。
+"""
+from typing import Any, MutableMapping
+
+UNMATCHED = "unmatched"
+
+
+def route_template(scope: MutableMapping[str, Any]) -> str:
+    """
+    取得請求的路徑樣板
+
+    Args:
+        scope: ASGI scope（路由執行後）
+
+    Returns:
+        例如 /api/friend/{invite_id}/accept；沒有比對到路由時回傳 unmatched
+    """
+    if scope.get("route") is None:
+        return UNMATCHED
+    path = scope["path"]
+    path_params = scope.get("path_params")
+    if not path_params:
+        return path
+    names = {str(value): name for name, value in path_params.items()}
+    return "/".join(
+        f"{{{names[segment]}}}" if segment in names else segment
+        for segment in path.split("/")
+    )
+
+
+def route_name(scope: MutableMapping[str, Any]) -> str:
+    """取得「方法 路徑樣板」，例如 GET /api/user/a1c"""
+    return f'{scope["method"]} {route_template(scope)}'
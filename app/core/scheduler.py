@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+"""
+程序內的背景任務排程器
+
+支援固定間隔或 cron 表達式、隨機延遲 (jitter)、單次執行逾時、
+執行統計，以及透過租約鎖讓多個 worker 中只有一個執行同一個任務。
+
+逾時只是提示：Python 線程無法強制中止，超過時限只寫入 warning 並計數，
+任務會繼續執行到結束。
+
+租約的長度依執行時間而定（逾時 + LEASE_GRACE_SECONDS），執行期間每
+LEASE_RENEW_SECONDS 秒續約一次；結束後只再保留 jitter + LEASE_GRACE_SECONDS 秒，
+擋住其他 worker 在同一個排程時間（jitter 範圍內）重複執行。
+排程器停止時釋放自己持有的租約，重新啟動的 worker（PID 不同）不會因為舊租約而略過下一次執行。
+"""
+import random
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Set
+from app.core.lease import acquire_lease, release_lease
+from common.utils import get_logger, get_taiwan_time
+
+logger = get_logger(__name__)
+
+# 租約額外保留的秒數，執行中的任務才能在租約到期前續約
+LEASE_GRACE_SECONDS = 30
+
+# 任務執行期間續約的間隔秒數（需小於 LEASE_GRACE_SECONDS）
+LEASE_RENEW_SECONDS = 10
+
+
+class CronSchedule:
+    """
+    五欄位 cron 表達式：分 時 日 月 週
+
+    每個欄位支援 *、*/n、a-b、a-b/n 與逗號分隔的清單，週日為 0。
+    """
+
+    FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 6)]
+
+    def __init__(self, expression: str):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"cron 表達式需要 5 個欄位: {expression}")
+
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = [
+            self._parse_field(field, low, high)
+            for field, (low, high) in zip(fields, self.FIELD_RANGES)
+        ]
+        # 與標準 cron 相同：日與週都有限制時，符合其一即可
+        self.day_restricted = fields[2] != "*"
+        self.weekday_restricted = fields[4] != "*"
+
+    @staticmethod
+    def _parse_field(field: str, low: int, high: int) -> Set[int]:
+        """解析單一欄位為允許值的集合"""
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_str = part.split("/", 1)
+                step = int(step_str)
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start_str, end_str = part.split("-", 1)
+                start, end = int(start_str), int(end_str)
+            else:
+                start = int(part)
+                end = high if step > 1 else start
+            if start < low or end > high or start > end or step < 1:
+                raise ValueError(f"cron 欄位超出範圍: {field}")
+            values.update(range(start, end + 1, step))
+        return values
+
+    def _day_matches(self, dt: datetime) -> bool:
+        """檢查日期是否符合日/週欄位"""
+        weekday = (dt.weekday() + 1) % 7  # Python 週一為 0，cron 週日為 0
+        day_ok = dt.day in self.days
+        weekday_ok = weekday in self.weekdays
+        if self.day_restricted and self.weekday_restricted:
+            return day_ok or weekday_ok
+        return day_ok and weekday_ok
+
+    def next_after(self, dt: datetime) -> datetime:
+        """
+        計算 dt 之後第一個符合的時間點（精確到分鐘）
+
+        Args:
+            dt: 起始時間
+
+        Returns:
+            下一次執行時間
+        """
+        candidate = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        limit = candidate + timedelta(days=366 * 5)
+
+        while candidate < limit:
+            if candidate.month not in self.months:
+                # 跳到下個月的第一天
+                year = candidate.year + (candidate.month // 12)
+                month = candidate.month % 12 + 1
+                candidate = candidate.replace(year=year, month=month, day=1, hour=0, minute=0)
+                continue
+            if not self._day_matches(candidate):
+                candidate = (candidate + timedelta(days=1)).replace(hour=0, minute=0)
+                continue
+            if candidate.hour not in self.hours:
+                candidate = (candidate + timedelta(hours=1)).replace(minute=0)
+                continue
+            if candidate.minute not in self.minutes:
+                candidate += timedelta(minutes=1)
+                continue
+            return candidate
+
+        raise ValueError(f"cron 表達式沒有可執行的時間: {self.expression}")
+
+
+class Job:
+    """
+    排程任務
+
+    任務函式接收一個資料庫 session。設定 adaptive=True 的固定間隔任務，
+    其回傳的數字會作為下一次執行前的間隔秒數，可用來依工作量調整頻率。
+    """
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable,
+        interval: Optional[float] = None,
+        cron: Optional[str] = None,
+        jitter: float = 0,
+        timeout: Optional[float] = None,
+        single_runner: bool = True,
+        run_on_start: bool = False,
+        adaptive: bool = False
+    ):
+        if (interval is None) == (cron is None):
+            raise ValueError(f"任務 {name} 需要設定 interval 或 cron 其中之一")
+        if adaptive and cron:
+            raise ValueError(f"任務 {name} 使用 cron 時不能設定 adaptive")
+
+        self.name = name
+        self.func = func
+        self.interval = interval
+        self.cron = CronSchedule(cron) if cron else None
+        self.jitter = jitter
+        self.timeout = timeout
+        self.single_runner = single_runner
+        self.adaptive = adaptive
+
+        self.next_run_at = get_taiwan_time() if run_on_start else self._compute_next(get_taiwan_time())
+        self.running = False
+        self.timed_out = False
+        self.deadline: Optional[float] = None
+
+        # 執行統計
+        self.runs = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.skipped = 0
+        self.total_duration = 0.0
+        self.max_duration = 0.0
+        self.last_duration = 0.0
+        self.last_started_at: Optional[datetime] = None
+        self.last_error: Optional[str] = None
+
+    def _compute_next(self, now: datetime, delay: Optional[float] = None) -> datetime:
+        """計算下一次執行時間（含 jitter）"""
+        if self.cron:
+            next_run = self.cron.next_after(now)
+        else:
+            next_run = now + timedelta(seconds=delay if delay is not None else self.interval)
+        if self.jitter:
+            next_run += timedelta(seconds=random.uniform(0, self.jitter))
+        return next_run
+
+    def schedule_next(self, now: datetime, delay: Optional[float] = None) -> None:
+        """更新下一次執行時間"""
+        self.next_run_at = self._compute_next(now, delay)
+
+    def metrics(self) -> Dict:
+        """取得任務的執行統計"""
+        return {
+            "name": self.name,
+            "schedule": self.cron.expression if self.cron else f"every {self.interval}s",
+            "runs": self.runs,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "skipped": self.skipped,
+            "running": self.running,
+            "last_duration": round(self.last_duration, 4),
+            "avg_duration": round(self.total_duration / self.runs, 4) if self.runs else 0.0,
+            "max_duration": round(self.max_duration, 4),
+            "last_started_at": self.last_started_at.isoformat() if self.last_started_at else "",
+            "next_run_at": self.next_run_at.isoformat() if self.next_run_at else "",
+            "last_error": self.last_error or "",
+        }
+
+
+class Scheduler:
+    """背景任務排程器（單一排程線程，每次執行另開工作線程以便控制逾時）"""
+
+    def __init__(self, db_session_factory):
+        self.db_session_factory = db_session_factory
+        self.jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._workers: List[threading.Thread] = []
+
+    def add_job(self, name: str, func: Callable, **options) -> Job:
+        """
+        註冊任務
+
+        Args:
+            name: 任務名稱（同時作為租約名稱）
+            func: 任務函式，接收資料庫 session
+            **options: interval / cron / jitter / timeout / single_runner / run_on_start / adaptive
+
+        Returns:
+            建立的 Job
+        """
+        job = Job(name, func, **options)
+        with self._lock:
+            self.jobs[name] = job
+        self._wakeup.set()
+        return job
+
+    def start(self) -> None:
+        """啟動排程線程"""
+        if self._thread and self._thread.is_alive():
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run_loop, name="scheduler", daemon=True)
+        self._thread.start()
+        logger.info(f"背景排程器已啟動，共 {len(self.jobs)} 個任務")
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """
+        停止排程線程，等待執行中的任務結束（最多 timeout 秒），並釋放已結束任務的租約
+
+        Args:
+            timeout: 等待秒數
+        """
+        self._stopping.set()
+        self._wakeup.set()
+        deadline = time.monotonic() + timeout
+        if self._thread:
+            self._thread.join(max(0.0, deadline - time.monotonic()))
+        for worker in list(self._workers):
+            worker.join(max(0.0, deadline - time.monotonic()))
+        self._thread = None
+        self._release_leases()
+        logger.info("背景排程器已停止")
+
+    def _release_leases(self) -> None:
+        """釋放自己持有的租約（仍在執行的任務保留租約，避免其他 worker 重疊執行）"""
+        with self._lock:
+            jobs = [job for job in self.jobs.values() if job.single_runner and not job.running]
+        if not jobs:
+            return
+        db = self.db_session_factory()
+        try:
+            for job in jobs:
+                release_lease(db, f"job:{job.name}")
+        finally:
+            db.close()
+
+    def get_metrics(self) -> List[Dict]:
+        """取得所有任務的執行統計"""
+        with self._lock:
+            return [job.metrics() for job in self.jobs.values()]
+
+    def _run_loop(self) -> None:
+        """排程主迴圈：等到最近的任務到期，再執行所有到期任務"""
+        while not self._stopping.is_set():
+            now = get_taiwan_time()
+            with self._lock:
+                jobs = list(self.jobs.values())
+
+            self._check_timeouts(jobs)
+
+            due_jobs = [job for job in jobs if job.next_run_at <= now]
+            for job in due_jobs:
+                self._dispatch(job, now)
+
+            if due_jobs:
+                continue
+
+            wait_seconds = 60.0
+            if jobs:
+                wait_seconds = max(0.0, (min(job.next_run_at for job in jobs) - now).total_seconds())
+            deadlines = [job.deadline for job in jobs if job.running and job.deadline and not job.timed_out]
+            if deadlines:
+                wait_seconds = min(wait_seconds, max(0.0, min(deadlines) - time.monotonic()))
+            self._wakeup.wait(min(wait_seconds, 60.0))
+            self._wakeup.clear()
+
+    def _check_timeouts(self, jobs: List[Job]) -> None:
+        """記錄超過執行時限的任務（只警告，不中止）"""
+        now = time.monotonic()
+        for job in jobs:
+            if job.running and job.deadline and not job.timed_out and now >= job.deadline:
+                # Python 線程無法強制中止，只記錄並在結束前略過後續排程
+                job.timed_out = True
+                job.timeouts += 1
+                logger.warning(f"任務 {job.name} 超過 {job.timeout} 秒仍未完成")
+
+    def _dispatch(self, job: Job, now: datetime) -> None:
+        """檢查租約後，在工作線程中執行任務"""
+        job.schedule_next(now)
+
+        if job.running:
+            # 上一次執行尚未結束（可能已逾時），不重疊執行
+            job.skipped += 1
+            return
+
+        if job.single_runner:
+            db = self.db_session_factory()
+            try:
+                if not acquire_lease(db, f"job:{job.name}", self._run_lease_ttl(job)):
+                    job.skipped += 1
+                    return
+            finally:
+                db.close()
+
+        job.running = True
+        job.timed_out = False
+        job.deadline = time.monotonic() + job.timeout if job.timeout else None
+        worker = threading.Thread(target=self._execute, args=(job,), name=f"job-{job.name}", daemon=True)
+        self._workers = [w for w in self._workers if w.is_alive()] + [worker]
+        worker.start()
+
+    @staticmethod
+    def _run_lease_ttl(job: Job) -> int:
+        """執行期間的租約秒數：逾時時間 + LEASE_GRACE_SECONDS（期間持續續約）"""
+        return int((job.timeout or 0) + LEASE_GRACE_SECONDS)
+
+    @staticmethod
+    def _finished_lease_ttl(job: Job) -> int:
+        """結束後的租約秒數：涵蓋其他 worker 同一個排程時間的 jitter"""
+        return int(job.jitter + LEASE_GRACE_SECONDS)
+
+    def _renew_lease(self, job: Job, finished: threading.Event) -> None:
+        """續約線程：任務執行期間定期延長租約，直到 finished 被設定"""
+        while not finished.wait(LEASE_RENEW_SECONDS):
+            db = self.db_session_factory()
+            try:
+                if not acquire_lease(db, f"job:{job.name}", self._run_lease_ttl(job)):
+                    logger.warning(f"任務 {job.name} 續約失敗，租約可能已由其他 worker 取得")
+            finally:
+                db.close()
+
+    def _execute(self, job: Job) -> None:
+        """執行任務並更新統計（single_runner 的任務執行期間持續續約）"""
+        started = time.perf_counter()
+        job.last_started_at = get_taiwan_time()
+        finished = threading.Event()
+        if job.single_runner:
+            threading.Thread(
+                target=self._renew_lease, args=(job, finished), name=f"lease-{job.name}", daemon=True
+            ).start()
+        db = self.db_session_factory()
+        try:
+            result = job.func(db)
+            job.last_error = None
+            if job.adaptive and isinstance(result, (int, float)):
+                with self._lock:
+                    job.schedule_next(get_taiwan_time(), delay=result)
+        except Exception as e:
+            job.failures += 1
+            job.last_error = str(e)
+            logger.error(f"任務 {job.name} 執行失敗: {str(e)}", exc_info=True)
+            db.rollback()
+        finally:
+            finished.set()
+            if job.single_runner:
+                acquire_lease(db, f"job:{job.name}", self._finished_lease_ttl(job))
+            db.close()
+            duration = time.perf_counter() - started
+            job.runs += 1
+            job.last_duration = duration
+            job.total_duration += duration
+            job.max_duration = max(job.max_duration, duration)
+            job.running = False
+            self._wakeup.set()
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+慢查詢紀錄
+
+註冊 SQL 執行事件的 listener，SQLAlchemy 與 sqlite3（connect_raw）執行的語句
+超過 SLOW_QUERY_MS 時記錄：正規化後的 SQL、參數的型別、耗時、
+呼叫的模組與函式，以及 EXPLAIN QUERY PLAN 的結果（掃描整張表會顯示 SCAN）。
+
+相同結構的語句（只有參數值不同）以正規化 SQL 的雜湊值作為 fingerprint 彙總，
+EXPLAIN 每個 fingerprint 只執行一次，以另一條不經過事件的 sqlite3 連線執行。
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import sys
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional
+from anyio import to_thread
+from fastapi import APIRouter, Header
+from app.core.database import engine, RAW_DATABASE_PATH
+from app.core.profiler import is_profiler_token
+from app.core.sql_events import add_statement_listener, SOURCE_ORM
+from common.utils import get_logger
+
+logger = get_logger(__name__)
+
+# 超過此毫秒數的語句視為慢查詢（0 或負數表示停用）
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 50))
+
+# 最多彙總的 fingerprint 數，超過時淘汰最久沒有出現的
+SLOW_QUERY_MAX_FINGERPRINTS = int(os.getenv("SLOW_QUERY_MAX_FINGERPRINTS", 500))
+
+# 需要 EXPLAIN 的語句類型（INSERT ... VALUES 沒有查詢計畫可看）
+EXPLAIN_OPERATIONS = ("SELECT", "UPDATE", "DELETE", "WITH")
+
+# 專案根目錄（只把專案內的程式碼當作呼叫者）
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# 不當作呼叫者的檔案（資料庫連線與事件本身）
+_INTERNAL_FILES = tuple(
+    os.path.join(ROOT, "app", "core", name) for name in ("sql_events.py", "slow_queries.py", "database.py")
+)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_NAMED_PARAMETER = re.compile(r"[:@$][A-Za-z_]\w*")
+_IN_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """
+    正規化 SQL：常數與參數換成 ?，IN 列表合併成一個，空白合併
+
+    Args:
+        statement: SQL 語句
+
+    Returns:
+        正規化後的 SQL
+    """
+    normalized = _STRING_LITERAL.sub("?", statement)
+    normalized = _NAMED_PARAMETER.sub("?", normalized)
+    normalized = _NUMBER_LITERAL.sub("?", normalized)
+    normalized = _WHITESPACE.sub(" ", normalized).strip()
+    return _IN_LIST.sub("(?...)", normalized)
+
+
+def fingerprint(normalized: str) -> str:
+    """正規化 SQL 的雜湊值"""
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:12]
+
+
+def parameter_shape(parameters: Any) -> Any:
+    """
+    參數的型別（不記錄實際值，避免個人資料寫入 log）
+
+    Args:
+        parameters: 執行參數
+
+    Returns:
+        dict 時為 {名稱: 型別}，序列時為 [型別, ...]
+    """
+    if parameters is None:
+        return None
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def find_caller() -> str:
+    """找出執行 SQL 的專案程式碼（模組.函式:行號）"""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(ROOT) and not filename.startswith(_INTERNAL_FILES) and "site-packages" not in filename:
+            module = frame.f_globals.get("__name__", "?")
+            return f"{module}.{frame.f_code.co_name}:{frame.f_lineno}"
+        frame = frame.f_back
+    return "unknown"
+
+
+def explain_query_plan(statement: str, parameters: Any, source: str) -> Optional[List[str]]:
+    """
+    以獨立的 sqlite3 連線執行 EXPLAIN QUERY PLAN
+
+    Returns:
+        查詢計畫（每列一行），不支援或失敗時回傳 None
+    """
+    if not statement.lstrip(" \t\r\n(").upper().startswith(EXPLAIN_OPERATIONS) or parameters is None:
+        return None
+    db_path = engine.url.database if source == SOURCE_ORM else RAW_DATABASE_PATH
+    try:
+        conn = sqlite3.connect(db_path, timeout=0.1)
+        try:
+            rows = conn.execute(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+        finally:
+            conn.close()
+        return [row[-1] for row in rows]
+    except Exception as e:
+        logger.debug(f"EXPLAIN QUERY PLAN 失敗: {str(e)}")
+        return None
+
+
+class SlowQueryLog:
+    """慢查詢的彙總（依 fingerprint）"""
+
+    def __init__(self, threshold_ms: float = SLOW_QUERY_MS, max_fingerprints: int = SLOW_QUERY_MAX_FINGERPRINTS):
+        self.threshold = threshold_ms / 1000
+        self.max_fingerprints = max_fingerprints
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def record(self, statement: str, parameters: Any, duration: float, source: str) -> None:
+        """SQL 執行事件的 listener：只處理超過門檻的語句"""
+        if self.threshold <= 0 or duration < self.threshold:
+            return
+
+        normalized = normalize_sql(statement)
+        key = fingerprint(normalized)
+        caller = find_caller()
+        shape = parameter_shape(parameters)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            need_plan = entry is None
+        # EXPLAIN 在鎖外執行，同時出現的相同語句可能各執行一次，不影響結果
+        plan = explain_query_plan(statement, parameters, source) if need_plan else None
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = {
+                    "fingerprint": key, "sql": normalized, "source": source,
+                    "count": 0, "total_seconds": 0.0, "max_seconds": 0.0,
+                    "parameters": shape, "callers": Counter(), "plan": plan,
+                }
+            entry["count"] += 1
+            entry["total_seconds"] += duration
+            entry["max_seconds"] = max(entry["max_seconds"], duration)
+            entry["parameters"] = shape
+            entry["callers"][caller] += 1
+            if entry["plan"] is None:
+                entry["plan"] = plan
+            plan = entry["plan"]
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_fingerprints:
+                self._entries.popitem(last=False)
+
+        logger.warning(
+            "慢查詢 %.1f ms [%s] %s 來源=%s 呼叫=%s 參數=%s 查詢計畫=%s",
+            duration * 1000, key, normalized, source, caller, shape, plan
+        )
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        """
+        取得彙總結果（總耗時多的在前）
+
+        Returns:
+            每個 fingerprint 的 sql、次數、總耗時、最大耗時、平均耗時、
+            參數型別、呼叫者次數與查詢計畫
+        """
+        with self._lock:
+            entries = [
+                dict(entry, callers=dict(entry["callers"]), avg_seconds=entry["total_seconds"] / entry["count"])
+                for entry in self._entries.values()
+            ]
+        return sorted(entries, key=lambda entry: entry["total_seconds"], reverse=True)
+
+    def clear(self) -> None:
+        """清除彙總"""
+        with self._lock:
+            self._entries.clear()
+
+
+slow_query_log = SlowQueryLog()
+
+
+def setup_slow_query_log() -> None:
+    """註冊 SQL 執行事件的 listener"""
+    if SLOW_QUERY_MS > 0:
+        add_statement_listener(slow_query_log.record)
+
+
+router = APIRouter()
+
+
+@router.get("/slow-queries")
+async def list_slow_queries(authorization: Optional[str] = Header(None)):
+    """慢查詢彙總（需要管理用 token）"""
+    token = authorization[7:] if authorization and authorization.startswith("Bearer ") else None
+    if not is_profiler_token(token):
+        return {"status": "1", "message": "未授權"}
+    queries = await to_thread.run_sync(slow_query_log.snapshot)
+    return {"status": "0", "message": "ok", "threshold_ms": SLOW_QUERY_MS, "queries": queries}
@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""
+SQL 執行事件
+
+SQLAlchemy engine（ORM 與 engine.begin()）與直接使用 sqlite3 的模組
+都在每個語句執行後通知已註冊的 listener，傳入語句、參數、耗時與來源，
+指標、慢查詢紀錄等功能只需要註冊 listener，不必各自處理兩種連線。
+
+sqlite3 連線需透過 app.core.database.connect_raw 取得（使用 InstrumentedConnection），
+耗時只包含 execute（第一個結果列），不包含之後 fetch 的時間，與 SQLAlchemy 事件一致。
+"""
+import sqlite3
+import time
+from typing import Any, Callable, List
+from sqlalchemy import event
+from common.utils import get_logger
+
+logger = get_logger(__name__)
+
+SOURCE_ORM = "orm"
+SOURCE_RAW = "raw"
+
+# listener(statement, parameters, duration_seconds, source)
+StatementListener = Callable[[str, Any, float, str], None]
+
+_listeners: List[StatementListener] = []
+
+
+def add_statement_listener(listener: StatementListener) -> None:
+    """
+    註冊 SQL 執行後的 listener（重複註冊同一個函式只會保留一個）
+
+    listener 在執行 SQL 的執行緒中同步呼叫，必須快速且自行處理執行緒安全。
+
+    Args:
+        listener: 接收 (語句, 參數, 耗時秒數, 來源) 的函式
+    """
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+
+def remove_statement_listener(listener: StatementListener) -> None:
+    """移除 listener"""
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+
+def notify_statement(statement: str, parameters: Any, duration: float, source: str) -> None:
+    """
+    通知所有 listener（listener 的錯誤只記錄，不影響查詢）
+
+    Args:
+        statement: SQL 語句
+        parameters: 執行參數
+        duration: 耗時秒數
+        source: 來源（orm 或 raw）
+    """
+    for listener in _listeners:
+        try:
+            listener(statement, parameters, duration, source)
+        except Exception as e:
+            logger.error(f"SQL listener 執行失敗: {str(e)}", exc_info=True)
+
+
+def install_engine_hooks(engine) -> None:
+    """在 SQLAlchemy engine 上註冊執行前後的事件"""
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("sql_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["sql_started"].pop()
+        notify_statement(statement, parameters, time.perf_counter() - started, SOURCE_ORM)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(exception_context):
+        # 執行失敗時不會觸發 after_cursor_execute，清掉開始時間
+        conn = exception_context.connection
+        if conn is not None and conn.info.get("sql_started"):
+            conn.info["sql_started"].pop()
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """計時並通知 listener 的 sqlite3 cursor"""
+
+    def execute(self, sql, parameters=()):
+        started = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            notify_statement(sql, parameters, time.perf_counter() - started, SOURCE_RAW)
+
+    def executemany(self, sql, seq_of_parameters):
+        started = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            notify_statement(sql, None, time.perf_counter() - started, SOURCE_RAW)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """cursor 與 execute 都經過 InstrumentedCursor 的 sqlite3 連線"""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
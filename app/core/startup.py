@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+"""
+應用程式啟動流程 - 由 FastAPI lifespan 呼叫
+
+以一次查詢比對 Alembic 版本，版本相符時不再做 create_all 的
+schema 反射；接著預熱連線池與常用查詢的編譯快取。
+"""
+import os
+import time
+from typing import Optional
+from anyio import to_thread
+from sqlalchemy import select, text
+from sqlalchemy.exc import OperationalError
+from app.core.database import engine, Base, SessionLocal
+from common.utils import get_logger
+
+logger = get_logger(__name__)
+
+# 目前程式碼對應的 Alembic 版本（新增 migration 時需同步更新）
+EXPECTED_SCHEMA_REVISION = "add_news_version_triggers"
+
+# 同步路由使用的線程池大小（anyio 預設為 40）
+THREADPOOL_SIZE = int(os.getenv("THREADPOOL_SIZE", 40))
+
+
+def get_schema_revision() -> Optional[str]:
+    """
+    讀取資料庫的 Alembic 版本
+
+    Returns:
+        版本字串，資料庫尚未以 Alembic 建立時回傳 None
+    """
+    try:
+        with engine.connect() as conn:
+            return conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+    except OperationalError:
+        return None
+
+
+def check_schema() -> bool:
+    """
+    檢查資料庫版本，不相符時退回 create_all 補建缺少的資料表
+
+    Returns:
+        True = 版本相符
+    """
+    revision = get_schema_revision()
+    if revision == EXPECTED_SCHEMA_REVISION:
+        return True
+
+    logger.warning(
+        f"資料庫版本 {revision} 與程式碼版本 {EXPECTED_SCHEMA_REVISION} 不符，"
+        f"請執行 alembic upgrade head；先以 create_all 補建缺少的資料表"
+    )
+    Base.metadata.create_all(bind=engine)
+    return False
+
+
+def warm_up() -> None:
+    """
+    預熱連線池與常用查詢
+
+    以不存在的 id 執行熱門查詢一次，讓 SQLAlchemy 的編譯快取與
+    連線池中那條連線的 sqlite3 statement cache 在第一個請求前就緒。
+    """
+    from app.account.models import User
+    from app._user.models import UserProfile, UserDefaults, UserSettings
+
+    db = SessionLocal()
+    try:
+        for model, column in [
+            (User, User.id),
+            (User, User.email),
+            (UserProfile, UserProfile.user_id),
+            (UserDefaults, UserDefaults.user_id),
+            (UserSettings, UserSettings.user_id),
+        ]:
+            db.execute(select(model).where(column == -1)).first()
+    except Exception as e:
+        logger.warning(f"預熱查詢失敗: {str(e)}")
+    finally:
+        db.close()
+
+
+def configure_threadpool(size: int = THREADPOOL_SIZE) -> None:
+    """
+    設定同步路由的線程池大小（需在事件迴圈中呼叫）
+
+    Args:
+        size: 同時執行的同步路由數上限
+    """
+    to_thread.current_default_thread_limiter().total_tokens = size
+    logger.info(f"同步路由線程池大小: {size}")
+
+
+def run_startup() -> float:
+    """
+    執行啟動流程
+
+    Returns:
+        啟動耗時（秒）
+    """
+    started = time.perf_counter()
+    check_schema()
+    warm_up()
+    elapsed = time.perf_counter() - started
+    logger.info(f"啟動完成，耗時 {elapsed * 1000:.1f} ms")
+    return elapsed
@@ -1,104 +1,373 @@
 # -*- coding: utf-8 -*-
 """
 時區遷移工具 - 將所有現有的時間資料轉換為 UTC+8
+
+依 id（rowid）順序分批讀取，每批以 executemany 更新並立即提交，
+進度記錄在 checkpoint 表中，中斷後重新執行會從上次的位置繼續。
+
+用法:
+    python -m app.core.timezone_migration --db Puyuan.db
+    python -m app.core.timezone_migration --dry-run      # 只估算，不寫入
+    python -m app.core.timezone_migration --reset        # 清除進度重新開始
 """
+import argparse
+import logging
 import sqlite3
+import time
 from datetime import datetime, timezone, timedelta
+from typing import Dict, List, Optional, Tuple
 from common.utils import get_logger
 
 logger = get_logger(__name__)
 TAIWAN_TZ = timezone(timedelta(hours=8))
 
+# 每批處理的列數：越大越快，但單一交易佔用寫入鎖的時間也越長
+DEFAULT_CHUNK_SIZE = 1000
+
+CHECKPOINT_TABLE = "timezone_migration_checkpoints"
 
-def migrate_timezone_to_utc8(db_path: str = "Puyuan.db"):
+# 定義所有包含時間欄位的表和欄位
+TABLES_WITH_DATETIME = {
+    'UserAuth': ['created_at', 'updated_at', 'token_expire_at', 'verification_expires_at'],
+    'user_profiles': ['created_at', 'updated_at'],
+    'user_defaults': ['created_at', 'updated_at'],
+    'user_settings': ['created_at', 'updated_at'],
+    'verification_codes': ['created_at', 'expires_at'],
+    'blood_pressure_records': ['measured_at', 'created_at', 'updated_at'],
+    'weight_records': ['measured_at', 'created_at', 'updated_at'],
+    'blood_sugar_records': ['measured_at', 'created_at', 'updated_at'],
+    'measurement_records': ['uploaded_at', 'created_at', 'updated_at'],
+    'News': ['pushed_at', 'created_at', 'updated_at'],
+    'Share': ['created_at', 'updated_at'],
+    'UserCare': ['created_at', 'updated_at'],
+    'medical_info': ['created_at', 'updated_at'],
+    'drug_used': ['recorded_at', 'created_at', 'updated_at'],
+    'a1c_records': ['recorded_at', 'created_at', 'updated_at'],
+    'Friendship': ['created_at', 'updated_at'],
+    'friend_requests': ['created_at', 'updated_at'],
+    'DiaryDiet': ['recorded_at', 'created_at', 'updated_at'],
+}
+
+
+def convert_to_utc8(datetime_str: str) -> str:
     """
-    將資料庫中所有的時間欄位轉換為 UTC+8
-    
+    將時間字串轉換為 UTC+8 的 ISO 格式
+
+    Args:
+        datetime_str: 原始時間字串
+
+    Returns:
+        轉換後的時間字串
+    """
+    # 假設現有資料是 UTC 時間，轉換為 UTC+8
+    dt = datetime.fromisoformat(datetime_str.replace('Z', '+00:00'))
+    return dt.astimezone(TAIWAN_TZ).replace(tzinfo=None).isoformat()
+
+
+def _ensure_checkpoint_table(conn: sqlite3.Connection) -> None:
+    """建立進度記錄表"""
+    conn.execute(
+        f"""CREATE TABLE IF NOT EXISTS {CHECKPOINT_TABLE} (
+               table_name TEXT NOT NULL,
+               column_name TEXT NOT NULL,
+               last_rowid INTEGER NOT NULL DEFAULT 0,
+               done INTEGER NOT NULL DEFAULT 0,
+               updated_count INTEGER NOT NULL DEFAULT 0,
+               updated_at DATETIME,
+               PRIMARY KEY (table_name, column_name)
+           )"""
+    )
+    conn.commit()
+
+
+def _load_checkpoints(conn: sqlite3.Connection) -> Dict[Tuple[str, str], Tuple[int, bool]]:
+    """
+    讀取所有欄位的進度 {(表, 欄位): (最後處理的 rowid, 是否完成)}
+
+    進度記錄表不存在時（尚未遷移過）回傳空字典，不建立資料表
+    """
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (CHECKPOINT_TABLE,)
+    ).fetchone()
+    if not exists:
+        return {}
+    rows = conn.execute(
+        f"SELECT table_name, column_name, last_rowid, done FROM {CHECKPOINT_TABLE}"
+    ).fetchall()
+    return {(row[0], row[1]): (row[2], bool(row[3])) for row in rows}
+
+
+def _save_checkpoint(
+    cursor: sqlite3.Cursor,
+    table_name: str,
+    column_name: str,
+    last_rowid: int,
+    updated_count: int,
+    done: bool = False
+) -> None:
+    """記錄進度（與該批更新在同一個交易中）"""
+    cursor.execute(
+        f"""INSERT INTO {CHECKPOINT_TABLE}
+               (table_name, column_name, last_rowid, done, updated_count, updated_at)
+           VALUES (?, ?, ?, ?, ?, ?)
+           ON CONFLICT(table_name, column_name) DO UPDATE SET
+               last_rowid = excluded.last_rowid,
+               done = excluded.done,
+               updated_count = updated_count + excluded.updated_count,
+               updated_at = excluded.updated_at""",
+        (table_name, column_name, last_rowid, int(done), updated_count,
+         datetime.now(TAIWAN_TZ).replace(tzinfo=None).isoformat())
+    )
+
+
+def _existing_columns(conn: sqlite3.Connection) -> List[Tuple[str, str]]:
+    """列出資料庫中實際存在的 (表, 欄位)"""
+    existing_tables = {
+        row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")
+    }
+
+    targets = []
+    for table_name, datetime_columns in TABLES_WITH_DATETIME.items():
+        if table_name not in existing_tables:
+            logger.info(f"表 {table_name} 不存在")
+            continue
+
+        columns = {col[1] for col in conn.execute(f'PRAGMA table_info("{table_name}")')}
+        for column_name in datetime_columns:
+            if column_name not in columns:
+                logger.info(f"表 {table_name} 中的欄位 {column_name} 不存在")
+                continue
+            targets.append((table_name, column_name))
+    return targets
+
+
+def _fetch_chunk(
+    conn: sqlite3.Connection,
+    table_name: str,
+    column_name: str,
+    after_rowid: int,
+    chunk_size: int
+) -> List[Tuple[int, str]]:
+    """依 rowid 順序讀取下一批非 NULL 的時間值"""
+    return conn.execute(
+        f"""SELECT rowid, "{column_name}" FROM "{table_name}"
+            WHERE rowid > ? AND "{column_name}" IS NOT NULL
+            ORDER BY rowid LIMIT ?""",
+        (after_rowid, chunk_size)
+    ).fetchall()
+
+
+def _convert_chunk(table_name: str, column_name: str, rows: List[Tuple[int, str]]) -> List[Tuple[str, int]]:
+    """轉換一批資料，回傳 executemany 用的 (新值, rowid) 參數"""
+    params = []
+    for row_id, datetime_str in rows:
+        if not datetime_str:
+            continue
+        try:
+            params.append((convert_to_utc8(str(datetime_str)), row_id))
+        except Exception as e:
+            logger.warning(f"更新 {table_name}.{column_name} (rowid={row_id}) 時出錯: {str(e)}")
+    return params
+
+
+def migrate_column(
+    conn: sqlite3.Connection,
+    table_name: str,
+    column_name: str,
+    start_rowid: int = 0,
+    chunk_size: int = DEFAULT_CHUNK_SIZE
+) -> int:
+    """
+    分批轉換單一欄位，每批提交一次並記錄進度
+
+    Args:
+        conn: sqlite3 連線
+        table_name: 表名
+        column_name: 欄位名
+        start_rowid: 從這個 rowid 之後開始
+        chunk_size: 每批列數
+
+    Returns:
+        更新的列數
+    """
+    cursor = conn.cursor()
+    last_rowid = start_rowid
+    updated_count = 0
+    started = time.perf_counter()
+
+    while True:
+        rows = _fetch_chunk(conn, table_name, column_name, last_rowid, chunk_size)
+        if not rows:
+            break
+
+        params = _convert_chunk(table_name, column_name, rows)
+        last_rowid = rows[-1][0]
+
+        try:
+            if params:
+                cursor.executemany(
+                    f'UPDATE "{table_name}" SET "{column_name}" = ? WHERE rowid = ?',
+                    params
+                )
+            _save_checkpoint(cursor, table_name, column_name, last_rowid, len(params))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+        updated_count += len(params)
+
+    _save_checkpoint(cursor, table_name, column_name, last_rowid, 0, done=True)
+    conn.commit()
+
+    elapsed = time.perf_counter() - started
+    if updated_count > 0:
+        rate = updated_count / elapsed if elapsed > 0 else float(updated_count)
+        logger.info(
+            f"表 {table_name} 的欄位 {column_name}: 更新了 {updated_count} 行，"
+            f"耗時 {elapsed:.2f} 秒 ({rate:.0f} 行/秒)"
+        )
+    else:
+        logger.info(f"表 {table_name} 的欄位 {column_name} 沒有資料需要更新")
+    return updated_count
+
+
+def estimate_migration(db_path: str = "Puyuan.db", chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict:
+    """
+    估算剩餘的遷移工作量（不寫入任何資料）
+
+    以第一個有資料的欄位實際讀取並轉換一批來量測速度，再推算總時間；
+    寫入成本沒有量測，估計值偏樂觀。
+
     Args:
         db_path: 資料庫路徑
+        chunk_size: 每批列數
+
+    Returns:
+        {"columns": [...], "total_rows": int, "estimated_seconds": float}
     """
     conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # 定義所有包含時間欄位的表和欄位
-    tables_with_datetime = {
-        'UserAuth': ['created_at', 'updated_at', 'token_expire_at', 'verification_expires_at'],
-        'user_profiles': ['created_at', 'updated_at'],
-        'user_defaults': ['created_at', 'updated_at'],
-        'user_settings': ['created_at', 'updated_at'],
-        'verification_codes': ['created_at', 'expires_at'],
-        'blood_pressure_records': ['measured_at', 'created_at', 'updated_at'],
-        'weight_records': ['measured_at', 'created_at', 'updated_at'],
-        'blood_sugar_records': ['measured_at', 'created_at', 'updated_at'],
-        'measurement_records': ['uploaded_at', 'created_at', 'updated_at'],
-        'News': ['pushed_at', 'created_at', 'updated_at'],
-        'Share': ['created_at', 'updated_at'],
-        'UserCare': ['created_at', 'updated_at'],
-        'medical_info': ['created_at', 'updated_at'],
-        'drug_used': ['recorded_at', 'created_at', 'updated_at'],
-        'a1c_records': ['recorded_at', 'created_at', 'updated_at'],
-        'Friendship': ['created_at', 'updated_at'],
-        'friend_requests': ['created_at', 'updated_at'],
-        'DiaryDiet': ['recorded_at', 'created_at', 'updated_at'],
-    }
-    
     try:
-        for table_name, datetime_columns in tables_with_datetime.items():
-            # 檢查表是否存在
-            cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{table_name}'")
-            if not cursor.fetchone():
-                logger.info(f"表 {table_name} 不存在")
+        checkpoints = _load_checkpoints(conn)
+
+        columns = []
+        total_rows = 0
+        sample_rate = None
+
+        for table_name, column_name in _existing_columns(conn):
+            last_rowid, done = checkpoints.get((table_name, column_name), (0, False))
+            if done:
+                continue
+
+            remaining = conn.execute(
+                f"""SELECT COUNT(*) FROM "{table_name}"
+                    WHERE rowid > ? AND "{column_name}" IS NOT NULL""",
+                (last_rowid,)
+            ).fetchone()[0]
+            if not remaining:
                 continue
-            
-            for column_name in datetime_columns:
-                # 檢查欄位是否存在
-                cursor.execute(f"PRAGMA table_info({table_name})")
-                columns = [col[1] for col in cursor.fetchall()]
-                
-                if column_name not in columns:
-                    logger.info(f"表 {table_name} 中的欄位 {column_name} 不存在")
-                    continue
-                
-                # 查詢所有非 NULL 的時間值
-                cursor.execute(f"SELECT id, {column_name} FROM {table_name} WHERE {column_name} IS NOT NULL")
-                rows = cursor.fetchall()
-                
-                if not rows:
-                    logger.info(f"表 {table_name} 的欄位 {column_name} 沒有資料需要更新")
-                    continue
-                
-                # 更新每一行
-                updated_count = 0
-                for row_id, datetime_str in rows:
-                    try:
-                        # 嘗試解析時間字串
-                        if datetime_str:
-                            # 假設現有資料是 UTC 時間，轉換為 UTC+8
-                            dt = datetime.fromisoformat(datetime_str.replace('Z', '+00:00'))
-                            # 轉換為 UTC+8
-                            dt_utc8 = dt.astimezone(TAIWAN_TZ).replace(tzinfo=None)
-                            
-                            # 更新資料庫
-                            cursor.execute(
-                                f"UPDATE {table_name} SET {column_name} = ? WHERE id = ?",
-                                (dt_utc8.isoformat(), row_id)
-                            )
-                            updated_count += 1
-                    except Exception as e:
-                        logger.warning(f"更新 {table_name}.{column_name} (id={row_id}) 時出錯: {str(e)}")
-                
-                if updated_count > 0:
-                    logger.info(f"表 {table_name} 的欄位 {column_name}: 更新了 {updated_count} 行")
-        
+
+            if sample_rate is None:
+                started = time.perf_counter()
+                rows = _fetch_chunk(conn, table_name, column_name, last_rowid, chunk_size)
+                _convert_chunk(table_name, column_name, rows)
+                elapsed = time.perf_counter() - started
+                sample_rate = len(rows) / elapsed if elapsed > 0 else None
+
+            columns.append({"table": table_name, "column": column_name, "rows": remaining})
+            total_rows += remaining
+
+        estimated_seconds = total_rows / sample_rate if sample_rate else 0.0
+        return {
+            "columns": columns,
+            "total_rows": total_rows,
+            "chunks": sum(-(-col["rows"] // chunk_size) for col in columns),
+            "estimated_seconds": round(estimated_seconds, 2),
+        }
+    finally:
+        conn.close()
+
+
+def reset_checkpoints(db_path: str = "Puyuan.db") -> None:
+    """清除遷移進度（下一次會從頭轉換，已轉換的資料會再被轉換一次）"""
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute(f"DROP TABLE IF EXISTS {CHECKPOINT_TABLE}")
         conn.commit()
-        logger.info("所有時間欄位已轉換為 UTC+8")
-        
+    finally:
+        conn.close()
+
+
+def migrate_timezone_to_utc8(
+    db_path: str = "Puyuan.db",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    dry_run: bool = False
+) -> Optional[Dict]:
+    """
+    將資料庫中所有的時間欄位轉換為 UTC+8
+
+    Args:
+        db_path: 資料庫路徑
+        chunk_size: 每批列數
+        dry_run: True = 只估算工作量，不寫入
+
+    Returns:
+        dry_run 時回傳估算結果，否則回傳 {"updated_rows", "elapsed_seconds", "rows_per_second"}
+    """
+    if dry_run:
+        estimate = estimate_migration(db_path, chunk_size)
+        logger.info(
+            f"預估需要更新 {estimate['total_rows']} 行（{estimate['chunks']} 批），"
+            f"約 {estimate['estimated_seconds']} 秒"
+        )
+        return estimate
+
+    conn = sqlite3.connect(db_path)
+    started = time.perf_counter()
+    total_updated = 0
+
+    try:
+        _ensure_checkpoint_table(conn)
+        checkpoints = _load_checkpoints(conn)
+
+        for table_name, column_name in _existing_columns(conn):
+            last_rowid, done = checkpoints.get((table_name, column_name), (0, False))
+            if done:
+                logger.info(f"表 {table_name} 的欄位 {column_name} 已轉換過，略過")
+                continue
+            if last_rowid:
+                logger.info(f"表 {table_name} 的欄位 {column_name} 從 rowid {last_rowid} 之後繼續")
+
+            total_updated += migrate_column(conn, table_name, column_name, last_rowid, chunk_size)
+
+        elapsed = time.perf_counter() - started
+        rate = total_updated / elapsed if elapsed > 0 else 0.0
+        logger.info(f"所有時間欄位已轉換為 UTC+8，共 {total_updated} 行，耗時 {elapsed:.2f} 秒 ({rate:.0f} 行/秒)")
+        return {
+            "updated_rows": total_updated,
+            "elapsed_seconds": round(elapsed, 2),
+            "rows_per_second": round(rate, 1),
+        }
+
     except Exception as e:
+        # 已提交的批次保留，重新執行時會從 checkpoint 繼續
         logger.error(f"時區遷移失敗: {str(e)}", exc_info=True)
         conn.rollback()
+        return None
     finally:
         conn.close()
 
 
 if __name__ == "__main__":
-    migrate_timezone_to_utc8()
+    parser = argparse.ArgumentParser(description="將資料庫時間欄位轉換為 UTC+8")
+    parser.add_argument("--db", default="Puyuan.db", help="資料庫路徑")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="每批處理的列數")
+    parser.add_argument("--dry-run", action="store_true", help="只估算工作量，不寫入")
+    parser.add_argument("--reset", action="store_true", help="清除進度記錄後再執行")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+
+    if args.reset:
+        reset_checkpoints(args.db)
+    migrate_timezone_to_utc8(args.db, chunk_size=args.chunk_size, dry_run=args.dry_run)
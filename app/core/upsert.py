@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""
+每位用戶一列的資料表的 upsert
+
+以單一 INSERT ... ON CONFLICT(user_id) DO UPDATE 取代「先 SELECT 再 INSERT 或 UPDATE」，
+少一次往返，同時更新也不會因為兩個請求都查不到資料而重複 INSERT。
+傳入 None 的欄位以 COALESCE 保留原值（部分更新）；SQL 在建立時產生一次，
+使用具名參數，SQLAlchemy session 與 sqlite3 連線都能直接執行。
+"""
+from datetime import datetime
+from typing import Any, Dict, Mapping, Optional, Union
+from sqlalchemy import DateTime, bindparam, text
+from common.utils import get_logger
+
+logger = get_logger(__name__)
+
+# 欄位在新增資料時使用的預設值（只接受 None 或數值，會直接寫進 SQL）
+ColumnDefaults = Mapping[str, Union[None, int, float]]
+
+
+class UserRowUpsert:
+    """單一資料表的 upsert 語句"""
+
+    def __init__(
+        self, table: str, columns: ColumnDefaults, key: str = "user_id",
+        created_column: Optional[str] = "created_at", updated_column: Optional[str] = "updated_at"
+    ):
+        """
+        Args:
+            table: 資料表名稱（需有 key 的唯一索引）
+            columns: 可更新的欄位與新增時的預設值
+            key: 唯一鍵欄位
+            created_column: 建立時間欄位（只在新增時寫入）
+            updated_column: 更新時間欄位
+        """
+        self.table = table
+        self.columns = dict(columns)
+        self.key = key
+
+        insert_columns = [f'"{key}"']
+        insert_values = [f":{key}"]
+        updates = []
+        for column, default in self.columns.items():
+            insert_columns.append(f'"{column}"')
+            insert_values.append(f":{column}" if default is None else f"COALESCE(:{column}, {default!r})")
+            updates.append(f'"{column}" = COALESCE(:{column}, "{table}"."{column}")')
+        for column in (created_column, updated_column):
+            if column:
+                insert_columns.append(f'"{column}"')
+                insert_values.append(":now")
+        if updated_column:
+            updates.append(f'"{updated_column}" = :now')
+
+        self.sql = (
+            f'INSERT INTO "{table}" ({", ".join(insert_columns)}) '
+            f'VALUES ({", ".join(insert_values)}) '
+            f'ON CONFLICT("{key}") DO UPDATE SET {", ".join(updates)}'
+        )
+        # 時間以 SQLAlchemy 的 DateTime 格式寫入，與 ORM 寫入的資料一致
+        self.statement = text(self.sql).bindparams(bindparam("now", type_=DateTime))
+
+    @classmethod
+    def from_model(cls, model, exclude=()) -> "UserRowUpsert":
+        """
+        依 ORM 模型建立，新增時的預設值取自欄位的純量 default
+
+        Args:
+            model: SQLAlchemy 模型（需有 user_id、created_at、updated_at）
+            exclude: 不開放更新的欄位
+
+        Returns:
+            UserRowUpsert
+        """
+        skipped = {"id", "user_id", "created_at", "updated_at", *exclude}
+        columns = {}
+        for column in model.__table__.columns:
+            if column.name in skipped:
+                continue
+            default = column.default.arg if column.default is not None and column.default.is_scalar else None
+            columns[column.name] = int(default) if isinstance(default, bool) else default
+        return cls(model.__tablename__, columns)
+
+    def params(self, key_value: int, values: Mapping[str, Any], now: Union[datetime, str]) -> Dict[str, Any]:
+        """
+        組成執行參數，沒有提供或不屬於此表的欄位為 None（保留原值）
+
+        Args:
+            key_value: 唯一鍵的值（user_id）
+            values: 要更新的欄位
+            now: 目前時間
+
+        Returns:
+            具名參數
+        """
+        unknown = set(values) - set(self.columns)
+        if unknown:
+            logger.debug(f"{self.table} 略過不存在的欄位: {sorted(unknown)}")
+        params = {column: values.get(column) for column in self.columns}
+        params[self.key] = key_value
+        params["now"] = now
+        return params
+
+    def execute(self, db, key_value: int, values: Mapping[str, Any], now: Union[datetime, str]) -> None:
+        """
+        以 SQLAlchemy session 執行（由呼叫端 commit）
+
+        Args:
+            db: 資料庫 session
+            key_value: 唯一鍵的值（user_id）
+            values: 要更新的欄位
+            now: 目前時間
+        """
+        db.execute(self.statement, self.params(key_value, values, now))
+
+    def execute_raw(self, cursor, key_value: int, values: Mapping[str, Any], now: Union[datetime, str]) -> None:
+        """
+        以 sqlite3 cursor 執行（由呼叫端 commit）
+
+        Args:
+            cursor: sqlite3 cursor
+            key_value: 唯一鍵的值（user_id）
+            values: 要更新的欄位
+            now: 目前時間
+        """
+        cursor.execute(self.sql, self.params(key_value, values, now))
@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+from typing import Optional
+from fastapi import APIRouter, Depends, Query
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from sqlalchemy.orm import Session
+from app.core.database import get_db
+from .models import FeedResponse
+from .module import FeedModule, FEED_DEFAULT_LIMIT, FEED_MAX_LIMIT
+from common.utils import get_logger
+
+logger = get_logger(__name__)
+router = APIRouter()
+security = HTTPBearer()
+
+# ==================== 好友動態 ====================
+
+@router.get("", response_model=FeedResponse, response_model_exclude_none=True, summary="好友動態", tags=["糖友圈"])
+def get_feed(
+    limit: int = Query(FEED_DEFAULT_LIMIT, ge=1, le=FEED_MAX_LIMIT, description="每頁筆數"),
+    before_id: Optional[int] = Query(None, description="上一頁最後一筆的 ID"),
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    db: Session = Depends(get_db)
+):
+    """
+    查看親友、糖友分享給自己的動態
+
+    - **需要 Bearer Token**
+    - **limit**: 每頁筆數
+    - **before_id**: 上一頁回應的 next_before_id
+    """
+    authorization = f"Bearer {credentials.credentials}"
+    user_id = FeedModule.parse_user_id_from_token(authorization)
+    if not user_id:
+        return FeedResponse(status="1", message="身份驗證失敗")
+
+    try:
+        feed = FeedModule.get_feed(db, user_id, limit=limit, before_id=before_id)
+    except Exception as e:
+        logger.error(f'get_feed 錯誤: {str(e)}', exc_info=True)
+        return FeedResponse(status="1", message="失敗")
+
+    next_before_id = feed[-1].id if len(feed) == limit else None
+    return FeedResponse(status="0", message="ok", feed=feed, next_before_id=next_before_id)
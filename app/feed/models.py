@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from pydantic import BaseModel, Field
+from typing import List, Optional
+from app.core.database import Base
+from common.utils import get_taiwan_time
+
+# ==================== SQLAlchemy 資料庫模型 ====================
+
+class FeedEntry(Base):
+    """好友動態收件匣：分享時寫入每位符合條件的好友"""
+    __tablename__ = "feed_entries"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    user_id = Column(Integer, nullable=False)  # 收件者
+    actor_id = Column(Integer, nullable=False)  # 分享者
+    share_id = Column(Integer, nullable=False)
+    data_type = Column(Integer, nullable=False)  # 0:血壓, 1:體重, 2:血糖, 3:飲食, 4:其他
+    record_id = Column(String(50), nullable=False)
+    relation_type = Column(Integer, nullable=False)  # 1:親友, 2:糖友
+    created_at = Column(DateTime, default=get_taiwan_time)
+
+    # 讀取動態：WHERE user_id = ? AND id < ? ORDER BY id DESC
+    __table_args__ = (
+        Index("ix_feed_entries_user_id_id", "user_id", "id"),
+    )
+
+# ==================== Pydantic API 模型 ====================
+
+class FeedActor(BaseModel):
+    """分享者資訊"""
+    id: int
+    name: str
+
+
+class FeedItem(BaseModel):
+    """動態項目"""
+    id: int
+    type: int = Field(..., description="0:血壓, 1:體重, 2:血糖, 3:飲食, 4:其他")
+    record_id: str
+    relation_type: int = Field(..., description="1:親友, 2:糖友")
+    created_at: str
+    user: FeedActor
+
+
+class FeedResponse(BaseModel):
+    """動態列表回應"""
+    status: str = Field(..., description="訊息代碼,0=成功,1=失敗")
+    message: str = Field(..., description="訊息")
+    feed: List[FeedItem] = Field(default_factory=list)
+    next_before_id: Optional[int] = Field(None, description="下一頁的 before_id，沒有下一頁時不回傳")
@@ -0,0 +1,115 @@
+# -*- coding: utf-8 -*-
+from sqlalchemy import insert, select
+from sqlalchemy.orm import Session
+from typing import Iterable, List, Optional, Tuple
+from app.core.security import verify_token
+from app._user.models import UserProfile
+from .models import FeedEntry, FeedItem, FeedActor
+from common.utils import get_logger, get_taiwan_time
+
+logger = get_logger(__name__)
+
+# 每頁動態筆數
+FEED_DEFAULT_LIMIT = 20
+FEED_MAX_LIMIT = 100
+
+
+class FeedModule:
+    '''好友動態模組（寫入時擴散到每位好友的收件匣，讀取只掃自己的收件匣）'''
+
+    @staticmethod
+    def parse_user_id_from_token(authorization: str) -> Optional[int]:
+        '''從 Authorization Header 解析用戶 ID'''
+        try:
+            if not authorization or not authorization.startswith('Bearer '):
+                return None
+            
+            token = authorization.split(' ')[1]
+            payload = verify_token(token)
+            
+            if not payload:
+                return None
+            
+            user_id = int(payload.get('sub'))
+            return user_id
+            
+        except Exception as e:
+            logger.error(f'parse_user_id_from_token 錯誤: {str(e)}', exc_info=True)
+            return None
+
+    @staticmethod
+    def fan_out(
+        db: Session,
+        deliveries: Iterable[Tuple[int, int]],
+        actor_id: int,
+        record_id: str,
+        data_type: int,
+        relation_type: int
+    ) -> int:
+        '''
+        將一筆分享寫入多位好友的收件匣（一次 executemany，由呼叫端 commit）
+
+        Args:
+            db: 資料庫 session
+            deliveries: (收件者 ID, 該收件者的分享記錄 ID)
+            actor_id: 分享者 ID
+            record_id: 被分享的記錄 ID
+            data_type: 資料類型
+            relation_type: 關係類型
+
+        Returns:
+            寫入的筆數
+        '''
+        now = get_taiwan_time()
+        entries = [
+            {
+                "user_id": recipient_id,
+                "actor_id": actor_id,
+                "share_id": share_id,
+                "data_type": data_type,
+                "record_id": record_id,
+                "relation_type": relation_type,
+                "created_at": now,
+            }
+            for recipient_id, share_id in deliveries
+        ]
+        if entries:
+            db.execute(insert(FeedEntry), entries)
+        return len(entries)
+
+    @staticmethod
+    def get_feed(
+        db: Session, user_id: int, limit: int = FEED_DEFAULT_LIMIT, before_id: Optional[int] = None
+    ) -> List[FeedItem]:
+        '''
+        讀取自己的動態（依 id 由新到舊的 keyset 分頁）
+
+        Args:
+            db: 資料庫 session
+            user_id: 使用者 ID
+            limit: 每頁筆數
+            before_id: 上一頁最後一筆的 ID
+
+        Returns:
+            動態列表
+        '''
+        query = (
+            select(FeedEntry, UserProfile.name)
+            .outerjoin(UserProfile, UserProfile.user_id == FeedEntry.actor_id)
+            .where(FeedEntry.user_id == user_id)
+        )
+        if before_id is not None:
+            query = query.where(FeedEntry.id < before_id)
+        query = query.order_by(FeedEntry.id.desc()).limit(min(limit, FEED_MAX_LIMIT))
+
+        return [
+            FeedItem(
+                id=entry.id,
+                type=entry.data_type,
+                record_id=entry.record_id,
+                relation_type=entry.relation_type,
+                created_at=str(entry.created_at) if entry.created_at else '',
+                user=FeedActor(id=entry.actor_id, name=name or '')
+            )
+            for entry, name in db.execute(query).all()
+        ]
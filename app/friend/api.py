@@ -1,7 +1,7 @@
 """
 控糖團好友 API
 """
-from fastapi import APIRouter, Request, Depends
+from fastapi import APIRouter, Request, Depends, Query
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
 from .models import (
@@ -9,6 +9,8 @@ from .models import (
     SendInviteRequest, BaseResponse, RemoveFriendsRequest, FriendResultsResponse
 )
 from .module import FriendModule
+from app.core.rate_limit import rate_limit
+from app.core.responses import trusted_response
 from common.utils import get_logger
 
 logger = get_logger(__name__)
@@ -44,11 +46,11 @@ async def get_friend_list(
         # 獲取好友列表
         friends = friend_module.get_friend_list(user_id)
         
-        return FriendListResponse(
-            status="0",
-            message="ok",
-            friends=friends
-        )
+        return trusted_response({
+            "status": "0",
+            "message": "ok",
+            "friends": friends
+        })
         
     except Exception as e:
         logger.error(f'get_friend_list 錯誤: {str(e)}', exc_info=True)
@@ -98,14 +100,18 @@ async def get_invite_code(
         )
 
 
-@router.get("/requests", response_model=FriendRequestsResponse)
+@router.get("/requests", response_model=FriendRequestsResponse, response_model_exclude_none=True)
 async def get_friend_requests(
+    limit: Optional[int] = Query(None, ge=1, le=100, description="每頁筆數，不指定則回傳全部"),
+    before_id: Optional[int] = Query(None, description="上一頁最後一筆邀請的 ID"),
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
 ):
     """
     獲取好友邀請列表(別人寄給我的邀請)
     
     需要認證: 是
+    
+    分頁: 指定 limit 時，回應的 next_before_id 可作為下一頁的 before_id
     """
     try:
         # 從 credentials 獲取 token
@@ -122,12 +128,16 @@ async def get_friend_requests(
             )
         
         # 獲取好友邀請列表
-        requests = friend_module.get_friend_requests(user_id)
+        requests = friend_module.get_friend_requests(user_id, limit=limit, before_id=before_id)
+        
+        # 這一頁已滿時才可能有下一頁
+        next_before_id = requests[-1].id if limit and len(requests) == limit else None
         
         return FriendRequestsResponse(
             status="0",
             message="ok",
-            requests=requests
+            requests=requests,
+            next_before_id=next_before_id
         )
         
     except Exception as e:
@@ -139,7 +149,7 @@ async def get_friend_requests(
         )
 
 
-@router.post("/send", response_model=BaseResponse)
+@router.post("/send", response_model=BaseResponse, dependencies=[Depends(rate_limit("friend_send"))])
 async def send_friend_invite(
     data: SendInviteRequest,
     credentials: Optional[HTTPAuthorizationCredentials] = Depends(security)
@@ -0,0 +1,101 @@
+"""
+控糖團好友關係快取（每個 worker 一份）
+
+以 user_id 為 key 保存好友 id 與關係類型，第一次查詢時才從資料庫載入；
+接受、拒絕、刪除好友時清除相關用戶。其他 worker 的修改無法即時通知，
+因此每筆資料另有存活時間，過期後重新載入。
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 每筆快取的存活秒數（限制其他 worker 修改後的延遲）
+FRIEND_GRAPH_TTL = float(os.getenv("FRIEND_GRAPH_TTL", 30))
+
+# 最多快取的用戶數，超過時淘汰最久未使用的
+FRIEND_GRAPH_MAX_USERS = int(os.getenv("FRIEND_GRAPH_MAX_USERS", 10000))
+
+# (好友 id, 關係類型)，依成為好友的時間由新到舊
+FriendEdges = List[Tuple[int, int]]
+
+
+class FriendGraph:
+    """好友鄰接表快取"""
+
+    def __init__(self, ttl: float = FRIEND_GRAPH_TTL, max_users: int = FRIEND_GRAPH_MAX_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, Tuple[float, FriendEdges, Dict[int, int]]]" = OrderedDict()
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id: int, loader: Callable[[int], FriendEdges]) -> FriendEdges:
+        """
+        取得用戶的好友列表，沒有快取或已過期時以 loader 載入
+
+        Args:
+            user_id: 使用者 ID
+            loader: 從資料庫載入好友關係的函式
+
+        Returns:
+            (好友 id, 關係類型) 列表
+        """
+        return self._get_entry(user_id, loader)[1]
+
+    def relation_type(self, user_id: int, friend_id: int, loader: Callable[[int], FriendEdges]) -> Optional[int]:
+        """
+        查詢兩人的關係類型
+
+        Args:
+            user_id: 使用者 ID
+            friend_id: 對方 ID
+            loader: 從資料庫載入好友關係的函式
+
+        Returns:
+            關係類型，不是好友時回傳 None
+        """
+        return self._get_entry(user_id, loader)[2].get(friend_id)
+
+    def invalidate(self, *user_ids: int) -> None:
+        """清除指定用戶的快取"""
+        with self._lock:
+            self._generation += 1
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        """清除全部快取"""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def _get_entry(self, user_id: int, loader: Callable[[int], FriendEdges]):
+        """取得未過期的快取項目，沒有時載入並寫入快取"""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+                return entry
+            self.misses += 1
+            generation = self._generation
+
+        edges = loader(user_id)
+        entry = (time.monotonic() + self.ttl, edges, dict(edges))
+
+        with self._lock:
+            # 載入期間有其他請求修改好友關係時不寫入，避免存到舊資料
+            if generation == self._generation:
+                self._entries[user_id] = entry
+                self._entries.move_to_end(user_id)
+                while len(self._entries) > self.max_users:
+                    self._entries.popitem(last=False)
+        return entry
+
+
+friend_graph = FriendGraph()
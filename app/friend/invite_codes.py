@@ -0,0 +1,90 @@
+"""
+邀請碼池（每個 worker 一份）
+
+背景任務預先產生一批尚未被使用的 6 位數邀請碼，取用時直接從池中拿出。
+不同 worker 的池可能拿到相同的號碼，最後由 UserProfile.invite_code 的
+唯一索引保證不重複，寫入失敗時換下一個號碼即可。
+"""
+import os
+import random
+import threading
+from collections import deque
+from typing import Callable, Iterable, Optional, Set
+
+# 池中保留的邀請碼數量
+INVITE_CODE_POOL_SIZE = int(os.getenv("INVITE_CODE_POOL_SIZE", 200))
+
+# 單次補充最多嘗試產生的號碼數（避免號碼空間快用完時無限迴圈）
+INVITE_CODE_MAX_CANDIDATES = 2000
+
+# 查詢哪些號碼已被使用的函式：傳入候選號碼，回傳已存在的號碼
+UsedCodeLookup = Callable[[Iterable[str]], Set[str]]
+
+
+def generate_invite_code() -> str:
+    """產生一個 6 位數邀請碼"""
+    return str(random.randint(100000, 999999))
+
+
+class InviteCodePool:
+    """預先驗證過的邀請碼池"""
+
+    def __init__(self, size: int = INVITE_CODE_POOL_SIZE):
+        self.size = size
+        self._codes = deque()
+        self._members: Set[str] = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def take(self) -> Optional[str]:
+        """
+        取出一個邀請碼
+
+        Returns:
+            邀請碼，池是空的時回傳 None
+        """
+        with self._lock:
+            if not self._codes:
+                return None
+            code = self._codes.popleft()
+            self._members.discard(code)
+            return code
+
+    def refill(self, find_used: UsedCodeLookup, target: Optional[int] = None) -> int:
+        """
+        補充邀請碼到指定數量
+
+        Args:
+            find_used: 查詢已被使用號碼的函式
+            target: 補充後的數量，預設為池的大小
+
+        Returns:
+            新增的邀請碼數量
+        """
+        target = self.size if target is None else target
+        with self._lock:
+            missing = target - len(self._codes)
+            if missing <= 0:
+                return 0
+            candidates = set()
+            while len(candidates) < min(missing * 2, INVITE_CODE_MAX_CANDIDATES):
+                code = generate_invite_code()
+                if code not in self._members:
+                    candidates.add(code)
+
+        # 查詢資料庫時不持有鎖，取用不會被阻塞
+        available = list(candidates - find_used(candidates))[:missing]
+
+        with self._lock:
+            added = 0
+            for code in available:
+                if code not in self._members:
+                    self._codes.append(code)
+                    self._members.add(code)
+                    added += 1
+            return added
+
+
+invite_code_pool = InviteCodePool()
@@ -52,6 +52,7 @@ class FriendRequestsResponse(BaseModel):
     status: str = Field(..., description="訊息代碼,0=成功,1=失敗")
     message: str = Field(..., description="訊息")
     requests: List[FriendRequest] = Field(default_factory=list, description="查看有誰寄送邀請")
+    next_before_id: Optional[int] = Field(None, description="下一頁的 before_id，沒有下一頁時不回傳")
 
 
 class SendInviteRequest(BaseModel):
@@ -2,17 +2,30 @@
 控糖團好友模組
 """
 import sqlite3
-from typing import List, Optional
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
 from datetime import datetime
 from .models import (
-    FriendInfo, UserInfo, FriendRequest, 
+    UserInfo, FriendRequest, 
     SendInviteRequest, FriendResult, RelationInfo
 )
+from .graph import friend_graph
+from .invite_codes import invite_code_pool, generate_invite_code
+from app.core.data_version import bump_data_version_raw, SCOPE_PROFILE
+from app.core.database import connect_raw
 from app.core.security import verify_token
 from common.utils import get_logger
 
 logger = get_logger(__name__)
 
+# 邀請碼與其他用戶重複時的重試次數
+INVITE_CODE_MAX_RETRIES = 5
+
+# UPDATE ... RETURNING 需要 SQLite 3.35 以上
+SUPPORTS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# 好友邀請列表每頁筆數上限
+FRIEND_REQUESTS_MAX_LIMIT = 100
+
 
 class FriendModule:
     """控糖團好友模組"""
@@ -43,55 +56,101 @@ class FriendModule:
     
     def get_db_connection(self):
         """獲取資料庫連線"""
-        conn = sqlite3.connect(self.db_path)
+        conn = connect_raw(self.db_path)
         conn.row_factory = sqlite3.Row
         return conn
     
-    def get_friend_list(self, user_id: int) -> List[FriendInfo]:
+    def get_friend_list(self, user_id: int) -> List[Dict[str, Any]]:
         """
         獲取好友列表
         
+        好友 id 與關係類型取自 friend_graph 快取，只有名稱需要查詢資料庫
+        
         Args:
             user_id: 使用者 ID
             
         Returns:
-            好友列表
+            好友列表（欄位與 FriendInfo 相同）
         """
+        edges = friend_graph.get(user_id, self._load_friend_edges)
+        if not edges:
+            return []
+        
         conn = self.get_db_connection()
         cursor = conn.cursor()
         
         try:
-            logger.debug(f"查詢好友列表，user_id={user_id}")
-            # 查詢已接受的好友關係
+            friend_ids = [friend_id for friend_id, _ in edges]
+            placeholders = ','.join('?' * len(friend_ids))
             cursor.execute(
-                """SELECT f.friend_id as id, u.name, fr.type as relation_type
-                   FROM Friendship f
-                   JOIN UserProfile u ON f.friend_id = u.user_id
-                   JOIN friend_requests fr ON (fr.user_id = ? AND fr.relation_id = f.friend_id) 
-                      OR (fr.relation_id = ? AND fr.user_id = f.friend_id)
-                   WHERE f.user_id = ? AND f.status = 1 AND fr.status = 1
-                   ORDER BY f.created_at DESC""",
-                (user_id, user_id, user_id)
+                f"SELECT user_id, name FROM UserProfile WHERE user_id IN ({placeholders})",
+                friend_ids
             )
-            rows = cursor.fetchall()
-            logger.debug(f"查詢到 {len(rows)} 位好友")
+            names = {row['user_id']: row['name'] for row in cursor.fetchall()}
             
+            # 與原本的 JOIN 相同，沒有個人資料的好友不列出
             return [
-                FriendInfo(
-                    id=row['id'],
-                    name=row['name'] or '',
-                    relation_type=row['relation_type']
-                )
-                for row in rows
+                {
+                    'id': friend_id,
+                    'name': names[friend_id] or '',
+                    'relation_type': relation_type
+                }
+                for friend_id, relation_type in edges
+                if friend_id in names
             ]
             
         finally:
             conn.close()
     
+    def _load_friend_edges(self, user_id: int) -> List[Tuple[int, int]]:
+        """
+        從資料庫載入用戶的好友 id 與關係類型
+        
+        邀請可能由任一方送出，拆成兩段各自走 (user_id, relation_id) 索引的查詢，
+        取代原本 JOIN ... ON (...) OR (...) 無法使用索引的寫法。
+        
+        Args:
+            user_id: 使用者 ID
+            
+        Returns:
+            (好友 id, 關係類型) 列表，依成為好友的時間由新到舊
+        """
+        conn = self.get_db_connection()
+        cursor = conn.cursor()
+        
+        try:
+            logger.debug("查詢好友列表，user_id=%s", user_id)
+            cursor.execute(
+                """SELECT f.friend_id AS id, fr.type AS relation_type, f.created_at AS created_at
+                   FROM Friendship f
+                   JOIN friend_requests fr ON fr.user_id = f.user_id AND fr.relation_id = f.friend_id
+                   WHERE f.user_id = ? AND f.status = 1 AND fr.status = 1
+                   UNION ALL
+                   SELECT f.friend_id AS id, fr.type AS relation_type, f.created_at AS created_at
+                   FROM Friendship f
+                   JOIN friend_requests fr ON fr.user_id = f.friend_id AND fr.relation_id = f.user_id
+                   WHERE f.user_id = ? AND f.status = 1 AND fr.status = 1
+                   ORDER BY created_at DESC""",
+                (user_id, user_id)
+            )
+            
+            # 同一對好友有多筆已接受的邀請時只保留一筆
+            edges = {}
+            for row in cursor.fetchall():
+                edges.setdefault(row['id'], row['relation_type'])
+            logger.debug("查詢到 %s 位好友", len(edges))
+            return list(edges.items())
+            
+        finally:
+            conn.close()
+    
     def get_invite_code(self, user_id: int) -> Optional[str]:
         """
         獲取用戶的邀請碼
         
+        還沒有邀請碼時從 invite_code_pool 取一個；唯一索引衝突
+        （其他 worker 同時發出相同號碼）時換下一個號碼重試。
+        
         Args:
             user_id: 使用者 ID
             
@@ -112,19 +171,36 @@ class FriendModule:
             if row and row['invite_code']:
                 return row['invite_code']
             
-            # 如果沒有邀請碼，自動生成一個 6 位數字邀請碼
-            import random
-            invite_code = str(random.randint(100000, 999999))
-            
-            # 更新到資料庫
-            cursor.execute(
-                "UPDATE UserProfile SET invite_code = ? WHERE user_id = ?",
-                (invite_code, user_id)
-            )
-            conn.commit()
-            
-            logger.debug(f"為用戶 {user_id} 生成邀請碼: {invite_code}")
-            return invite_code
+            for _ in range(INVITE_CODE_MAX_RETRIES):
+                invite_code = invite_code_pool.take() or self._new_invite_code()
+                try:
+                    # 只在仍然沒有邀請碼時寫入，避免覆蓋同時產生的號碼
+                    cursor.execute(
+                        "UPDATE UserProfile SET invite_code = ? WHERE user_id = ? AND invite_code IS NULL",
+                        (invite_code, user_id)
+                    )
+                    updated = cursor.rowcount
+                    if updated:
+                        bump_data_version_raw(cursor, user_id, SCOPE_PROFILE)
+                    conn.commit()
+                except sqlite3.IntegrityError:
+                    conn.rollback()
+                    continue
+                
+                if updated == 0:
+                    cursor.execute(
+                        "SELECT invite_code FROM UserProfile WHERE user_id = ?",
+                        (user_id,)
+                    )
+                    row = cursor.fetchone()
+                    if row and row['invite_code']:
+                        return row['invite_code']
+                
+                logger.debug("為用戶 %s 產生邀請碼: %s", user_id, invite_code)
+                return invite_code
+            
+            logger.error(f"為用戶 {user_id} 產生邀請碼失敗，已重試 {INVITE_CODE_MAX_RETRIES} 次")
+            return None
             
         except Exception as e:
             logger.error(f"get_invite_code 錯誤: {str(e)}", exc_info=True)
@@ -132,12 +208,49 @@ class FriendModule:
         finally:
             conn.close()
     
-    def get_friend_requests(self, user_id: int) -> List[FriendRequest]:
+    def find_used_invite_codes(self, codes: Iterable[str]) -> Set[str]:
+        """
+        查詢哪些邀請碼已被使用（走 invite_code 唯一索引）
+        
+        Args:
+            codes: 候選邀請碼
+            
+        Returns:
+            已被使用的邀請碼
+        """
+        codes = list(codes)
+        if not codes:
+            return set()
+        
+        conn = self.get_db_connection()
+        try:
+            placeholders = ','.join('?' * len(codes))
+            rows = conn.execute(
+                f"SELECT invite_code FROM UserProfile WHERE invite_code IN ({placeholders})",
+                codes
+            ).fetchall()
+            return {row['invite_code'] for row in rows}
+        finally:
+            conn.close()
+    
+    def _new_invite_code(self) -> str:
+        """池是空的時（例如剛啟動），同步產生一個未被使用的邀請碼"""
+        if invite_code_pool.refill(self.find_used_invite_codes, target=1) == 0:
+            return generate_invite_code()
+        return invite_code_pool.take() or generate_invite_code()
+    
+    def get_friend_requests(
+        self, user_id: int, limit: Optional[int] = None, before_id: Optional[int] = None
+    ) -> List[FriendRequest]:
         """
         獲取好友邀請列表（別人寄給我的邀請）
         
+        依建立時間由新到舊排序；指定 before_id 時從該筆邀請之後開始（keyset 分頁）
+        
         Args:
             user_id: 使用者 ID
+            limit: 每頁筆數，None 表示全部
+            before_id: 上一頁最後一筆邀請的 ID
             
         Returns:
             好友邀請列表
@@ -146,18 +259,27 @@ class FriendModule:
         cursor = conn.cursor()
         
         try:
-            logger.debug(f"查詢好友邀請列表，user_id={user_id}")
-            cursor.execute(
-                """SELECT fr.*, u.name, ua.account
+            logger.debug("查詢好友邀請列表，user_id=%s", user_id)
+            sql = """SELECT fr.*, u.name, ua.account
                    FROM friend_requests fr
                    JOIN UserProfile u ON fr.user_id = u.user_id
                    JOIN UserAuth ua ON fr.user_id = ua.id
-                   WHERE fr.relation_id = ? AND fr.status = 0
-                   ORDER BY fr.created_at DESC""",
-                (user_id,)
-            )
+                   WHERE fr.relation_id = ? AND fr.status = 0"""
+            params = [user_id]
+            
+            if before_id is not None:
+                sql += """ AND (fr.created_at, fr.id) < (
+                       SELECT created_at, id FROM friend_requests WHERE id = ?)"""
+                params.append(before_id)
+            
+            sql += " ORDER BY fr.created_at DESC, fr.id DESC"
+            if limit is not None:
+                sql += " LIMIT ?"
+                params.append(min(limit, FRIEND_REQUESTS_MAX_LIMIT))
+            
+            cursor.execute(sql, params)
             rows = cursor.fetchall()
-            logger.debug(f"查詢到 {len(rows)} 筆邀請")
+            logger.debug("查詢到 %s 筆邀請", len(rows))
             
             return [
                 FriendRequest(
@@ -196,10 +318,10 @@ class FriendModule:
         cursor = conn.cursor()
         
         try:
-            # 根據邀請碼查找目標用戶
+            # 根據邀請碼查找目標用戶（invite_code 唯一索引）
             cursor.execute(
                 "SELECT user_id FROM UserProfile WHERE invite_code = ?",
-                (data.invite_code,)
+                (data.invite_code.strip(),)
             )
             target_user = cursor.fetchone()
             
@@ -215,11 +337,7 @@ class FriendModule:
                 return False
             
             # 檢查是否已經是好友
-            cursor.execute(
-                "SELECT id FROM Friendship WHERE user_id = ? AND friend_id = ?",
-                (user_id, target_user_id)
-            )
-            if cursor.fetchone():
+            if friend_graph.relation_type(user_id, target_user_id, self._load_friend_edges) is not None:
                 logger.warning(f"已經是好友")
                 return False
             
@@ -302,6 +420,7 @@ class FriendModule:
             )
             
             conn.commit()
+            friend_graph.invalidate(user_id, invite['user_id'])
             return True
             
         except Exception as e:
@@ -337,6 +456,7 @@ class FriendModule:
             )
             
             conn.commit()
+            friend_graph.invalidate(user_id)
             return cursor.rowcount > 0
             
         except Exception as e:
@@ -378,6 +498,7 @@ class FriendModule:
             )
             
             conn.commit()
+            friend_graph.invalidate(user_id, *friend_ids)
             return True
             
         except Exception as e:
@@ -391,6 +512,9 @@ class FriendModule:
         """
         獲取好友結果列表(我送出的邀請的狀態) - 只返回未讀的
         
+        讀取與標記已讀在同一個語句（或同一個寫入交易）中完成，
+        兩者之間才產生的結果不會在沒被讀到的情況下被標記為已讀。
+        
         Args:
             user_id: 使用者 ID
             
@@ -401,29 +525,42 @@ class FriendModule:
         cursor = conn.cursor()
         
         try:
-            logger.debug(f"查詢好友結果列表，user_id={user_id}")
-            # 只查詢未讀的結果 (read = 0)
-            cursor.execute(
-                """SELECT fr.*, u.name, ua.account
-                   FROM friend_requests fr
-                   JOIN UserProfile u ON fr.relation_id = u.user_id
-                   JOIN UserAuth ua ON fr.relation_id = ua.id
-                   WHERE fr.user_id = ? AND fr.status != 0 AND fr.read = 0
-                   ORDER BY fr.updated_at DESC""",
-                (user_id,)
-            )
-            rows = cursor.fetchall()
-            logger.debug(f"查詢到 {len(rows)} 筆未讀結果")
+            logger.debug("查詢好友結果列表，user_id=%s", user_id)
             
-            # 標記為已讀
-            if rows:
+            if SUPPORTS_RETURNING:
+                cursor.execute(
+                    """UPDATE friend_requests SET read = 1
+                       WHERE user_id = ? AND read = 0 AND status != 0
+                       RETURNING id, user_id, relation_id, type, status, created_at, updated_at""",
+                    (user_id,)
+                )
+                rows = cursor.fetchall()
+            else:
+                # SQLite 3.35 以前沒有 RETURNING：以寫入鎖包住查詢與更新
+                cursor.execute("BEGIN IMMEDIATE")
                 cursor.execute(
-                    "UPDATE friend_requests SET read = 1 WHERE user_id = ? AND status != 0 AND read = 0",
+                    """SELECT id, user_id, relation_id, type, status, created_at, updated_at
+                       FROM friend_requests
+                       WHERE user_id = ? AND read = 0 AND status != 0""",
                     (user_id,)
                 )
-                conn.commit()
-                logger.debug(f"已標記 {len(rows)} 筆結果為已讀")
+                rows = cursor.fetchall()
+                if rows:
+                    ids = [row['id'] for row in rows]
+                    cursor.execute(
+                        f"UPDATE friend_requests SET read = 1 WHERE id IN ({','.join('?' * len(ids))})",
+                        ids
+                    )
+            conn.commit()
+            logger.debug("已標記 %s 筆結果為已讀", len(rows))
+            
+            if not rows:
+                return []
             
+            relations = self._get_user_infos(cursor, {row['relation_id'] for row in rows})
+            rows = sorted(rows, key=lambda row: row['updated_at'] or '', reverse=True)
+            
+            # 與原本的 JOIN 相同，對方沒有個人資料或帳號時不列出
             return [
                 FriendResult(
                     id=row['id'],
@@ -431,17 +568,43 @@ class FriendModule:
                     relation_id=row['relation_id'],
                     type=row['type'],
                     status=row['status'],
-                    read=row['read'],
+                    read=0,  # 回傳的是這次才讀到的結果
                     created_at=row['created_at'],
                     updated_at=row['updated_at'],
-                    relation=RelationInfo(
-                        id=row['relation_id'],
-                        name=row['name'] or '',
-                        account=row['account']
-                    )
+                    relation=relations[row['relation_id']]
                 )
                 for row in rows
+                if row['relation_id'] in relations
             ]
             
+        except Exception:
+            conn.rollback()
+            raise
         finally:
             conn.close()
+    
+    @staticmethod
+    def _get_user_infos(cursor, user_ids) -> Dict[int, RelationInfo]:
+        """
+        一次查詢多位用戶的名稱與帳號
+        
+        Args:
+            cursor: 資料庫 cursor
+            user_ids: 用戶 ID
+            
+        Returns:
+            {user_id: RelationInfo}
+        """
+        user_ids = list(user_ids)
+        placeholders = ','.join('?' * len(user_ids))
+        cursor.execute(
+            f"""SELECT ua.id, u.name, ua.account
+                FROM UserAuth ua
+                JOIN UserProfile u ON u.user_id = ua.id
+                WHERE ua.id IN ({placeholders})""",
+            user_ids
+        )
+        return {
+            row['id']: RelationInfo(id=row['id'], name=row['name'] or '', account=row['account'])
+            for row in cursor.fetchall()
+        }
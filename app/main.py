@@ -1,10 +1,27 @@
-﻿from fastapi import FastAPI, Request
+﻿from fastapi import FastAPI, Request, Header
+from fastapi.responses import Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.datastructures import Default
 from starlette.exceptions import HTTPException as StarletteHTTPException
-from app.core.database import engine, Base, SessionLocal
-from app.core.cleanup import start_cleanup_scheduler
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from typing import Optional
+from app.core.jobs import start_scheduler, stop_scheduler
+from app.core.logging_config import setup_logging, stop_logging
+from app.core.startup import run_startup, configure_threadpool
+from app.core.conditional_get import ConditionalGetMiddleware
+from app.core.profiler import ProfilerMiddleware, router as profiler_router
+from app.core.slow_queries import setup_slow_query_log, router as slow_query_router
+from app.core.query_budget import QueryBudgetMiddleware, setup_query_budget
+from app.core.compression import CompressionMiddleware, compression_stats
+from app.core.load_shedding import LoadSheddingMiddleware
+from app.core.metrics import (
+    MetricsMiddleware, setup_metrics, render_metrics,
+    METRICS_TOKEN, CONTENT_TYPE as METRICS_CONTENT_TYPE
+)
+from app.core.loop_monitor import runtime_monitor, LOOP_MONITOR_ENABLED
+from app.core.responses import DefaultJSONResponse
 from common.utils import get_logger
 
 logger = get_logger(__name__)
@@ -19,18 +36,38 @@ from app.a1c.api import router as a1c_router
 from app.medicine.api import router as medicine_router
 from app.care.api import router as care_router
 from app.friend.api import router as friend_router
+from app.feed.api import router as feed_router
+
 
-# 建立所有資料表
-Base.metadata.create_all(bind=engine)
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """應用程式生命週期：啟動時檢查資料庫版本並開始背景任務，關閉時停止"""
+    setup_logging()
+    configure_threadpool()
+    app.state.startup_seconds = run_startup()
+    start_scheduler()
+    setup_metrics()
+    setup_slow_query_log()
+    setup_query_budget()
+    lag_monitor = asyncio.create_task(runtime_monitor.run()) if LOOP_MONITOR_ENABLED else None
+    yield
+    if lag_monitor is not None:
+        lag_monitor.cancel()
+        with suppress(asyncio.CancelledError):
+            await lag_monitor
+    stop_scheduler()
+    compression_stats.log_summary()
+    stop_logging()
 
-# 啟動過期帳號清理任務
-start_cleanup_scheduler(SessionLocal)
 
 # 創建 FastAPI 應用程式
 app = FastAPI(
     title='普元後端 API',
     description='普元 IoT 專案後端 API 服務',
     version='1.0.0',
+    lifespan=lifespan,
+    # 以 Default() 包裝：有 response_model 的路由仍由 Pydantic 直接輸出 JSON
+    default_response_class=Default(DefaultJSONResponse),
 )
 
 # 全域異常處理：確保所有錯誤都回傳 status 欄位，防止 App 崩潰
@@ -38,7 +75,7 @@ app = FastAPI(
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     logger.warning(f"捕捉到驗證錯誤: {exc}")
     # 處理 Pydantic 驗證錯誤 (例如缺少欄位、類型錯誤)
-    return JSONResponse(
+    return DefaultJSONResponse(
         status_code=200, # 使用 200 讓 App 能夠解析 JSON
         content={"status": "1", "message": "The given data was invalid."},
     )
@@ -46,21 +83,34 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
 @app.exception_handler(StarletteHTTPException)
 async def http_exception_handler(request: Request, exc: StarletteHTTPException):
     logger.warning(f"捕捉到 HTTP 錯誤: {exc.detail}")
-    # 處理 HTTP 錯誤 (例如 404, 401)
-    return JSONResponse(
+    # 處理 HTTP 錯誤 (例如 404, 401)，保留 Retry-After 等標頭
+    return DefaultJSONResponse(
         status_code=200,
         content={"status": "1", "message": str(exc.detail)},
+        headers=getattr(exc, "headers", None),
     )
 
 @app.exception_handler(Exception)
 async def general_exception_handler(request: Request, exc: Exception):
     logger.error(f"捕捉到未預期錯誤: {exc}", exc_info=True)
     # 處理其他未預期的伺服器錯誤
-    return JSONResponse(
+    return DefaultJSONResponse(
         status_code=200,
         content={"status": "1", "message": f"伺服器內部錯誤: {str(exc)}"},
     )
 
+# 每個請求的 SQL 語句預算（QUERY_BUDGET_MODE=warn / error 時啟用），放在最內層
+app.add_middleware(QueryBudgetMiddleware)
+
+# 條件式 GET（ETag / 304），放在 CORS 內層讓 304 也帶有 CORS 標頭
+app.add_middleware(ConditionalGetMiddleware)
+
+# 回應壓縮，放在條件式 GET 外層（ETag 判斷使用未壓縮的內容）
+app.add_middleware(CompressionMiddleware)
+
+# 依路由類別的自適應並行上限，放在 CORS 內層讓忙碌回應也帶有 CORS 標頭
+app.add_middleware(LoadSheddingMiddleware)
+
 # 設定 CORS (允許前端連接)
 app.add_middleware(
     CORSMiddleware,
@@ -70,6 +120,12 @@ app.add_middleware(
     allow_headers=['*'],
 )
 
+# 按需取樣分析（抽樣或帶有管理 token 的請求）
+app.add_middleware(ProfilerMiddleware)
+
+# 請求數與延遲指標，放在最外層以包含所有 middleware 的耗時
+app.add_middleware(MetricsMiddleware)
+
 # 包含路由
 app.include_router(account_router, prefix='/api', tags=['用戶身份'])
 # # app.include_router(account_router, prefix='/api/account', include_in_schema=False) # 為了兼容舊版 APP
@@ -80,9 +136,20 @@ app.include_router(a1c_router, prefix='/api/user', tags=['糖化血色素'])
 app.include_router(medicine_router, prefix='/api/user', tags=['就醫、藥物資訊'])
 app.include_router(care_router, prefix='/api/user', tags=['關懷諮詢'])
 app.include_router(friend_router, prefix='/api/friend', tags=['糖友圈'])
+app.include_router(feed_router, prefix='/api/feed', tags=['糖友圈'])
 app.include_router(else_router, prefix='/api', tags=['其他'])
+app.include_router(profiler_router, prefix='/api/admin', include_in_schema=False)
+app.include_router(slow_query_router, prefix='/api/admin', include_in_schema=False)
 
 
 @app.get('/')
 async def root():
     return {'message': '普元後端 API 服務正在運行', 'version': '1.0.0'}
+
+
+@app.get('/metrics', include_in_schema=False)
+async def metrics(authorization: Optional[str] = Header(None)):
+    """Prometheus 格式的執行指標（設定 METRICS_TOKEN 時需要帶 Bearer token）"""
+    if METRICS_TOKEN and authorization != f"Bearer {METRICS_TOKEN}":
+        return DefaultJSONResponse(status_code=200, content={"status": "1", "message": "未授權"})
+    return Response(content=await render_metrics(), media_type=METRICS_CONTENT_TYPE)
@@ -4,6 +4,7 @@ from app.account.models import User
 from datetime import datetime
 from typing import Optional
 from app.core.security import verify_token
+from app._else import badges
 from .models import BloodPressureRecord, WeightRecord, BloodSugarRecord, MeasurementRecord
 from common.utils import get_logger
 
@@ -58,6 +59,7 @@ class MeasurementModule:
             db.commit()
             db.refresh(record)
             logger.info(f'血壓記錄已儲存: id={record.id}, user_id={user_id}')
+            badges.record_activity(user_id, measured_time)
             return record.id
         except Exception as e:
             logger.error(f'上傳血壓記錄錯誤: {str(e)}', exc_info=True)
@@ -90,6 +92,7 @@ class MeasurementModule:
             db.commit()
             db.refresh(record)
             logger.info(f'體重記錄已儲存: id={record.id}, user_id={user_id}')
+            badges.record_activity(user_id, measured_time)
             return record.id
         except Exception as e:
             logger.error(f'上傳體重記錄錯誤: {str(e)}', exc_info=True)
@@ -120,6 +123,7 @@ class MeasurementModule:
             db.commit()
             db.refresh(record)
             logger.info(f'血糖記錄已儲存: id={record.id}, user_id={user_id}')
+            badges.record_sugar(user_id, measured_time, glucose, meal_time)
             return record.id
         except Exception as e:
             logger.error(f'上傳血糖記錄錯誤: {str(e)}', exc_info=True)
@@ -15,6 +15,7 @@ from .models import (
     DrugUsedListResponse
 )
 from .module import MedicineModule
+from app.core.responses import trusted_response
 
 router = APIRouter()
 security = HTTPBearer()
@@ -127,7 +128,7 @@ def get_drug_used_list(
     drug_useds = MedicineModule.get_drug_used_list(user_id=user_id)
     
     if drug_useds is not None:
-        return DrugUsedListResponse(status="0", message="ok", drug_useds=drug_useds)
+        return trusted_response({"status": "0", "message": "ok", "drug_useds": drug_useds})
     else:
         return DrugUsedListResponse(status="1", message="failed", drug_useds=[])
 
@@ -2,13 +2,24 @@
 就醫、藥物資訊模組
 """
 import sqlite3
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import datetime
-from .models import MedicalInfoUpdate, DrugUsedUpload, DrugUsedDeleteRequest, MedicalInfo, DrugUsedRecord
+from .models import MedicalInfoUpdate, DrugUsedUpload, DrugUsedDeleteRequest, MedicalInfo
+from app.core.data_version import bump_data_version_raw, SCOPE_MEDICAL, SCOPE_DRUG_USED
+from app.core.database import connect_raw
+from app.core.upsert import UserRowUpsert
 from common.utils import get_logger
 
 logger = get_logger(__name__)
 
+# 就醫資訊（每位用戶一列，新增時未提供的欄位為 0）
+MEDICAL_INFO_UPSERT = UserRowUpsert("medical_info", {
+    "oad": 0,
+    "insulin": 0,
+    "anti_hypertensives": 0,
+    "diabetes_type": 0,
+})
+
 
 class MedicineModule:
     """就醫、藥物資訊模組"""
@@ -18,7 +29,7 @@ class MedicineModule:
     @staticmethod
     def get_db_connection():
         """獲取資料庫連線"""
-        conn = sqlite3.connect(MedicineModule.DB_PATH)
+        conn = connect_raw(MedicineModule.DB_PATH)
         conn.row_factory = sqlite3.Row
         return conn
     
@@ -63,25 +74,13 @@ class MedicineModule:
         try:
             now = datetime.now().isoformat()
             
-            cursor.execute("SELECT id FROM medical_info WHERE user_id = ?", (user_id,))
-            existing = cursor.fetchone()
-            
-            if existing:
-                cursor.execute(
-                    """UPDATE medical_info 
-                       SET oad = COALESCE(?, oad), insulin = COALESCE(?, insulin), 
-                           anti_hypertensives = COALESCE(?, anti_hypertensives), 
-                           diabetes_type = COALESCE(?, diabetes_type), updated_at = ?
-                       WHERE user_id = ?""",
-                    (oad, insulin, anti_hypertensives, diabetes_type, now, user_id)
-                )
-            else:
-                cursor.execute(
-                    """INSERT INTO medical_info 
-                       (user_id, oad, insulin, anti_hypertensives, diabetes_type, created_at, updated_at)
-                       VALUES (?, ?, ?, ?, ?, ?, ?)""",
-                    (user_id, oad or 0, insulin or 0, anti_hypertensives or 0, diabetes_type or 0, now, now)
-                )
+            MEDICAL_INFO_UPSERT.execute_raw(cursor, user_id, {
+                "oad": oad,
+                "insulin": insulin,
+                "anti_hypertensives": anti_hypertensives,
+                "diabetes_type": diabetes_type,
+            }, now)
+            bump_data_version_raw(cursor, user_id, SCOPE_MEDICAL)
             
             conn.commit()
             return True
@@ -92,8 +91,8 @@ class MedicineModule:
             conn.close()
     
     @staticmethod
-    def get_drug_used_list(user_id: int) -> List[DrugUsedRecord]:
-        """獲取使用者的藥物使用紀錄列表"""
+    def get_drug_used_list(user_id: int) -> List[Dict[str, Any]]:
+        """獲取使用者的藥物使用紀錄列表（欄位與 DrugUsedRecord 相同）"""
         conn = MedicineModule.get_db_connection()
         cursor = conn.cursor()
         
@@ -105,15 +104,15 @@ class MedicineModule:
             rows = cursor.fetchall()
             
             return [
-                DrugUsedRecord(
-                    id=row['id'],
-                    user_id=row['user_id'],
-                    name=row['name'],
-                    type=row['type'],
-                    recorded_at=row['recorded_at'],
-                    created_at=row['created_at'],
-                    updated_at=row['updated_at']
-                )
+                {
+                    'id': row['id'],
+                    'name': row['name'],
+                    'type': row['type'],
+                    'recorded_at': row['recorded_at'],
+                    'updated_at': row['updated_at'],
+                    'created_at': row['created_at'],
+                    'user_id': row['user_id']
+                }
                 for row in rows
             ]
         except Exception as e:
@@ -136,6 +135,7 @@ class MedicineModule:
                    VALUES (?, ?, ?, ?, ?, ?)""",
                 (user_id, name, drug_type, recorded_at, now, now)
             )
+            bump_data_version_raw(cursor, user_id, SCOPE_DRUG_USED)
             conn.commit()
             return True
         except Exception as e:
@@ -157,6 +157,8 @@ class MedicineModule:
             placeholders = ','.join('?' * len(ids))
             query = f"DELETE FROM drug_used WHERE user_id = ? AND id IN ({placeholders})"
             cursor.execute(query, [user_id] + ids)
+            if cursor.rowcount:
+                bump_data_version_raw(cursor, user_id, SCOPE_DRUG_USED)
             conn.commit()
             return True
         except Exception as e:
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+回應序列化成本：日記、糖化血色素與好友列表
+
+以與資料庫讀出相同型別的假資料，比較產生回應內容的方式：
+  validate+json   逐筆驗證建立模型，再以 jsonable_encoder + 標準函式庫 json 輸出
+  validate+core   逐筆驗證建立模型，再由 Pydantic 直接輸出 JSON（原本的路由）
+  construct+core  model_construct 建立模型（跳過驗證），再由 Pydantic 直接輸出 JSON
+  trusted         不建立模型，以 dump_json 直接輸出（trusted_response，目前的路由）
+另外比較預先序列化的 dict（最新消息、個人資料快取）使用 json.dumps 與 dump_json。
+
+用法（在專案根目錄執行）:
+    python benchmarks/bench_serialization.py --rows 200 --repeat 200
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fastapi.encoders import jsonable_encoder
+from app._journal.models import DiaryListResponse, DiaryRecord
+from app.a1c.models import A1cListResponse, A1cRecord
+from app.friend.models import FriendListResponse, FriendInfo
+from app.core.responses import dump_json, orjson, trusted_response
+
+
+def diary_rows(count: int) -> list:
+    """與 JournalModule.get_diary_list 相同格式的記錄"""
+    return [{
+        "id": i, "user_id": 1, "systolic": 120, "diastolic": 80, "pulse": 70,
+        "weight": 70.5, "body_fat": 20.1, "bmi": 22.3, "sugar": 110.0,
+        "exercise": 0, "drug": 0, "timeperiod": i % 3, "description": "午餐 便當",
+        "meal": 1, "tag": [{"name": ["外食"], "message": "ok"}], "image": ["1"],
+        "location": {"lat": "25.03", "lng": "121.56"}, "reply": "",
+        "recorded_at": "2024-05-01 12:00:00", "type": "diet",
+    } for i in range(count)]
+
+
+def a1c_rows(count: int) -> list:
+    """與 A1cModule.get_a1c_list 相同格式的記錄"""
+    return [{
+        "id": i, "a1c": "5.6", "recorded_at": "2024-05-01 11:11:11",
+        "updated_at": "2024-05-01 11:11:11", "created_at": "2024-05-01 11:11:11", "user_id": 1,
+    } for i in range(count)]
+
+
+def friend_rows(count: int) -> list:
+    """與 FriendModule.get_friend_list 相同格式的記錄"""
+    return [{"id": i, "name": f"糖友{i}", "relation_type": i % 3} for i in range(count)]
+
+
+# 端點名稱: (回應模型, 記錄模型, 列表欄位, 產生資料)
+CASES = {
+    "diary": (DiaryListResponse, DiaryRecord, "diary", diary_rows),
+    "a1c": (A1cListResponse, A1cRecord, "a1cs", a1c_rows),
+    "friend": (FriendListResponse, FriendInfo, "friends", friend_rows),
+}
+
+
+def validate_json(response_model, record_model, field, rows) -> bytes:
+    response = response_model(status="0", message="ok", **{field: [record_model(**row) for row in rows]})
+    return json.dumps(
+        jsonable_encoder(response), ensure_ascii=False, separators=(",", ":")
+    ).encode("utf-8")
+
+
+def validate_core(response_model, record_model, field, rows) -> bytes:
+    response = response_model(status="0", message="ok", **{field: [record_model(**row) for row in rows]})
+    return response.model_dump_json().encode("utf-8")
+
+
+def construct_core(response_model, record_model, field, rows) -> bytes:
+    response = response_model.model_construct(
+        status="0", message="ok", **{field: [record_model.model_construct(**row) for row in rows]}
+    )
+    return response.model_dump_json().encode("utf-8")
+
+
+def trusted(response_model, record_model, field, rows) -> bytes:
+    return trusted_response({"status": "0", "message": "ok", field: rows}).body
+
+
+METHODS = {
+    "validate+json": validate_json,
+    "validate+core": validate_core,
+    "construct+core": construct_core,
+    "trusted": trusted,
+}
+
+
+def measure(func, repeat: int) -> float:
+    """重複執行並回傳每次耗時的中位數（ms）"""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較回應序列化方式的耗時")
+    parser.add_argument("--rows", type=int, default=200, help="每個回應的記錄數")
+    parser.add_argument("--repeat", type=int, default=200, help="重複次數")
+    args = parser.parse_args()
+
+    print("=" * 90)
+    print(f"序列化耗時中位數（{args.rows} 筆 x {args.repeat} 次，單位 ms）")
+    print("=" * 90)
+    print(f"{'端點':<8}" + "".join(f"{name:>16}" for name in METHODS) + f"{'加速':>8}")
+    for name, (response_model, record_model, field, make_rows) in CASES.items():
+        rows = make_rows(args.rows)
+        outputs = {method: func(response_model, record_model, field, rows) for method, func in METHODS.items()}
+        assert len(set(outputs.values())) == 1, f"{name} 各方式輸出不一致"
+        results = {
+            method: measure(lambda: func(response_model, record_model, field, rows), args.repeat)
+            for method, func in METHODS.items()
+        }
+        # 與原本的路由（validate+core）相比
+        speedup = results["validate+core"] / results["trusted"]
+        print(f"{name:<10}" + "".join(f"{value:>16.3f}" for value in results.values()) + f"{speedup:>7.1f}x")
+
+    payload = {"status": "0", "message": "ok", "diary": diary_rows(args.rows)}
+    stdlib = measure(
+        lambda: json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), args.repeat
+    )
+    fast = measure(lambda: dump_json(payload), args.repeat)
+    print("-" * 90)
+    print(f"預先序列化 dict   json.dumps {stdlib:8.3f}   dump_json {fast:8.3f}   "
+          f"({'orjson' if orjson is not None else '未安裝 orjson，使用 json'})")
+
+
+if __name__ == "__main__":
+    main()
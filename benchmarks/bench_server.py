@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+伺服器吞吐量比較：開發用 run_server.py 與正式環境 run_production.py
+
+依序啟動兩種伺服器（都使用 port 8000），以多個持續連線對同一個
+端點發送請求，統計每秒請求數與延遲分位數。
+
+用法（在專案根目錄執行）:
+    python benchmarks/bench_server.py --duration 10 --concurrency 32
+    python benchmarks/bench_server.py --only prod --path /api/news
+"""
+import argparse
+import http.client
+import os
+import signal
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LAUNCHERS = {
+    "dev": [sys.executable, "run_server.py"],
+    "prod": [sys.executable, "run_production.py"],
+}
+
+
+def wait_until_ready(port: int, path: str, timeout: float = 30.0) -> bool:
+    """等待伺服器可以回應"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection("127.0.0.1", port, timeout=2)
+            conn.request("GET", path)
+            conn.getresponse().read()
+            conn.close()
+            return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run_load(port: int, path: str, duration: float, concurrency: int) -> dict:
+    """以 concurrency 個持續連線發送請求 duration 秒"""
+    latencies = [[] for _ in range(concurrency)]
+    errors = [0] * concurrency
+    stop_at = time.monotonic() + duration
+
+    def worker(index: int):
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        while time.monotonic() < stop_at:
+            started = time.perf_counter()
+            try:
+                conn.request("GET", path)
+                response = conn.getresponse()
+                response.read()
+                if response.status != 200:
+                    errors[index] += 1
+            except (OSError, http.client.HTTPException):
+                errors[index] += 1
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+                continue
+            latencies[index].append(time.perf_counter() - started)
+        conn.close()
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    samples = sorted(value for values in latencies for value in values)
+    if not samples:
+        return {"requests": 0, "errors": sum(errors), "rps": 0.0, "p50": 0.0, "p99": 0.0}
+    return {
+        "requests": len(samples),
+        "errors": sum(errors),
+        "rps": len(samples) / duration,
+        "p50": statistics.median(samples) * 1000,
+        "p99": samples[min(len(samples) - 1, int(len(samples) * 0.99))] * 1000,
+    }
+
+
+def bench(name: str, args) -> dict:
+    """啟動指定的伺服器並量測"""
+    env = dict(os.environ, PORT="8000", SCHEDULER_ENABLED="false")
+    process = subprocess.Popen(
+        LAUNCHERS[name], cwd=ROOT, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True
+    )
+    try:
+        if not wait_until_ready(8000, args.path):
+            raise RuntimeError(f"{name} 伺服器未在時間內啟動")
+        run_load(8000, args.path, 2, args.concurrency)  # 暖機
+        return run_load(8000, args.path, args.duration, args.concurrency)
+    finally:
+        os.killpg(process.pid, signal.SIGTERM)
+        process.wait(timeout=30)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="比較開發與正式環境啟動方式的吞吐量")
+    parser.add_argument("--path", default="/api/news", help="測試端點")
+    parser.add_argument("--duration", type=float, default=10, help="每組量測秒數")
+    parser.add_argument("--concurrency", type=int, default=32, help="同時連線數")
+    parser.add_argument("--only", choices=sorted(LAUNCHERS), help="只測試其中一種")
+    args = parser.parse_args()
+
+    names = [args.only] if args.only else ["dev", "prod"]
+    results = {name: bench(name, args) for name in names}
+
+    print("=" * 60)
+    print(f"GET {args.path}  {args.duration:.0f}s x {args.concurrency} 連線")
+    print("=" * 60)
+    for name, r in results.items():
+        print(f"{name:<6} {r['rps']:9.1f} req/s   p50 {r['p50']:7.2f} ms   "
+              f"p99 {r['p99']:7.2f} ms   錯誤 {r['errors']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+啟動時間測試：每次在新的子程序中量測匯入 app.main 與 lifespan 啟動的耗時
+
+用法（在專案根目錄執行）:
+    python benchmarks/bench_startup.py --repeat 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 在子程序中執行：分別量測 import 與 lifespan 啟動
+CHILD_SCRIPT = """
+import asyncio, json, time
+started = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+async def run():
+    async with app.router.lifespan_context(app):
+        return time.perf_counter()
+
+ready = asyncio.run(run())
+print(json.dumps({
+    "import": imported - started,
+    "lifespan": ready - imported,
+    "startup": getattr(app.state, "startup_seconds", 0.0),
+}))
+"""
+
+
+def measure_once() -> dict:
+    """在新的子程序中量測一次"""
+    env = dict(os.environ, SCHEDULER_ENABLED="false")
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="量測應用程式啟動時間")
+    parser.add_argument("--repeat", type=int, default=5, help="重複次數")
+    args = parser.parse_args()
+
+    results = [measure_once() for _ in range(args.repeat)]
+
+    print("=" * 60)
+    print(f"啟動時間（{args.repeat} 次，單位 ms）")
+    print("=" * 60)
+    for key, label in [("import", "匯入 app.main"), ("lifespan", "lifespan 啟動"), ("startup", "  其中 run_startup")]:
+        values = [r[key] * 1000 for r in results]
+        print(f"{label:<20} 中位數 {statistics.median(values):8.1f}   最小 {min(values):8.1f}   最大 {max(values):8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+"""
+Gunicorn 正式環境設定（由 run_production.py 使用）
+
+- 多個 UvicornWorker 程序，安裝 uvloop / httptools 時自動採用
+- preload_app：在 master 載入應用程式後才 fork，並以 gc.freeze()
+  讓 worker 之間以 copy-on-write 共用已載入的物件
+- 平滑重啟：kill -HUP <master pid> 逐一替換 worker；
+  因為 preload，更新程式碼需用 USR2 + WINCH/QUIT 啟動新的 master
+
+可用環境變數：HOST、PORT、WEB_CONCURRENCY、GRACEFUL_TIMEOUT、
+TIMEOUT、KEEPALIVE、MAX_REQUESTS、MAX_REQUESTS_JITTER
+"""
+import gc
+import multiprocessing
+import os
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', '8000')}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+preload_app = True
+
+# 平滑重啟時等待進行中請求完成的秒數
+graceful_timeout = int(os.getenv("GRACEFUL_TIMEOUT", 30))
+timeout = int(os.getenv("TIMEOUT", 60))
+keepalive = int(os.getenv("KEEPALIVE", 5))
+
+# 定期替換 worker，避免長時間執行的記憶體增長（0 = 停用）
+max_requests = int(os.getenv("MAX_REQUESTS", 0))
+max_requests_jitter = int(os.getenv("MAX_REQUESTS_JITTER", 0))
+
+accesslog = "-"
+errorlog = "-"
+
+
+def when_ready(server):
+    """應用程式已在 master 載入：整理並凍結目前的物件，fork 後不再被 GC 掃描改寫"""
+    gc.collect()
+    gc.freeze()
+    server.log.info(f"已凍結 {gc.get_freeze_count()} 個物件，啟動 {workers} 個 worker")
+
+
+def post_fork(server, worker):
+    """丟棄 master 可能建立的資料庫連線，每個 worker 使用自己的連線池"""
+    from app.core.database import engine
+    engine.dispose(close=False)
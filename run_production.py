@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+正式環境啟動腳本
+
+有安裝 gunicorn 時以 gunicorn_conf.py 啟動（preload + gc.freeze + 平滑重啟）；
+沒有時（例如 Windows）改用 uvicorn 的多 worker 模式。
+
+    pip install gunicorn uvloop httptools
+    WEB_CONCURRENCY=4 THREADPOOL_SIZE=40 python run_production.py
+
+開發時請繼續使用 run_server.py（單一程序 + 自動重載）。
+"""
+import importlib.util
+import multiprocessing
+import os
+import sys
+
+APP = "app.main:app"
+
+
+def has_module(name: str) -> bool:
+    """檢查套件是否已安裝"""
+    return importlib.util.find_spec(name) is not None
+
+
+def main():
+    if has_module("gunicorn") and sys.platform != "win32":
+        os.execvp(sys.executable, [sys.executable, "-m", "gunicorn", "-c", "gunicorn_conf.py", APP])
+
+    import uvicorn
+
+    workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+    print("=" * 60)
+    print(f"未安裝 gunicorn，改用 uvicorn 啟動 {workers} 個 worker（不支援 preload）")
+    print("=" * 60)
+    uvicorn.run(
+        APP,
+        host=os.getenv("HOST", "0.0.0.0"),
+        port=int(os.getenv("PORT", 8000)),
+        workers=workers,
+        loop="uvloop" if has_module("uvloop") else "auto",
+        http="httptools" if has_module("httptools") else "auto",
+        timeout_graceful_shutdown=int(os.getenv("GRACEFUL_TIMEOUT", 30)),
+    )
+
+
+if __name__ == "__main__":
+    main()